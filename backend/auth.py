@@ -1,13 +1,20 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from metrics import record_cache
 from models import User
 import os
+import time
+import hashlib
+import logging
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +23,12 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey_change_me_in_production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 43200 # 30 days for mobile app persistent login
+# Verified tokens are trusted for this long without looking the user up again (0 disables).
+# Per process: invalidate_user() is immediate here, other workers catch up within the TTL.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -33,11 +46,121 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     
-    to_encode.update({"exp": expire})
+    # iat: lets a principal be traced back to when its token was issued
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+class Principal:
+    """The authenticated user as request handlers see it: a plain snapshot, safe to share across requests."""
+
+    __slots__ = ("id", "email", "full_name", "created_at")
+
+    def __init__(self, id: str, email: str, full_name: Optional[str], created_at: Optional[datetime]):
+        self.id = id
+        self.email = email
+        self.full_name = full_name
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(user.id, user.email, user.full_name, user.created_at)
+
+
+class PrincipalCache:
+    """
+    Token -> verified Principal, LRU-bounded. An entry lives for `ttl` seconds but never past the
+    token's own expiry, so a hit skips both the signature check and the users-table lookup.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        # Bumped by invalidate_user(): a lookup that started before it must not cache its result
+        self.generation = 0
+
+    def get(self, key: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, principal: Principal, token_expires_at: float, generation: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._remove(key)
+            self._entries[key] = (principal, min(time.time() + self.ttl, token_expires_at))
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: str) -> int:
+        with self._lock:
+            self.generation += 1
+            keys = self._by_user.pop(user_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            return len(keys)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry[0].id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[0].id]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_TTL, AUTH_CACHE_SIZE)
+
+
+def invalidate_user(user_id: str):
+    """Drop a user's cached principals (call after deleting the user or changing credentials)."""
+    dropped = principal_cache.invalidate_user(user_id)
+    if dropped:
+        logger.info(f"🔐 Invalidated {dropped} cached token(s) for user {user_id}")
+
+
+# ORM deletes and credential changes invalidate on their own; bulk UPDATE/DELETE statements must
+# call invalidate_user() themselves
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("email", "hashed_password")):
+        invalidate_user(target.id)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    key = _token_key(token)
+    principal = principal_cache.get(key)
+    record_cache("auth", principal is not None)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -53,8 +176,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError as e:
         # logger.error(f"❌ JWT Error: {e}")
         raise credentials_exception
-        
-    user = db.query(User).filter(User.email == email).first()
+
+    generation = principal_cache.generation
+    user_id = payload.get("uid")
+    if user_id:
+        # Primary-key lookup; the email check rejects tokens minted before an email change
+        user = await db.get(User, user_id)
+        if user is not None and user.email != email:
+            user = None
+    else:
+        # Tokens issued before `uid` was added to the claims
+        user = (await db.execute(select(User).where(User.email == email))).scalars().first()
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.put(key, principal, payload["exp"], generation)
+    return principal
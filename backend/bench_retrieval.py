@@ -0,0 +1,287 @@
+"""
+MANA VARTHA AI - Retrieval Micro-Benchmarks
+Measures how index build, snapshot save/load and FAISS search scale with corpus size
+over synthetic Telugu-like chunk CSVs.
+
+Usage:
+    python bench_retrieval.py --sizes 10000,100000 --formats embedding,spread
+    python bench_retrieval.py --sizes 10000,100000,500000,2000000 --out bench_results.json
+    python bench_retrieval.py --compare bench_old.json bench_new.json
+
+Each (format, size) case runs build and load in separate subprocesses so peak RSS
+is measured per phase. Runs use the offline providers (EMBEDDING_PROVIDER=local,
+LLM_PROVIDER=fake), so no API keys or network are needed.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDING_DIM = 1024
+
+# Telugu consonants and vowel signs for pronounceable pseudo-words
+_CONSONANTS = [chr(c) for c in range(0x0C15, 0x0C39 + 1) if c not in (0x0C29, 0x0C34)]
+_VOWEL_SIGNS = ["", "ా", "ి", "ీ", "ు", "ూ", "ె", "ే", "ై", "ొ", "ో", "ౌ"]
+_ENGLISH = ["Hyderabad", "Telangana", "Andhra", "cricket", "election", "budget", "IMD", "police", "farmers", "BJP", "TDP", "BRS"]
+
+
+def _pseudo_word(rng: random.Random) -> str:
+    return "".join(rng.choice(_CONSONANTS) + rng.choice(_VOWEL_SIGNS) for _ in range(rng.randint(1, 4)))
+
+
+def _pseudo_chunk(rng: random.Random) -> str:
+    words = [rng.choice(_ENGLISH) if rng.random() < 0.08 else _pseudo_word(rng) for _ in range(rng.randint(40, 90))]
+    # Sentence breaks every ~12 words
+    for i in range(12, len(words), 12):
+        words[i - 1] += "."
+    return " ".join(words)
+
+
+def generate_csv(path: str, rows: int, fmt: str, seed: int = 7, batch: int = 10000, embedder=None):
+    """
+    Write `rows` synthetic chunks with either an `embedding` JSON column or 1024 spread numeric columns.
+    Vectors are random unit vectors unless `embedder` is given (e.g. LocalHashEmbedder, so that
+    offline queries actually retrieve matching chunks).
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "embedding":
+            f.write("chunk,embedding\n")
+        else:
+            f.write("chunk," + ",".join(f"e{i}" for i in range(EMBEDDING_DIM)) + "\n")
+        written = 0
+        while written < rows:
+            n = min(batch, rows - written)
+            texts = [_pseudo_chunk(rng).replace('"', "'") for _ in range(n)]
+            if embedder is not None:
+                vecs = embedder.embed(texts, input_type="search_document")
+            else:
+                vecs = np_rng.standard_normal((n, EMBEDDING_DIM), dtype=np.float32)
+                vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+            lines = []
+            for text, vec in zip(texts, vecs):
+                values = ",".join(f"{v:.5f}" for v in vec)
+                if fmt == "embedding":
+                    lines.append(f'"{text}","[{values}]"\n')
+                else:
+                    lines.append(f'"{text}",{values}\n')
+            f.writelines(lines)
+            written += n
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _snapshot_bytes(index_path: str) -> int:
+    total = 0
+    directory = os.path.dirname(index_path)
+    prefix = os.path.basename(index_path)
+    for name in os.listdir(directory):
+        if name.startswith(prefix):
+            total += os.path.getsize(os.path.join(directory, name))
+    return total
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def run_build(csv_path: str) -> dict:
+    from rag_engine import TeluguNewsRAG
+
+    started = time.perf_counter()
+    rag = TeluguNewsRAG(csv_path)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rag.save_index()
+    save_seconds = time.perf_counter() - started
+    return {
+        "vectors": int(rag.index.ntotal),
+        "build_seconds": round(build_seconds, 3),
+        "save_seconds": round(save_seconds, 3),
+        "snapshot_bytes": _snapshot_bytes(rag.index_path),
+        "build_peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def run_load(csv_path: str, batch_sizes, queries: int) -> dict:
+    from rag_engine import TeluguNewsRAG
+
+    started = time.perf_counter()
+    rag = TeluguNewsRAG(csv_path)
+    load_seconds = time.perf_counter() - started
+    result = {"load_seconds": round(load_seconds, 3), "load_peak_rss_mb": round(_peak_rss_mb(), 1), "search": {}}
+
+    k = rag.top_k * 2
+    np_rng = np.random.default_rng(11)
+    for batch in batch_sizes:
+        q = np_rng.standard_normal((queries, EMBEDDING_DIM), dtype=np.float32)
+        q /= np.linalg.norm(q, axis=1, keepdims=True)
+        rag.index.search(q[:batch], k)  # warm-up
+        latencies = []
+        started = time.perf_counter()
+        for i in range(0, queries - batch + 1, batch):
+            t0 = time.perf_counter()
+            rag.index.search(q[i:i + batch], k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - started
+        searched = len(latencies) * batch
+        result["search"][str(batch)] = {
+            "qps": round(searched / elapsed, 1) if elapsed > 0 else None,
+            "batch_latency_ms_p50": round(_percentile(latencies, 50), 3),
+            "batch_latency_ms_p95": round(_percentile(latencies, 95), 3),
+        }
+
+    # End-to-end single query through _retrieve_chunks (local embedder + search + threshold)
+    sample_queries = ["Hyderabad వర్షాలు", "Telangana election ఫలితాలు", "cricket మ్యాచ్", "farmers budget"]
+    latencies = []
+    for i in range(50):
+        t0 = time.perf_counter()
+        rag._retrieve_chunks(sample_queries[i % len(sample_queries)])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    result["retrieve_chunks_ms_p50"] = round(_percentile(latencies, 50), 3)
+    result["retrieve_chunks_ms_p95"] = round(_percentile(latencies, 95), 3)
+    return result
+
+
+def _run_phase(phase: str, csv_path: str, args) -> dict:
+    env = dict(os.environ, EMBEDDING_PROVIDER="local", LLM_PROVIDER="fake")
+    cmd = [sys.executable, os.path.abspath(__file__), "--_phase", phase, "--_csv", csv_path,
+           "--batch-sizes", args.batch_sizes, "--queries", str(args.queries)]
+    proc = subprocess.run(cmd, env=env, cwd=BACKEND_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{phase} phase failed for {csv_path}:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def run_suite(args):
+    sizes = [int(s) for s in args.sizes.split(",")]
+    formats = args.formats.split(",")
+    results = []
+    for fmt in formats:
+        for size in sizes:
+            case_dir = os.path.join(args.workdir, f"{fmt}_{size}")
+            csv_path = os.path.join(case_dir, "chunks.csv")
+            if not os.path.exists(csv_path):
+                print(f"🧪 Generating {size:,} rows ({fmt}) -> {csv_path}")
+                t0 = time.perf_counter()
+                generate_csv(csv_path, size, fmt)
+                print(f"   done in {time.perf_counter() - t0:.1f}s ({os.path.getsize(csv_path) / 1e6:.0f} MB)")
+            # Always rebuild: drop snapshots from previous runs
+            for name in os.listdir(case_dir):
+                if name.startswith("faiss_prod.index"):
+                    os.remove(os.path.join(case_dir, name))
+
+            print(f"🏗️  Build {fmt}/{size:,}...")
+            case = {"format": fmt, "rows": size, "csv_bytes": os.path.getsize(csv_path)}
+            case.update(_run_phase("build", csv_path, args))
+            print(f"🚀 Load + search {fmt}/{size:,}...")
+            case.update(_run_phase("load", csv_path, args))
+            print(f"   build {case['build_seconds']}s | load {case['load_seconds']}s | "
+                  f"snapshot {case['snapshot_bytes'] / 1e6:.0f} MB | peak RSS {case['build_peak_rss_mb']} MB | "
+                  f"QPS@1 {case['search'].get('1', {}).get('qps')}")
+            results.append(case)
+            if not args.keep_data:
+                shutil.rmtree(case_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+    out = args.out or f"bench_retrieval_{report['meta']['git_commit']}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results written to {out}")
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"Comparing {old['meta']['git_commit']} -> {new['meta']['git_commit']}")
+    old_cases = {(c["format"], c["rows"]): c for c in old["results"]}
+    metrics = ["build_seconds", "build_peak_rss_mb", "snapshot_bytes", "load_seconds", "load_peak_rss_mb",
+               "retrieve_chunks_ms_p50"]
+    for case in new["results"]:
+        before = old_cases.get((case["format"], case["rows"]))
+        if not before:
+            continue
+        print(f"\n{case['format']} / {case['rows']:,} rows")
+        for metric in metrics:
+            a, b = before.get(metric), case.get(metric)
+            if a is None or b is None:
+                continue
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"  {metric:<24} {a:>14} -> {b:<14} {change}")
+        for batch, stats in case["search"].items():
+            a = before.get("search", {}).get(batch, {}).get("qps")
+            b = stats.get("qps")
+            if a and b:
+                print(f"  {'qps@' + batch:<24} {a:>14} -> {b:<14} {(b - a) / a * 100:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval micro-benchmarks over synthetic corpora")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated row counts (e.g. 10000,100000,500000,2000000)")
+    parser.add_argument("--formats", default="embedding,spread", help="embedding and/or spread")
+    parser.add_argument("--batch-sizes", default="1,4,16,64")
+    parser.add_argument("--queries", type=int, default=512, help="Query vectors per batch size")
+    parser.add_argument("--workdir", default=os.path.join(BACKEND_DIR, "data", "bench"))
+    parser.add_argument("--keep-data", action="store_true", help="Keep generated CSVs for the next run")
+    parser.add_argument("--out", help="Output JSON (default: bench_retrieval_<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Diff two result files")
+    parser.add_argument("--_phase", help=argparse.SUPPRESS)
+    parser.add_argument("--_csv", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args._phase:
+        sys.path.insert(0, BACKEND_DIR)
+        import logging
+        logging.disable(logging.INFO)
+        batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+        if args._phase == "build":
+            result = run_build(args._csv)
+        else:
+            result = run_load(args._csv, batch_sizes, args.queries)
+        print(json.dumps(result))
+    else:
+        run_suite(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+MANA VARTHA AI - Traffic Capture
+Opt-in, anonymized record of /search traffic for replay against another build (see replay_traffic.py)
+
+    CAPTURE_PATH=captures/search.jsonl   # enable capture (append-only JSON lines)
+    CAPTURE_SAMPLE_RATE=1.0              # fraction of conversations to keep
+    CAPTURE_SALT=...                     # share across workers so turns of one chat link up
+"""
+
+import os
+import re
+import hmac
+import json
+import time
+import zlib
+import random
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+_URL = re.compile(r"https?://\S+")
+# 7+ digits, optionally separated by spaces/dashes (phone, Aadhaar, account numbers)
+_LONG_NUMBER = re.compile(r"\+?\d[\d\s-]{5,}\d")
+
+
+def anonymize_query(query: str) -> str:
+    """Strip direct identifiers; the wording is kept since it drives rewrite/retrieval cost."""
+    query = _EMAIL.sub("<email>", query)
+    query = _URL.sub("<url>", query)
+    return _LONG_NUMBER.sub("<number>", query)
+
+
+def chunk_id(chunk: str) -> str:
+    """Content-derived chunk id, stable across index rebuilds so two builds can be compared."""
+    return hashlib.sha1(chunk.encode("utf-8")).hexdigest()[:12]
+
+
+class TrafficCapture:
+    """
+    Appends one JSON line per /search request. Records carry no user or session ids:
+    turns of one conversation share an HMAC of the session id under a salt that never
+    leaves the server, which is enough for replay to rebuild follow-up chains.
+    """
+
+    def __init__(self, path: Optional[str], sample_rate: float = 1.0, salt: Optional[str] = None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._salt = (salt or os.urandom(16).hex()).encode()
+        self._lock = threading.Lock()
+        self._file = None
+        self.written = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # Line-buffered O_APPEND: each record is a single small write, so several
+            # uvicorn workers can share one capture file without interleaving lines
+            self._file = open(path, "a", encoding="utf-8", buffering=1)
+            logger.info(f"🎙️ Capturing /search traffic to {path} (sample rate {sample_rate})")
+
+    @classmethod
+    def from_env(cls) -> "TrafficCapture":
+        return cls(
+            os.getenv("CAPTURE_PATH") or None,
+            sample_rate=float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0")),
+            salt=os.getenv("CAPTURE_SALT") or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    def conversation_key(self, session_id: Optional[str]) -> Optional[str]:
+        if not session_id:
+            return None
+        return hmac.new(self._salt, str(session_id).encode(), hashlib.sha256).hexdigest()[:16]
+
+    def _sampled(self, conversation: Optional[str]) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        if conversation:
+            # Keep or drop whole conversations so follow-ups never lose their first turn
+            return zlib.crc32(conversation.encode()) / 0xFFFFFFFF < self.sample_rate
+        return random.random() < self.sample_rate
+
+    def record(self, query: str, mode: str, status: int, total_ms: float,
+               stages_ms: Dict[str, float], annotations: Optional[Dict[str, Any]] = None):
+        if not self.enabled:
+            return
+        annotations = annotations or {}
+        conversation = self.conversation_key(annotations.get("session_id"))
+        if not self._sampled(conversation):
+            return
+        entry = {
+            "ts": round(time.time(), 3),
+            "query": anonymize_query(query),
+            "mode": mode,
+            "history_len": annotations.get("history_len", 0),
+            "conversation": conversation,
+            "status": status,
+            "total_ms": round(total_ms, 1),
+            "stages_ms": {stage: round(ms, 1) for stage, ms in stages_ms.items()},
+            "retrieved_ids": annotations.get("retrieved_ids", []),
+            "degraded": annotations.get("degraded"),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                self._file.write(line)
+                self.written += 1
+        except Exception as e:
+            logger.warning(f"⚠️ Traffic capture write failed: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
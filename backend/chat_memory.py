@@ -0,0 +1,154 @@
+"""
+MANA VARTHA AI - Rolling Conversation Memory
+Each chat session carries a compact summary of everything before its last turn. /search prompts
+use that summary plus the turns it doesn't cover yet (normally just the last one) instead of the
+last four to six raw messages, so prompt size stays bounded however long a conversation runs and
+older context isn't simply dropped.
+
+After each follow-up is answered, the turns that just went out of the "last turn" window are
+folded into the summary in the background: one short LLM call over the old summary and those
+turns only, never the whole conversation. The write is a compare-and-set on summary_through, so
+concurrent folds of the same session can't overwrite each other; a fold that fails or loses the
+race leaves its turns unsummarized, and they go raw into prompts until the next fold picks them up.
+A fold reads the unsummarized messages from the database rather than the request's recent-message
+window, so turns that slid out of the window while earlier folds failed are still summarized
+(at most CHAT_SUMMARY_MAX_FOLD per fold; the rest go in the next one).
+
+    CHAT_SUMMARY=true                # false: prompts use raw recent turns again
+    CHAT_SUMMARY_MAX_CHARS=600       # summary length cap (rag_engine.py)
+    CHAT_SUMMARY_TIMEOUT=20          # seconds per background fold
+    CHAT_SUMMARY_MAX_PENDING=32      # folds in flight per process before new ones are skipped
+    CHAT_SUMMARY_MAX_FOLD=40         # messages summarized per fold
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+
+from chat_store import SessionHistory
+from database import AsyncSessionLocal
+from metrics import REGISTRY
+from models import ChatMessage, ChatSession
+from scheduler import Overloaded
+
+logger = logging.getLogger(__name__)
+
+LAST_TURN = 2  # messages: the user's question and the answer
+
+SUMMARY_UPDATES = REGISTRY.counter("mvai_chat_summary_updates_total",
+                                   "Background conversation summary folds by outcome", labelnames=("outcome",))
+
+_pending: Set[asyncio.Task] = set()
+
+
+def summary_enabled() -> bool:
+    return os.getenv("CHAT_SUMMARY", "true").lower() in ("1", "true", "yes")
+
+
+def prompt_context(history: Optional[SessionHistory]) -> Tuple[Optional[str], List[Dict[str, str]]]:
+    """(summary, messages) for the prompts: the summary plus every turn it doesn't cover, at least the last one."""
+    if history is None:
+        return None, []
+    if not history.summary or not summary_enabled():
+        return None, history.messages
+    keep = max(len(history.unsummarized()), LAST_TURN)
+    return history.summary, history.messages[-keep:]
+
+
+def schedule_summary_update(engine_rag, user_id: str, history: Optional[SessionHistory]):
+    """Fold the session's unsummarized turns into its summary after this answer, without waiting for it."""
+    if history is None or not summary_enabled():
+        return
+    fold = history.unsummarized()
+    if not fold:
+        return
+    if len(_pending) >= int(os.getenv("CHAT_SUMMARY_MAX_PENDING", "32")):
+        # The turns stay unsummarized and are folded by a later answer
+        SUMMARY_UPDATES.inc(outcome="skipped")
+        return
+    task = asyncio.create_task(update_summary(engine_rag, user_id, history, fold))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def _messages_to_fold(history: SessionHistory, fold: List[int]) -> List[Tuple[str, datetime, Dict[str, str]]]:
+    """
+    (id, timestamp, message) of every message after summary_through up to the last of `fold`, oldest
+    first and at most CHAT_SUMMARY_MAX_FOLD of them. Read from the database: after failed or skipped
+    folds some of them are no longer in the request's window. Folded messages write-behind hasn't
+    flushed yet only exist in `history`, so those are merged in.
+    """
+    limit = int(os.getenv("CHAT_SUMMARY_MAX_FOLD", "40"))
+    through = history.message_times[fold[-1]]
+    query = (select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp)
+             .where(ChatMessage.session_id == history.session_id, ChatMessage.timestamp <= through)
+             .order_by(ChatMessage.timestamp)
+             .limit(limit))
+    if history.summary_through is not None:
+        query = query.where(ChatMessage.timestamp > history.summary_through)
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(query)).all()
+
+    found = {row.id: (row.id, row.timestamp, {"role": row.role, "content": row.content}) for row in rows}
+    for i in fold:
+        if history.message_ids[i] not in found:
+            found[history.message_ids[i]] = (history.message_ids[i], history.message_times[i], history.messages[i])
+    messages = sorted(found.values(), key=lambda m: m[1])
+    if len(rows) >= limit:
+        # More stored messages may follow the last one read: nothing after it can be folded yet
+        messages = [m for m in messages if m[1] <= rows[-1].timestamp]
+    return messages[:limit]
+
+
+async def update_summary(engine_rag, user_id: str, history: SessionHistory, fold: List[int]) -> bool:
+    """Summarize the messages after history.summary_through, up to history.messages[fold[-1]]; True if written."""
+    try:
+        messages = await _messages_to_fold(history, fold)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load turns to summarize for session {history.session_id}: {e}")
+        SUMMARY_UPDATES.inc(outcome="failed")
+        return False
+    through = messages[-1][1]
+    try:
+        summary = await asyncio.to_thread(
+            engine_rag.summarize_conversation, history.summary, [m[2] for m in messages],
+            float(os.getenv("CHAT_SUMMARY_TIMEOUT", "20")))
+    except Overloaded:
+        SUMMARY_UPDATES.inc(outcome="skipped")
+        return False
+    except Exception as e:
+        logger.warning(f"⚠️ Conversation summary failed for session {history.session_id}: {e}")
+        summary = None
+    if not summary:
+        SUMMARY_UPDATES.inc(outcome="failed")
+        return False
+
+    unchanged = (ChatSession.summary_through.is_(None) if history.summary_through is None
+                 else ChatSession.summary_through == history.summary_through)
+    try:
+        async with AsyncSessionLocal() as db:
+            written = (await db.execute(
+                update(ChatSession)
+                .where(ChatSession.id == history.session_id, ChatSession.user_id == user_id, unchanged)
+                # Not a user-visible change: keep updated_at (sidebar order, /chats/sync) as it is
+                .values(summary=summary, summary_through=through, updated_at=ChatSession.updated_at)
+                .execution_options(synchronize_session=False)
+            )).rowcount
+            await db.commit()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not store conversation summary for session {history.session_id}: {e}")
+        SUMMARY_UPDATES.inc(outcome="failed")
+        return False
+    # 0 rows: another fold got there first, the session was deleted, or write-behind hasn't created it yet
+    SUMMARY_UPDATES.inc(outcome="updated" if written else "stale")
+    return bool(written)
+
+
+async def drain(timeout: float = 10.0):
+    """Give folds in flight a chance to finish at shutdown."""
+    if _pending:
+        await asyncio.wait(list(_pending), timeout=timeout)
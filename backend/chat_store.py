@@ -0,0 +1,199 @@
+"""
+MANA VARTHA AI - Chat Persistence for /search
+Loads a session and its recent history in one query and saves an exchange (user message,
+assistant message, session title/timestamp) in one transaction with client-side ids, so a
+logged-in question costs two round-trips for history instead of four to six.
+
+The /chats views page with keyset cursors: `before` is the opaque position of the last row
+of the previous page, so every page is one index range scan however long the history is.
+"""
+
+import uuid
+import base64
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import ChatSession, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TURNS = 6
+DEFAULT_TITLE = "New Chat"
+
+
+class SessionHistory:
+    """
+    A user's session as loaded for /search: title, rolling summary, plus recent messages,
+    oldest first. `summary` covers every message up to `summary_through`.
+    """
+
+    def __init__(self, session_id: str, title: Optional[str], messages: List[Dict[str, str]],
+                 message_ids: Optional[List[str]] = None, message_times: Optional[List[datetime]] = None,
+                 summary: Optional[str] = None, summary_through: Optional[datetime] = None):
+        self.session_id = session_id
+        self.title = title
+        self.messages = messages
+        self.message_ids = message_ids or []
+        self.message_times = message_times or []
+        self.summary = summary
+        self.summary_through = summary_through
+
+    def unsummarized(self) -> List[int]:
+        """Indexes of the loaded messages the summary doesn't cover yet."""
+        if self.summary_through is None:
+            return list(range(len(self.messages)))
+        return [i for i, at in enumerate(self.message_times) if at > self.summary_through]
+
+
+async def load_history(db: AsyncSession, session_id: str, user_id: str,
+                       limit: int = HISTORY_TURNS) -> Optional[SessionHistory]:
+    """
+    Ownership check, rolling summary and last `limit` messages in one query (session LEFT JOIN
+    messages). Returns None when the session doesn't exist or belongs to someone else.
+    """
+    rows = (await db.execute(
+        select(ChatSession.title, ChatSession.summary, ChatSession.summary_through,
+               ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp)
+        .outerjoin(ChatMessage, ChatMessage.session_id == ChatSession.id)
+        .where(ChatSession.id == session_id, ChatSession.user_id == user_id)
+        .order_by(ChatMessage.timestamp.desc())
+        .limit(limit)
+    )).all()
+    if not rows:
+        return None
+    # A session without messages comes back as one row with NULL message columns
+    messages = [row for row in reversed(rows) if row.id is not None]
+    return SessionHistory(session_id, rows[0].title,
+                          [{"role": row.role, "content": row.content} for row in messages],
+                          [row.id for row in messages], [row.timestamp for row in messages],
+                          rows[0].summary, rows[0].summary_through)
+
+
+def title_from_query(query: str) -> str:
+    # First 6 words, title-cased, without trailing punctuation
+    return " ".join(query.split()[:6]).title().strip(".,!?")
+
+
+def plan_exchange(user_id: str, session: Optional[SessionHistory], query: str, answer: str) -> Dict[str, Any]:
+    """
+    Everything one question/answer pair writes, with ids assigned up front: the session
+    id is known before anything reaches the database, and replaying a plan is idempotent.
+    """
+    now = datetime.utcnow()
+    create = session is None
+    session_id = str(uuid.uuid4()) if create else session.session_id
+    title = None
+    if create or session.title in (DEFAULT_TITLE, None, ""):
+        title = title_from_query(query)
+    return {
+        "user_id": user_id,
+        "session_id": session_id,
+        "create": create,
+        "title": title,
+        "updated_at": now,
+        "messages": [
+            {"id": str(uuid.uuid4()), "session_id": session_id, "role": "user", "content": query, "timestamp": now},
+            # One microsecond later so ordering by timestamp keeps question before answer
+            {"id": str(uuid.uuid4()), "session_id": session_id, "role": "assistant", "content": answer,
+             "timestamp": now + timedelta(microseconds=1)},
+        ],
+    }
+
+
+async def save_exchange(db: AsyncSession, user_id: str, session: Optional[SessionHistory], query: str,
+                        answer: str) -> Dict[str, Optional[str]]:
+    """
+    Persist one question/answer pair in a single transaction: session insert or update,
+    then both messages as one multi-row insert. Nothing is read back from the database.
+
+    Returns {"session_id": ..., "new_session_title": ... or None}.
+    """
+    plan = plan_exchange(user_id, session, query, answer)
+    try:
+        if not plan["create"]:
+            values = {"updated_at": plan["updated_at"]}
+            if plan["title"]:
+                values["title"] = plan["title"]
+            updated = (await db.execute(
+                update(ChatSession)
+                .where(ChatSession.id == plan["session_id"], ChatSession.user_id == user_id)
+                .values(**values)
+            )).rowcount
+            if not updated:
+                # Deleted since the history load: start a fresh session instead
+                plan = plan_exchange(user_id, None, query, answer)
+        if plan["create"]:
+            logger.info(f"ℹ️ Creating new session {plan['session_id']} for user {user_id}")
+            await db.execute(insert(ChatSession).values(
+                id=plan["session_id"], user_id=user_id, title=plan["title"],
+                created_at=plan["updated_at"], updated_at=plan["updated_at"]))
+        await db.execute(insert(ChatMessage), plan["messages"])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return {"session_id": plan["session_id"], "new_session_title": plan["title"]}
+
+
+def encode_cursor(at: datetime, row_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{at.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError for anything encode_cursor() didn't produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(at), row_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _before(at_column, id_column, cursor: Optional[str]):
+    """Keyset predicate for (at, id) < cursor; the `at <=` bound lets the index range-scan."""
+    at, row_id = decode_cursor(cursor)
+    return and_(at_column <= at, or_(at_column < at, and_(at_column == at, id_column < row_id)))
+
+
+async def list_sessions(db: AsyncSession, user_id: str, limit: int,
+                        before: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of a user's sessions, most recently active first: session columns only, no messages.
+    Returns (rows, cursor of the next page or None).
+    """
+    query = (select(ChatSession.id, ChatSession.title, ChatSession.created_at, ChatSession.updated_at)
+             .where(ChatSession.user_id == user_id)
+             .order_by(ChatSession.updated_at.desc(), ChatSession.id.desc())
+             .limit(limit + 1))
+    if before:
+        query = query.where(_before(ChatSession.updated_at, ChatSession.id, before))
+    rows = (await db.execute(query)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].updated_at, rows[-1].id)
+
+
+async def list_messages(db: AsyncSession, session_id: str, limit: int,
+                        before: Optional[str] = None) -> Tuple[List[ChatMessage], Optional[str]]:
+    """
+    The `limit` messages preceding the cursor (the latest ones without a cursor), oldest first.
+    Returns (messages, cursor for the page of older messages or None).
+    """
+    query = (select(ChatMessage)
+             .where(ChatMessage.session_id == session_id)
+             .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+             .limit(limit + 1))
+    if before:
+        query = query.where(_before(ChatMessage.timestamp, ChatMessage.id, before))
+    messages = list((await db.execute(query)).scalars())
+    cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        cursor = encode_cursor(messages[-1].timestamp, messages[-1].id)
+    messages.reverse()
+    return messages, cursor
@@ -0,0 +1,123 @@
+"""
+MANA VARTHA AI - Chat Delta Sync
+What changed in a user's chat history since the client's last sync: sessions created or updated,
+messages added, and tombstones for deleted sessions, each as a keyset-paged stream.
+
+The cursor is opaque to clients: the position reached in each stream. It is held back by
+SYNC_SAFETY_WINDOW_SECONDS behind the server clock, because rows are stamped when the request
+runs but may commit later (write-behind queue, other workers, slow transactions). Rows inside
+the window are sent again on the next sync, so clients upsert by id.
+
+    SYNC_SAFETY_WINDOW_SECONDS=30        # how far the watermark trails the clock
+    CHAT_TOMBSTONE_RETENTION_DAYS=30     # older cursors get a full resync ("reset": true)
+"""
+
+import os
+import json
+import base64
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import ChatSession, ChatMessage, ChatTombstone
+
+SYNC_SAFETY_WINDOW = timedelta(seconds=float(os.getenv("SYNC_SAFETY_WINDOW_SECONDS", "30")))
+TOMBSTONE_RETENTION = timedelta(days=float(os.getenv("CHAT_TOMBSTONE_RETENTION_DAYS", "30")))
+
+# Stream positions: (changed_at, id); "" sorts before every id
+Position = Tuple[datetime, str]
+_START: Position = (datetime.min, "")
+STREAMS = ("sessions", "messages", "deleted")
+
+
+def encode_sync_cursor(positions: Dict[str, Position]) -> str:
+    raw = json.dumps({name: [at.isoformat(), row_id] for name, (at, row_id) in positions.items()})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor: Optional[str]) -> Dict[str, Position]:
+    """Raises ValueError for anything encode_sync_cursor() didn't produce."""
+    if not cursor:
+        return {name: _START for name in STREAMS}
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return {name: (datetime.fromisoformat(raw[name][0]), str(raw[name][1])) for name in STREAMS}
+    except Exception as e:
+        raise ValueError(f"Invalid sync cursor: {cursor!r}") from e
+
+
+def _after(at_column, id_column, position: Position):
+    at, row_id = position
+    return and_(at_column >= at, or_(at_column > at, id_column > row_id))
+
+
+def _advance(rows, full: bool, watermark: datetime) -> Position:
+    """Next position: the last row while the stream has more, else the watermark (rows after it come again)."""
+    return rows[-1] if full else (watermark, "")
+
+
+async def changes_since(db: AsyncSession, user_id: str, cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """
+    One page of changes after `cursor` (everything for None). Keep calling with the returned
+    cursor while has_more is true; each stream returns at most `limit` rows per page.
+    """
+    positions = decode_sync_cursor(cursor)
+    now = datetime.utcnow()
+    reset = False
+    if cursor and positions["deleted"][0] < now - TOMBSTONE_RETENTION:
+        # Tombstones this old may have been pruned: the client has to rebuild from scratch
+        positions, reset = decode_sync_cursor(None), True
+
+    sessions = (await db.execute(
+        select(ChatSession.id, ChatSession.title, ChatSession.created_at, ChatSession.updated_at)
+        .where(ChatSession.user_id == user_id, _after(ChatSession.updated_at, ChatSession.id, positions["sessions"]))
+        .order_by(ChatSession.updated_at, ChatSession.id)
+        .limit(limit)
+    )).all()
+
+    # Every exchange bumps its session's updated_at, so only sessions touched since (give or take a
+    # second of clock between the two stamps) can hold new messages
+    since = positions["messages"][0]
+    touched = datetime.min if since == datetime.min else since - timedelta(seconds=1)
+    messages = (await db.execute(
+        select(ChatMessage.id, ChatMessage.session_id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp)
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .where(ChatSession.user_id == user_id, ChatSession.updated_at >= touched,
+               _after(ChatMessage.timestamp, ChatMessage.id, positions["messages"]))
+        .order_by(ChatMessage.timestamp, ChatMessage.id)
+        .limit(limit)
+    )).all()
+
+    deleted = [] if reset or not cursor else (await db.execute(
+        select(ChatTombstone.session_id, ChatTombstone.deleted_at)
+        .where(ChatTombstone.user_id == user_id,
+               _after(ChatTombstone.deleted_at, ChatTombstone.session_id, positions["deleted"]))
+        .order_by(ChatTombstone.deleted_at, ChatTombstone.session_id)
+        .limit(limit)
+    )).all()
+
+    watermark = now - SYNC_SAFETY_WINDOW
+    full = {"sessions": len(sessions) == limit, "messages": len(messages) == limit, "deleted": len(deleted) == limit}
+    next_positions = {
+        "sessions": _advance([(r.updated_at, r.id) for r in sessions], full["sessions"], watermark),
+        "messages": _advance([(r.timestamp, r.id) for r in messages], full["messages"], watermark),
+        "deleted": _advance([(r.deleted_at, r.session_id) for r in deleted], full["deleted"], watermark),
+    }
+    return {
+        "sessions": sessions,
+        "messages": messages,
+        "deleted_session_ids": [r.session_id for r in deleted],
+        "cursor": encode_sync_cursor(next_positions),
+        "has_more": any(full.values()),
+        "reset": reset,
+    }
+
+
+async def record_deletion(db: AsyncSession, user_id: str, session_id: str):
+    """Tombstone a deleted session (same transaction as the delete) and prune expired tombstones."""
+    now = datetime.utcnow()
+    db.add(ChatTombstone(session_id=session_id, user_id=user_id, deleted_at=now))
+    await db.execute(delete(ChatTombstone).where(ChatTombstone.user_id == user_id,
+                                                 ChatTombstone.deleted_at < now - TOMBSTONE_RETENTION))
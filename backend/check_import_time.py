@@ -0,0 +1,136 @@
+"""
+MANA VARTHA AI - Import-Time Budget Check
+Reports where worker startup time goes (python -X importtime) and fails when it exceeds a budget.
+
+Usage:
+    python check_import_time.py                       # import main, report + check budget
+    python check_import_time.py --budget-ms 800 --top 25
+    python check_import_time.py --serve --data-path data/chunks   # time until /readyz
+
+Heavy optional modules (pandas, faiss, google.generativeai, cohere) must not be imported
+by `import main`; they load on first use instead. --serve measures spawn -> first 200 from
+/readyz (index loaded, warm-up done), which is fast only when a pre-built index snapshot exists.
+"""
+
+import os
+import re
+import sys
+import time
+import urllib.request
+import argparse
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ["pandas", "faiss", "google.generativeai", "cohere"]
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[str, int, int, int]]]:
+    """Wall time (s) of `import module` in a fresh interpreter and its importtime rows."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=BACKEND_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise SystemExit(f"❌ import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return wall, rows
+
+
+def report(module: str, rows: List[Tuple[str, int, int, int]], top: int) -> int:
+    root = next((r for r in reversed(rows) if r[0] == module), None)
+    total_us = root[2] if root else sum(r[1] for r in rows)
+
+    # Direct imports of the target: what each first-party module and dependency costs
+    direct = sorted((r for r in rows if r[3] == 1), key=lambda r: r[2], reverse=True)
+    print(f"\n⏱️  import {module}: {total_us / 1000:.1f} ms cumulative\n")
+    print(f"   {'direct import':<36} {'cumulative':>12}")
+    for name, _, cumulative_us, _ in direct[:top]:
+        print(f"   {name:<36} {cumulative_us / 1000:>10.1f}ms")
+
+    # Self time grouped by top-level package, wherever in the tree it was pulled in
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    print(f"\n   {'package (self time)':<36} {'total':>12}")
+    for name, self_us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"   {name:<36} {self_us / 1000:>10.1f}ms")
+    return total_us
+
+
+def time_to_serving(args) -> float:
+    env = dict(os.environ)
+    if args.data_path:
+        env["DATA_PATH"] = args.data_path
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+           "--log-level", "warning"]
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{args.port}/readyz"
+    try:
+        while time.perf_counter() - started < args.startup_timeout:
+            # Plain urllib and a coarse interval: the poller must not steal CPU from the worker it is timing
+            try:
+                with urllib.request.urlopen(url, timeout=1):
+                    return time.perf_counter() - started
+            except (OSError, ValueError):
+                pass
+            if proc.poll() is not None:
+                raise SystemExit("❌ Backend exited during startup")
+            time.sleep(0.05)
+        raise SystemExit(f"❌ Backend not serving after {args.startup_timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check for worker startup")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Max cumulative import time of --module")
+    parser.add_argument("--runs", type=int, default=3, help="Best of N fresh interpreters (import times are noisy)")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--allow-heavy", action="store_true", help="Don't fail when heavy modules are imported eagerly")
+    parser.add_argument("--serve", action="store_true", help="Also time uvicorn spawn -> /readyz")
+    parser.add_argument("--serve-budget-ms", type=float, default=1000)
+    parser.add_argument("--data-path", help="DATA_PATH for --serve (its directory should hold faiss_prod.index)")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    wall, rows = min(runs, key=lambda run: run[0])
+    total_us = report(args.module, rows, args.top)
+    print(f"\n   interpreter start + import (wall): {wall * 1000:.0f} ms")
+
+    failures = []
+    if total_us / 1000 > args.budget_ms:
+        failures.append(f"import {args.module} took {total_us / 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    imported = {r[0] for r in rows}
+    eager = [m for m in HEAVY_MODULES if m in imported]
+    if eager and not args.allow_heavy:
+        failures.append(f"heavy modules imported eagerly: {', '.join(eager)}")
+
+    if args.serve:
+        seconds = time_to_serving(args)
+        print(f"   spawn -> serving index: {seconds * 1000:.0f} ms")
+        if seconds * 1000 > args.serve_budget_ms:
+            failures.append(f"worker took {seconds * 1000:.0f} ms to serve (budget {args.serve_budget_ms:.0f} ms)")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Within startup budget")
+
+
+if __name__ == "__main__":
+    main()
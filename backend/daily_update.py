@@ -9,6 +9,8 @@ from datetime import datetime
 from dotenv import load_dotenv
 import numpy as np
 
+from scheduler import Priority, PriorityLimiter
+
 # Setup Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -29,6 +31,10 @@ if not COHERE_API_KEY:
 
 co = cohere.Client(COHERE_API_KEY)
 
+# The cron job is its own process: the API workers' embed_limiter (and its priorities) don't apply
+# here, so bound the job's Cohere calls separately, on top of what the workers use
+ingest_limiter = PriorityLimiter.from_env("cohere-ingest", "DAILY_UPDATE_EMBED", max_concurrent=1, max_queue=4)
+
 # Config
 RSS_URL = "https://news.google.com/rss/search?q=Telangana+News+Telugu&hl=te&gl=IN&ceid=IN:te"
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
@@ -82,11 +88,12 @@ def generate_embeddings(articles):
     texts = [a["chunk"] for a in articles]
     
     try:
-        response = co.embed(
-            texts=texts,
-            model="embed-multilingual-v3.0",
-            input_type="search_query"
-        )
+        with ingest_limiter.slot(priority=Priority.INGEST):
+            response = co.embed(
+                texts=texts,
+                model="embed-multilingual-v3.0",
+                input_type="search_query"
+            )
         embeddings = response.embeddings
         
         results = []
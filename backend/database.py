@@ -1,7 +1,10 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -21,17 +24,87 @@ if not SQLALCHEMY_DATABASE_URL:
 if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Pool sizing (Postgres): per process and engine (sync + async), so it multiplies by the worker count
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; below the server/proxy idle cutoff
+# SQLite fallback: how long a writer waits for another process's write lock before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+
+IS_SQLITE = make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite"
+
+
+def _engine_options(writer: bool = False) -> dict:
+    if IS_SQLITE:
+        options = {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if writer:
+            # One connection per engine: in-process writers queue on the pool instead of on the file lock
+            options.update(pool_size=1, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT)
+        return options
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: readers never block the writer (and vice versa); NORMAL fsyncs at checkpoints, not per commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _create_engines(create, url):
+    """(reader, writer) engines. Postgres uses one pool for both; SQLite gets a dedicated writer connection."""
+    reader = create(url, **_engine_options())
+    if not IS_SQLITE:
+        return reader, reader
+    writer = create(url, **_engine_options(writer=True))
+    for e in (reader, writer):
+        event.listen(getattr(e, "sync_engine", e), "connect", _sqlite_pragmas)
+    return reader, writer
+
+
+class _RoutingSession(Session):
+    """
+    Sends INSERT/UPDATE/DELETE and ORM flushes to the writer engine, reads to the reader. Once a
+    transaction has written, the rest of it stays on the writer so it reads its own writes.
+    """
+
+    reader = None
+    writer = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.writer is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        if self._flushing or isinstance(clause, UpdateBase) or self.info.get("_writing"):
+            self.info["_writing"] = True
+            return self.writer
+        return self.reader
+
+
+@event.listens_for(_RoutingSession, "after_transaction_end")
+def _end_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("_writing", None)
+
+
 # Create Engine
-# If using SQLite: connect_args={"check_same_thread": False} is needed
-connect_args = {}
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    connect_args = {"check_same_thread": False}
+engine, write_engine = _create_engines(create_engine, SQLALCHEMY_DATABASE_URL)
+
+
+class RoutingSession(_RoutingSession):
+    reader, writer = (engine, write_engine) if IS_SQLITE else (None, None)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
-)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession)
 
 Base = declarative_base()
 
@@ -42,3 +115,34 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _async_url(url: str):
+    """Same database through its asyncio driver: asyncpg for Postgres, aiosqlite for SQLite."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite")
+    if parsed.get_backend_name() == "postgresql":
+        query = dict(parsed.query)
+        # libpq-only options: asyncpg takes `ssl` instead of `sslmode` and has no channel_binding
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        query.pop("channel_binding", None)
+        return parsed.set(drivername="postgresql+asyncpg", query=query)
+    return parsed
+
+# Async engine for request handlers: DB I/O never blocks the event loop or the threadpool
+async_engine, async_write_engine = _create_engines(create_async_engine, _async_url(SQLALCHEMY_DATABASE_URL))
+
+
+class AsyncRoutingSession(_RoutingSession):
+    # get_bind runs on the sync side of AsyncSession, so it returns the sync facades
+    reader, writer = ((async_engine.sync_engine, async_write_engine.sync_engine) if IS_SQLITE else (None, None))
+
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, sync_session_class=AsyncRoutingSession)
+
+# Async dependency for Request Scope
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,42 @@
+"""
+MANA VARTHA AI - Request Deadlines
+A per-request time budget that is handed down through rewrite, embed, search and generation
+"""
+
+import os
+import time
+from typing import Optional
+
+
+class Deadline:
+    """
+    Absolute deadline on the monotonic clock.
+    Deadline(None) is unbounded: remaining() is infinite and stage budgets fall back to their caps.
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    @classmethod
+    def from_env(cls, var: str = "SEARCH_DEADLINE_SECONDS", default: float = 25.0) -> "Deadline":
+        seconds = float(os.getenv(var, str(default)))
+        return cls(seconds if seconds > 0 else None)
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, fraction: float, cap: Optional[float] = None, reserve: float = 0.0) -> Optional[float]:
+        """
+        Time a stage may spend: `fraction` of what is left after holding back `reserve`,
+        never more than `cap`. Returns None only for an unbounded deadline without a cap.
+        """
+        remaining = self.remaining()
+        if remaining == float("inf"):
+            return cap
+        share = max(0.0, remaining - reserve) * fraction
+        return share if cap is None else min(share, cap)
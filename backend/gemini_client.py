@@ -0,0 +1,387 @@
+"""
+MANA VARTHA AI - Resilient Gemini Generation Client
+Jittered exponential backoff, per-model circuit breakers, runtime model fallback
+and optional hedged requests for tail latency
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker for a single Gemini model.
+    After `failure_threshold` consecutive failures the breaker opens and every
+    call fails fast until `cooldown` seconds have passed. One trial call is then
+    let through (half-open); success closes the breaker, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._trial_owner = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Return True if a call may be attempted right now. In half-open state this hands the
+        calling thread the single trial: it must end in record_success/record_failure, or
+        release() if the thread gives up without calling the model.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Half-open: only a single trial request at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            self._trial_owner = threading.get_ident()
+            return True
+
+    def release(self):
+        """Give back a half-open trial this thread was granted but never used (deadline, cancellation)."""
+        with self._lock:
+            if self._trial_in_flight and self._trial_owner == threading.get_ident():
+                self._trial_in_flight = False
+                self._trial_owner = None
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            self._trial_owner = None
+            if self.state != self.CLOSED:
+                logger.info("✅ Circuit closed again after successful trial call")
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            self._trial_owner = None
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "total_successes": self.total_successes,
+                "times_opened": self.times_opened,
+                "retry_in_seconds": round(retry_in, 1),
+            }
+
+
+class GeminiClient:
+    """
+    Generation client that walks an ordered model chain (e.g. 2.5-flash -> 1.5-flash -> pro).
+    Each model gets its own circuit breaker; transient errors are retried with
+    jittered exponential backoff and a tripped model hands over to the next one.
+    """
+
+    def __init__(
+        self,
+        model_names: List[str],
+        temperature: float = 0.3,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        request_timeout: float = 30.0,
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 1.0,
+        hedge_budget: float = 0.1,
+        hedge_target: str = "next",
+        model_factory: Optional[Callable[[str], object]] = None,
+        limiter=None,
+    ):
+        if not model_names:
+            raise ValueError("GeminiClient needs at least one model name")
+        self.model_names = list(model_names)
+        self.temperature = temperature
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_timeout = request_timeout
+        if model_factory is None:
+            # Imported on first use: google.generativeai alone costs ~0.7s of worker startup
+            import google.generativeai as genai
+            model_factory = genai.GenerativeModel
+        self._model_factory = model_factory
+        self._breaker_config = {"failure_threshold": failure_threshold, "cooldown": cooldown}
+        self.models = {name: model_factory(name) for name in self.model_names}
+        self.breakers = {name: CircuitBreaker(**self._breaker_config) for name in self.model_names}
+
+        # Hedging: duplicate a slow request once it passes the observed latency percentile
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_budget = hedge_budget
+        self.hedge_target = hedge_target
+        self._latencies = deque(maxlen=200)
+        self._hedge_tokens = 1.0
+        self._hedge_lock = threading.Lock()
+        # The caller already holds one slot of `limiter` (scheduler.PriorityLimiter) for the primary;
+        # a hedge is a second concurrent Gemini call, so it needs a slot of its own
+        self.limiter = limiter
+        self.hedge_stats_counters = {"requests": 0, "fired": 0, "won": 0, "skipped_budget": 0,
+                                     "skipped_capacity": 0}
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv("GEMINI_HEDGE_WORKERS", "16")),
+                                            thread_name_prefix="gemini-hedge") if hedge_enabled else None
+
+    @classmethod
+    def from_env(cls, model_names: List[str], **kwargs) -> "GeminiClient":
+        """Build a client using GEMINI_* tuning knobs from the environment."""
+        config = dict(
+            max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+            backoff_base=float(os.getenv("GEMINI_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("GEMINI_BACKOFF_MAX", "8.0")),
+            failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "3")),
+            cooldown=float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30")),
+            request_timeout=float(os.getenv("GEMINI_REQUEST_TIMEOUT", "30")),
+            hedge_enabled=os.getenv("GEMINI_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes"),
+            hedge_percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0.95")),
+            hedge_min_delay=float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "1.0")),
+            hedge_budget=float(os.getenv("GEMINI_HEDGE_BUDGET", "0.1")),
+            hedge_target=os.getenv("GEMINI_HEDGE_TARGET", "next"),
+        )
+        config.update(kwargs)
+        return cls(model_names, **config)
+
+    @property
+    def primary_model_name(self) -> str:
+        return self.model_names[0]
+
+    def set_model_chain(self, model_names: List[str]):
+        """Swap in a new fallback chain (e.g. after model discovery refreshes); breaker state is kept."""
+        if not model_names or list(model_names) == self.model_names:
+            return
+        for name in model_names:
+            if name not in self.models:
+                self.models[name] = self._model_factory(name)
+                self.breakers[name] = CircuitBreaker(**self._breaker_config)
+        # Single reference swap: in-flight calls finish on the chain they started with
+        self.model_names = list(model_names)
+        logger.info(f"🔁 Gemini fallback chain updated: {self.model_names}")
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # "Full jitter": uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _call(self, model_name: str, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        started = time.monotonic()
+        response = self.models[model_name].generate_content(
+            prompt,
+            generation_config={"temperature": self.temperature},
+            request_options={"timeout": timeout or self.request_timeout},
+        )
+        self._latencies.append(time.monotonic() - started)
+        try:
+            text = response.text
+        except ValueError:
+            # Blocked / empty candidates: the model is healthy, the answer is just unusable
+            logger.warning(f"⚠️ Gemini {model_name} returned no text (blocked or empty response)")
+            return None
+        return text.strip() if text else None
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Generate text for `prompt`, falling back along the model chain.
+        `timeout` bounds the whole call including retries and fallbacks.
+        Returns None when every model failed, has an open breaker, or time ran out.
+        """
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        if self.hedge_enabled:
+            return self._generate_hedged(prompt, expires_at)
+        return self._generate_chain(prompt, self.model_names, expires_at=expires_at)
+
+    def _generate_chain(self, prompt: str, model_names: List[str],
+                        cancelled: Optional[threading.Event] = None,
+                        expires_at: Optional[float] = None) -> Optional[str]:
+        for model_name in model_names:
+            # Out of time (or cancelled) before asking the breaker: a half-open trial is never taken for nothing
+            if cancelled is not None and cancelled.is_set():
+                return None
+            if expires_at is not None and expires_at - time.monotonic() < 0.1:
+                logger.warning("⏱️ Gemini deadline reached, giving up")
+                return None
+            breaker = self.breakers[model_name]
+            if not breaker.allow():
+                logger.info(f"⏭️ Circuit open for {model_name}, skipping")
+                continue
+
+            try:
+                for attempt in range(self.max_attempts):
+                    if cancelled is not None and cancelled.is_set():
+                        return None
+                    call_timeout = self.request_timeout
+                    if expires_at is not None:
+                        call_timeout = min(call_timeout, expires_at - time.monotonic())
+                        if call_timeout < 0.1:
+                            logger.warning("⏱️ Gemini deadline reached, giving up")
+                            return None
+                    try:
+                        text = self._call(model_name, prompt, timeout=call_timeout)
+                        breaker.record_success()
+                        return text
+                    except Exception as e:
+                        breaker.record_failure()
+                        logger.warning(f"⚠️ Gemini {model_name} Error (attempt {attempt + 1}/{self.max_attempts}): {e}")
+
+                    if attempt + 1 >= self.max_attempts or not breaker.allow():
+                        break
+                    delay = self._backoff_delay(attempt)
+                    if expires_at is not None and time.monotonic() + delay >= expires_at:
+                        break
+                    logger.info(f"🔄 Retrying {model_name} in {delay:.2f}s...")
+                    if cancelled is not None:
+                        if cancelled.wait(delay):
+                            return None
+                    else:
+                        time.sleep(delay)
+            finally:
+                # Leaving without a recorded outcome (deadline, cancellation, break after a granted
+                # retry) must not leave a half-open trial marked in flight: that wedges the model
+                breaker.release()
+
+            logger.warning(f"↪️ Falling back from {model_name}")
+
+        logger.error("❌ All Gemini models failed or are unavailable (circuits open).")
+        return None
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait before hedging: the configured percentile of recent call latency."""
+        samples = sorted(self._latencies)
+        if len(samples) < 20:
+            return self.hedge_min_delay
+        idx = min(len(samples) - 1, int(self.hedge_percentile * len(samples)))
+        return max(self.hedge_min_delay, samples[idx])
+
+    def _take_hedge_token(self) -> bool:
+        """Token bucket: every request earns `hedge_budget` tokens, a hedge costs one."""
+        with self._hedge_lock:
+            if self._hedge_tokens >= 1.0:
+                self._hedge_tokens -= 1.0
+                return True
+            return False
+
+    def _hedge_chain(self) -> List[str]:
+        if self.hedge_target == "same" or len(self.model_names) == 1:
+            return self.model_names
+        return self.model_names[1:]
+
+    def _generate_hedged(self, prompt: str, expires_at: Optional[float] = None) -> Optional[str]:
+        with self._hedge_lock:
+            self.hedge_stats_counters["requests"] += 1
+            self._hedge_tokens = min(10.0, self._hedge_tokens + self.hedge_budget)
+
+        primary_cancel = threading.Event()
+        primary = self._executor.submit(self._generate_chain, prompt, self.model_names, primary_cancel, expires_at)
+
+        def time_left() -> Optional[float]:
+            return None if expires_at is None else max(0.0, expires_at - time.monotonic())
+
+        hedge_after = self.hedge_delay()
+        if expires_at is not None:
+            hedge_after = min(hedge_after, time_left())
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+        if expires_at is not None and time_left() <= 0:
+            primary_cancel.set()
+            return None
+
+        skipped = None
+        if not self._take_hedge_token():
+            skipped = "skipped_budget"
+        elif self.limiter is not None and not self.limiter.try_acquire():
+            # No free slot: hedging now would push real concurrency past the limit, so don't
+            skipped = "skipped_capacity"
+        if skipped:
+            with self._hedge_lock:
+                self.hedge_stats_counters[skipped] += 1
+                if skipped == "skipped_capacity":
+                    self._hedge_tokens += 1.0
+            done, _ = wait([primary], timeout=time_left())
+            if not done:
+                primary_cancel.set()
+                return None
+            return primary.result()
+
+        with self._hedge_lock:
+            self.hedge_stats_counters["fired"] += 1
+        logger.info("🪁 Gemini request slow, firing hedged request")
+        hedge_cancel = threading.Event()
+        hedge = self._executor.submit(self._generate_chain, prompt, self._hedge_chain(), hedge_cancel, expires_at)
+        if self.limiter is not None:
+            # Held until the hedge really finishes (also runs if it is cancelled before starting)
+            slot_taken = time.monotonic()
+            hedge.add_done_callback(lambda _: self.limiter.release(time.monotonic() - slot_taken))
+        cancels = {primary: primary_cancel, hedge: hedge_cancel}
+
+        pending = {primary, hedge}
+        result = None
+        while pending:
+            done, pending = wait(pending, timeout=time_left(), return_when=FIRST_COMPLETED)
+            if not done:
+                logger.warning("⏱️ Gemini deadline reached while hedging")
+                break
+            winner = next((f for f in done if f.result() is not None), None)
+            if winner is not None:
+                result = winner.result()
+                if winner is hedge:
+                    with self._hedge_lock:
+                        self.hedge_stats_counters["won"] += 1
+                break
+
+        # Whichever lost: stop its retries/backoff and drop it if it has not started yet
+        for future in pending:
+            cancels[future].set()
+            future.cancel()
+        return result
+
+    def hedge_stats(self) -> Dict[str, object]:
+        with self._hedge_lock:
+            stats = dict(self.hedge_stats_counters)
+        stats["enabled"] = self.hedge_enabled
+        stats["delay_seconds"] = round(self.hedge_delay(), 3)
+        return stats
+
+    def breaker_states(self) -> Dict[str, Dict[str, object]]:
+        return {name: self.breakers[name].snapshot() for name in self.model_names}
@@ -0,0 +1,319 @@
+"""
+MANA VARTHA AI - Load Generator & Capacity Report
+Open-loop async load against /search, /daily-brief, /chats and /auth/login.
+
+Usage:
+    # Against a running backend
+    python load_test.py --base-url http://localhost:8000 --rate 20 --duration 60
+
+    # Launch the backend with offline providers + SQLite and sweep arrival rates
+    python load_test.py --launch --workers 2 --sweep 5,10,20,40,80 --duration 30
+
+    # Same, against Postgres
+    python load_test.py --launch --workers 4 --database-url postgresql://user:pw@host/db --sweep 10,20,40
+
+Arrivals follow a Poisson process at the offered rate regardless of how fast the server
+answers (open loop), so queueing shows up as latency and errors instead of being hidden
+by a slower client. The saturation point is the highest offered rate at which the
+server keeps up (throughput >= 95% of the arrivals actually generated), p99 stays
+under --slo-p99 and the error rate stays under --max-error-rate.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUERIES = [
+    "తెలంగాణ వర్ష సమాచారం ఏమిటి?",
+    "హైదరాబాద్ లో తాజా వార్తలు",
+    "క్రికెట్ వార్తలు ఏమిటి?",
+    "What happened in Andhra Pradesh recently?",
+    "Telangana budget highlights",
+    "cricket news em undi?",
+    "AP lo em jarigindi?",
+    "election results gurinchi cheppandi",
+]
+FOLLOW_UPS = ["Enduku?", "Ela?", "ఇంకా వివరాలు చెప్పండి", "What happens next?", "Idi ఎప్పుడు జరిగింది?"]
+
+
+def parse_weights(spec: str) -> List[Tuple[str, float]]:
+    pairs = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        pairs.append((name.strip(), float(weight or 1)))
+    return pairs
+
+
+def weighted_choice(rng: random.Random, pairs: List[Tuple[str, float]]) -> str:
+    return rng.choices([p[0] for p in pairs], weights=[p[1] for p in pairs])[0]
+
+
+class VirtualUser:
+    def __init__(self, email: str, password: str):
+        self.email = email
+        self.password = password
+        self.token: Optional[str] = None
+        self.session_id: Optional[str] = None
+        self.turns = 0
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.degraded = 0
+        self.dropped = 0
+
+    def record(self, endpoint: str, seconds: float, status: int):
+        self.latencies[endpoint].append(seconds)
+        self.status[endpoint][status] += 1
+        if status >= 400 or status == 0:
+            self.errors[endpoint] += 1
+
+    def summary(self, duration: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            ms = np.array(values) * 1000
+            ok = len(values) - self.errors[endpoint]
+            report[endpoint] = {
+                "requests": len(values),
+                "throughput_rps": round(ok / duration, 2),
+                "error_rate": round(self.errors[endpoint] / len(values), 4),
+                "p50_ms": round(float(np.percentile(ms, 50)), 1),
+                "p95_ms": round(float(np.percentile(ms, 95)), 1),
+                "p99_ms": round(float(np.percentile(ms, 99)), 1),
+                "status_codes": dict(self.status[endpoint]),
+            }
+        return report
+
+
+async def ensure_users(client: httpx.AsyncClient, count: int, run_id: str) -> List[VirtualUser]:
+    users = []
+    for i in range(count):
+        user = VirtualUser(f"load_{run_id}_{i}@example.com", "loadtest-password")
+        r = await client.post("/auth/signup", json={"email": user.email, "password": user.password, "full_name": f"Load User {i}"})
+        if r.status_code != 200:
+            r = await client.post("/auth/login", data={"username": user.email, "password": user.password})
+        r.raise_for_status()
+        user.token = r.json()["access_token"]
+        users.append(user)
+    return users
+
+
+async def fire(client: httpx.AsyncClient, endpoint: str, user: VirtualUser, rng: random.Random,
+               args, stats: Stats):
+    started = time.perf_counter()
+    status = 0
+    try:
+        if endpoint == "search":
+            mode = weighted_choice(rng, args.mode_weights)
+            follow_up = user.session_id and user.turns < args.max_turns and rng.random() < args.followup_prob
+            if not follow_up:
+                user.session_id, user.turns = None, 0
+            params = {"query": rng.choice(FOLLOW_UPS if follow_up else QUERIES), "mode": mode}
+            if user.session_id:
+                params["session_id"] = user.session_id
+            r = await client.get("/search", params=params, headers=user.headers)
+            status = r.status_code
+            if status == 200:
+                body = r.json()
+                user.session_id = body.get("session_id") or user.session_id
+                user.turns += 1
+                stats.degraded += int(bool(body.get("degraded")))
+        elif endpoint == "daily-brief":
+            r = await client.get("/daily-brief", headers=user.headers)
+            status = r.status_code
+        elif endpoint == "chats":
+            r = await client.get("/chats/", headers=user.headers)
+            status = r.status_code
+        elif endpoint == "login":
+            r = await client.post("/auth/login", data={"username": user.email, "password": user.password})
+            status = r.status_code
+        else:
+            raise ValueError(f"Unknown endpoint {endpoint}")
+    except (httpx.HTTPError, asyncio.TimeoutError):
+        status = 0
+    stats.record(endpoint, time.perf_counter() - started, status)
+
+
+async def run_step(base_url: str, rate: float, args, users: List[VirtualUser], seed: int) -> Dict:
+    rng = random.Random(seed)
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        in_flight = set()
+        started = time.perf_counter()
+        next_arrival = started
+        while True:
+            next_arrival += rng.expovariate(rate)
+            if next_arrival - started > args.duration:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            if len(in_flight) >= args.max_in_flight:
+                # Client-side cap reached: count as a drop rather than silently closing the loop
+                stats.dropped += 1
+                continue
+            task = asyncio.create_task(fire(client, weighted_choice(rng, args.endpoint_weights),
+                                            rng.choice(users), rng, args, stats))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+        elapsed = time.perf_counter() - started
+
+    endpoints = stats.summary(elapsed)
+    total = sum(e["requests"] for e in endpoints.values())
+    errors = sum(stats.errors.values()) + stats.dropped
+    all_ms = np.concatenate([np.array(v) * 1000 for v in stats.latencies.values()]) if stats.latencies else np.array([0.0])
+    return {
+        "offered_rps": rate,
+        # Poisson arrivals over a short window drift from the nominal rate; judge against what was sent
+        "arrival_rps": round((total + stats.dropped) / args.duration, 2),
+        "achieved_rps": round((total - sum(stats.errors.values())) / elapsed, 2),
+        "duration_s": round(elapsed, 1),
+        "requests": total,
+        "dropped": stats.dropped,
+        "error_rate": round(errors / max(1, total + stats.dropped), 4),
+        "p99_ms": round(float(np.percentile(all_ms, 99)), 1),
+        "degraded_answers": stats.degraded,
+        "endpoints": endpoints,
+    }
+
+
+def print_step(step: Dict):
+    print(f"\n📈 Offered {step['offered_rps']} rps (arrived {step['arrival_rps']}) -> achieved {step['achieved_rps']} rps "
+          f"| errors {step['error_rate'] * 100:.1f}% | p99 {step['p99_ms']} ms | dropped {step['dropped']} "
+          f"| degraded {step['degraded_answers']}")
+    print(f"   {'endpoint':<12} {'reqs':>6} {'rps':>8} {'err%':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, e in step["endpoints"].items():
+        print(f"   {name:<12} {e['requests']:>6} {e['throughput_rps']:>8} {e['error_rate'] * 100:>6.1f}% "
+              f"{e['p50_ms']:>8}ms {e['p95_ms']:>8}ms {e['p99_ms']:>8}ms")
+
+
+def launch_backend(args) -> Tuple[subprocess.Popen, str]:
+    """Start uvicorn with offline providers, a synthetic corpus and the chosen database."""
+    sys.path.insert(0, BACKEND_DIR)
+    from bench_retrieval import generate_csv
+    from providers import LocalHashEmbedder
+
+    workdir = tempfile.mkdtemp(prefix="mvai_load_")
+    csv_path = os.path.join(workdir, "chunks.csv")
+    print(f"🧪 Generating {args.corpus_rows:,}-row synthetic corpus in {workdir}...")
+    generate_csv(csv_path, args.corpus_rows, "embedding", embedder=LocalHashEmbedder())
+
+    env = dict(os.environ,
+               EMBEDDING_PROVIDER="local",
+               LLM_PROVIDER="fake",
+               DATA_PATH=csv_path,
+               DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}")
+    # Create the schema once up front; N workers racing on create_all trip over each other
+    subprocess.run([sys.executable, "-c", "import models; from database import Base, engine; Base.metadata.create_all(bind=engine)"],
+                   cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    port = args.port
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(args.workers), "--log-level", "warning"]
+    log_path = os.path.join(workdir, "backend.log")
+    print(f"🚀 Launching backend: {' '.join(cmd)} (logs: {log_path})")
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=open(log_path, "w"), stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                print("✅ Backend ready")
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError("Backend exited during startup")
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("Backend did not become ready in time")
+
+
+async def main_async(args):
+    proc = None
+    base_url = args.base_url
+    if args.launch:
+        proc, base_url = launch_backend(args)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+            users = await ensure_users(client, args.users, args.run_id)
+        rates = [float(r) for r in args.sweep.split(",")] if args.sweep else [args.rate]
+        steps = []
+        for i, rate in enumerate(rates):
+            step = await run_step(base_url, rate, args, users, seed=args.seed + i)
+            print_step(step)
+            steps.append(step)
+
+        saturation = None
+        for step in steps:
+            keeps_up = step["achieved_rps"] >= 0.95 * step["arrival_rps"]
+            if keeps_up and step["p99_ms"] <= args.slo_p99 and step["error_rate"] <= args.max_error_rate:
+                saturation = step["offered_rps"]
+        print(f"\n🏁 Saturation point with {args.workers} worker(s): "
+              f"{saturation if saturation is not None else 'below lowest offered rate'} rps "
+              f"(SLO p99 <= {args.slo_p99} ms, errors <= {args.max_error_rate * 100:.1f}%)")
+
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({"base_url": base_url, "workers": args.workers, "saturation_rps": saturation,
+                           "steps": steps}, f, indent=2, ensure_ascii=False)
+            print(f"💾 Report written to {args.out}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the MANA VARTHA AI backend")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rate", type=float, default=10, help="Offered arrival rate (requests/second)")
+    parser.add_argument("--sweep", help="Comma-separated rates to step through, e.g. 5,10,20,40")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per rate step")
+    parser.add_argument("--endpoints", default="search=0.75,chats=0.12,login=0.08,daily-brief=0.05")
+    parser.add_argument("--modes", default="standard=0.6,quick=0.3,deep=0.1")
+    parser.add_argument("--followup-prob", type=float, default=0.4, help="Chance a search continues the user's conversation")
+    parser.add_argument("--max-turns", type=int, default=6)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--max-in-flight", type=int, default=512)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--slo-p99", type=float, default=10000, help="p99 latency SLO in ms")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--run-id", default=str(int(time.time())))
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--launch", action="store_true", help="Start a local backend with offline providers")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when launching")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url", help="DATABASE_URL for the launched backend (default: temp SQLite)")
+    parser.add_argument("--corpus-rows", type=int, default=5000)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    args = parser.parse_args()
+    args.endpoint_weights = parse_weights(args.endpoints)
+    args.mode_weights = parse_weights(args.modes)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
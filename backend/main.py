@@ -5,21 +5,32 @@ Multilingual Telugu News RAG Application
 
 import os
 import logging
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import uvicorn
-from sqlalchemy.orm import Session
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
 import asyncio
+import time
+import json
 
 from rag_engine import initialize_rag, get_rag_engine
-from database import engine, Base, get_db
+from deadline import Deadline
+from scheduler import Overloaded, Priority, request_priority, llm_limiter, embed_limiter
+from singleflight import SingleFlight
+from metrics import REGISTRY, observe_stage, record_cache, cache_hit_ratio
+from tracing import TRACE_HEADER, resolve_trace_id, start_request, stage_durations, server_timing_header
+from capture import TrafficCapture
+from readiness import LOAD_PROGRESS, warmup_queries_from_env
+from database import engine, write_engine, Base, get_async_db, SessionLocal
+from migrations import run_migrations
 from routers import auth, chat
-from models import User, ChatSession, ChatMessage
-from auth import get_current_user
+from chat_store import load_history, save_exchange
+from chat_memory import drain as drain_summaries, prompt_context, schedule_summary_update
+from write_behind import init_chat_writer, get_chat_writer
+from auth import Principal, get_current_user
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +38,10 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# One JSON line per request (trace id, status, per-stage durations)
+request_logger = logging.getLogger("mvai.requests")
+# Opt-in anonymized /search capture for replay (CAPTURE_PATH)
+traffic_capture = TrafficCapture.from_env()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -46,8 +61,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[TRACE_HEADER, "Server-Timing"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Give every request a trace id and report where its time went"""
+    trace_id = resolve_trace_id(request.headers.get(TRACE_HEADER))
+    start_request(trace_id)
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        total_ms = (time.perf_counter() - started) * 1000
+        durations = stage_durations()
+        request_logger.info(json.dumps({
+            "trace_id": trace_id,
+            "method": request.method,
+            "path": request.url.path,
+            "status": status_code,
+            "duration_ms": round(total_ms, 1),
+            "stages_ms": {stage: round(ms, 1) for stage, ms in durations.items()},
+        }, ensure_ascii=False))
+
+    response.headers[TRACE_HEADER] = trace_id
+    if request.url.path == "/search":
+        response.headers["Server-Timing"] = server_timing_header(durations, total_ms)
+        response.headers["Timing-Allow-Origin"] = "*"
+        if traffic_capture.enabled:
+            # Recorded here rather than in the handler so shed (503) and failed requests are kept too
+            traffic_capture.record(
+                request.query_params.get("query", ""), request.query_params.get("mode", "standard"),
+                status_code, total_ms, durations, getattr(request.state, "capture", None)
+            )
+    return response
+
+# Collapses concurrent identical questions (e.g. breaking news bursts) into one pipeline run
+search_flights = SingleFlight()
+
 # Response model
 class SearchResponse(BaseModel):
     query: str
@@ -57,11 +110,26 @@ class SearchResponse(BaseModel):
     chunks_retrieved: Optional[int] = None
     new_session_title: Optional[str] = None
     session_id: Optional[str] = None
+    degraded: Optional[bool] = None
+    retrieved_ids: Optional[List[str]] = None
 
 class HealthResponse(BaseModel):
     status: str
     message: str
     chunks_loaded: int
+    llm_circuits: Optional[Dict[str, Dict[str, Any]]] = None
+    llm_hedging: Optional[Dict[str, Any]] = None
+    admission: Optional[Dict[str, Dict[str, Any]]] = None
+    dedup: Optional[Dict[str, int]] = None
+    load_progress: Optional[Dict[str, Any]] = None
+
+# Shutdown event - Persist chat history still buffered by the write-behind queue
+@app.on_event("shutdown")
+async def shutdown_event():
+    await drain_summaries()
+    chat_writer = get_chat_writer()
+    if chat_writer:
+        await asyncio.to_thread(chat_writer.stop)
 
 # Startup event - Initialize RAG engine & Database
 @app.on_event("startup")
@@ -71,7 +139,11 @@ async def startup_event():
         # Create Database Tables
         logger.info("📦 Creating Database Tables if not exist...")
         Base.metadata.create_all(bind=engine)
+        applied = await asyncio.to_thread(run_migrations, write_engine)
+        if applied:
+            logger.info(f"✅ Applied schema migrations {', '.join(applied)}")
         logger.info("✅ Database Tables Ready")
+        init_chat_writer(SessionLocal)
 
         # Path to CSV file
         # Path to CSV file OR Chunks Directory
@@ -79,7 +151,10 @@ async def startup_event():
         csv_path = os.path.join(base_dir, "data", "all_telugu_chunk_embeddings_clean.csv")
         chunks_dir = os.path.join(base_dir, "data", "chunks")
 
-        if os.path.exists(csv_path):
+        if os.getenv("DATA_PATH"):
+            # Explicit override (benchmarks, load tests, alternate corpora)
+            csv_path = os.getenv("DATA_PATH")
+        elif os.path.exists(csv_path):
             logger.info(f"📂 Found single dataset file: {csv_path}")
         elif os.path.exists(chunks_dir) and any(f.endswith('.csv') for f in os.listdir(chunks_dir)):
             logger.info(f"📂 Found dataset chunks in: {chunks_dir}")
@@ -105,9 +180,19 @@ async def startup_event():
             logger.info("⏳ Starting background RAG data loading...")
             try:
                 # Initialize RAG engine in a thread pool to avoid blocking event loop
-                await asyncio.to_thread(initialize_rag, csv_path)
+                engine_rag = await asyncio.to_thread(initialize_rag, csv_path, LOAD_PROGRESS)
                 logger.info("✅ RAG Engine Loaded successfully in background!")
+                warmup_queries = warmup_queries_from_env()
+                if warmup_queries:
+                    # Page in the index and open provider connections before /readyz says yes
+                    LOAD_PROGRESS.set_phase("warming")
+                    ran = await asyncio.to_thread(
+                        engine_rag.warm_up, warmup_queries, float(os.getenv("WARMUP_TIMEOUT", "60"))
+                    )
+                    logger.info(f"🔥 Warm-up ran {ran}/{len(warmup_queries)} queries")
+                LOAD_PROGRESS.set_phase("ready")
             except Exception as e:
+                LOAD_PROGRESS.fail(e)
                 logger.error(f"❌ Background RAG load failed: {e}")
 
         # Start RAG loading in background
@@ -159,43 +244,139 @@ async def root():
         "auth_enabled": True
     }
 
+def require_ready():
+    """Dependency for endpoints that need the RAG engine: 503 + Retry-After until it is ready."""
+    if not LOAD_PROGRESS.ready:
+        progress = LOAD_PROGRESS.snapshot()
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is starting ({progress['phase']}), please retry shortly",
+            headers={"Retry-After": str(LOAD_PROGRESS.retry_after())}
+        )
+
+@app.get("/livez")
+async def livez():
+    """Liveness: the process and its event loop respond. Never depends on the RAG load."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: index loaded and warm-up finished, safe to route /search here."""
+    progress = LOAD_PROGRESS.snapshot()
+    if not LOAD_PROGRESS.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "not_ready", "progress": progress},
+            headers={"Retry-After": str(LOAD_PROGRESS.retry_after())}
+        )
+    return {"status": "ready", "progress": progress}
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    if not LOAD_PROGRESS.ready and LOAD_PROGRESS.phase != "failed":
+        # Still loading is not unhealthy: don't get the worker restarted or evicted for it
+        return HealthResponse(
+            status="loading",
+            message=f"RAG engine is loading ({LOAD_PROGRESS.phase})",
+            chunks_loaded=0,
+            load_progress=LOAD_PROGRESS.snapshot()
+        )
     try:
         engine_rag = get_rag_engine()
+        llm_circuits = engine_rag.llm_health()
+        degraded = bool(llm_circuits) and all(c["state"] == "open" for c in llm_circuits.values())
         return HealthResponse(
-            status="healthy",
-            message="RAG engine is operational",
-            chunks_loaded=len(engine_rag.chunks)
+            status="degraded" if degraded else "healthy",
+            message="All Gemini circuits open, generation is failing fast" if degraded else "RAG engine is operational",
+            chunks_loaded=len(engine_rag.chunks),
+            llm_circuits=llm_circuits,
+            llm_hedging=engine_rag.llm_hedge_stats(),
+            admission={"llm": llm_limiter.stats(), "embed": embed_limiter.stats()},
+            dedup=search_flights.stats(),
+            load_progress=LOAD_PROGRESS.snapshot()
         )
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unavailable")
 
-@app.get("/daily-brief")
-async def daily_brief(current_user: Optional[User] = Depends(get_current_user)):
+def _register_gauges():
+    """Scrape-time gauges: read live state only when /metrics is requested."""
+    def rag_attr(fn):
+        def read():
+            try:
+                return fn(get_rag_engine())
+            except RuntimeError:
+                return None  # RAG still loading
+        return read
+
+    REGISTRY.gauge("mvai_ready", "1 once the index is loaded and warm-up finished", lambda: int(LOAD_PROGRESS.ready))
+    REGISTRY.gauge("mvai_load_vectors_added", "Vectors loaded so far by the startup load",
+                   lambda: LOAD_PROGRESS.vectors_added)
+    REGISTRY.gauge("mvai_index_vectors", "Vectors in the FAISS index", rag_attr(lambda r: r.index.ntotal))
+    REGISTRY.gauge("mvai_index_generation", "Index generation id (bumped on every rebuild)",
+                   rag_attr(lambda r: r.index_generation))
+    REGISTRY.gauge("mvai_cache_hit_ratio", "Hit ratio per cache", 
+                   lambda: {(name,): ratio for name in ("singleflight", "auth", "working_set", "working_set_embedding")
+                            if (ratio := cache_hit_ratio(name)) is not None},
+                   labelnames=("cache",))
+    REGISTRY.gauge("mvai_working_sets", "Chat sessions with a retrieval working set in this process",
+                   rag_attr(lambda r: len(r.working_sets) if r.working_sets is not None else None))
+    REGISTRY.gauge("mvai_admission_active", "Provider calls currently running",
+                   lambda: {(name,): l.stats()["active"] for name, l in (("llm", llm_limiter), ("embed", embed_limiter))},
+                   labelnames=("limiter",))
+    REGISTRY.gauge("mvai_admission_queued", "Provider calls waiting for a slot",
+                   lambda: {(name,): l.stats()["queued"] for name, l in (("llm", llm_limiter), ("embed", embed_limiter))},
+                   labelnames=("limiter",))
+    REGISTRY.gauge("mvai_admission_shed", "Provider calls shed since start",
+                   lambda: {(name,): l.stats()["shed"] for name, l in (("llm", llm_limiter), ("embed", embed_limiter))},
+                   labelnames=("limiter",))
+    REGISTRY.gauge("mvai_write_behind_pending", "Chat exchanges buffered for write-behind",
+                   lambda: w.depth() if (w := get_chat_writer()) else None)
+    REGISTRY.gauge("mvai_llm_circuit_open", "1 if the model's circuit breaker is open",
+                   rag_attr(lambda r: {(m,): int(c["state"] == "open") for m, c in r.llm_health().items()}),
+                   labelnames=("model",))
+    REGISTRY.gauge("mvai_llm_hedges", "Hedged Gemini requests fired/won/skipped for lack of a free slot",
+                   rag_attr(lambda r: {(k,): r.llm_hedge_stats().get(k, 0) for k in ("fired", "won", "skipped_capacity")}),
+                   labelnames=("result",))
+
+_register_gauges()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/daily-brief", dependencies=[Depends(require_ready)])
+async def daily_brief(current_user: Optional[Principal] = Depends(get_current_user)):
     """Generate a daily editorial brief."""
     # Allow even guests? Sure, it's generic content.
     try:
         engine_rag = get_rag_engine()
-        result = engine_rag.generate_daily_brief()
+        # Brief regeneration queues behind interactive /search traffic
+        with request_priority(Priority.BRIEF):
+            result = await asyncio.to_thread(engine_rag.generate_daily_brief)
         return result
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Failed to generate brief: {e}")
         raise HTTPException(status_code=500, detail="Could not generate brief")
 
-@app.get("/search", response_model=SearchResponse)
+@app.get("/search", response_model=SearchResponse, dependencies=[Depends(require_ready)])
 async def search(
+    request: Request,
     query: str = Query(..., description="User question"),
     session_id: Optional[str] = Query(None, description="Optional Chat Session ID to save history"),
     mode: str = Query("standard", description="Response mode: standard, quick, deep"),
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user) # Made optional for backward compatibility
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_current_user) # Made optional for backward compatibility
 ):
     """
     Search endpoint - Main RAG query interface
     """
+    # Bound the whole request (history, rewrite, embed, search, generation)
+    deadline = Deadline.from_env()
     try:
         if not query or len(query.strip()) == 0:
             raise HTTPException(status_code=400, detail="Query cannot be empty")
@@ -205,126 +386,121 @@ async def search(
         # Get RAG engine
         engine_rag = get_rag_engine()
         
-        # 0. Fetch History if session_id exists
+        # 0. Fetch History if session_id exists (ownership check + summary + last turns in one query)
         history_list = []
+        summary = None
+        chat_history = None
+        chat_writer = get_chat_writer()
+        # Read once: a rollback below would expire the ORM object, and async sessions can't lazy-refresh
+        user_id = current_user.id if current_user else None
+        stage_started = time.perf_counter()
         if session_id and current_user:
             # We need to fetch messages BEFORE generating the answer
             try:
-                # Basic check for ownership/existence
-                session = db.query(ChatSession).filter(
-                    ChatSession.id == session_id,
-                    ChatSession.user_id == current_user.id
-                ).first()
-                
-                if session:
-                    # Fetch last 6 messages
-                    recent_msgs = db.query(ChatMessage)\
-                        .filter(ChatMessage.session_id == session_id)\
-                        .order_by(ChatMessage.timestamp.desc())\
-                        .limit(6)\
-                        .all()
-                    
-                    # Reverse to chronological order (Oldest -> Newest)
-                    for msg in reversed(recent_msgs):
-                        history_list.append({
-                            "role": msg.role,
-                            "content": msg.content
-                        })
-                else:
-                    # Session not found or other issues, just ignore
-                    pass
+                # With write-behind, exchanges not yet flushed are merged into the history
+                loader = chat_writer.load_history if chat_writer else load_history
+                chat_history = await loader(db, session_id, user_id)
+                # Rolling summary + the turns it doesn't cover yet, instead of all recent raw turns
+                summary, history_list = prompt_context(chat_history)
             except Exception as e:
                 logger.warning(f"Failed to fetch history: {e}")
+                await db.rollback()
+            observe_stage("history_load", time.perf_counter() - stage_started)
+        if current_user:
+            # End the read transaction: the pooled connection isn't held while the answer is generated
+            await db.commit()
+        request.state.capture = {"history_len": len(history_list)}
+
+        # Follow-ups are first searched in the chunks their session retrieved before
+        working_set = None
+        if current_user and engine_rag.working_sets is not None:
+            if chat_history:
+                working_set = engine_rag.working_sets.get(chat_history.session_id)
+            if working_set is None:
+                working_set = engine_rag.working_sets.new(engine_rag.index_generation)
 
         # Generate answer with history
-        result = engine_rag.generate_answer(query, mode=mode, history=history_list)
+        # Run the blocking pipeline off the event loop (admission control may queue it)
+        def run_pipeline():
+            return asyncio.to_thread(
+                engine_rag.generate_answer, query, mode=mode, history=history_list, deadline=deadline,
+                summary=summary, working_set=working_set
+            )
+
+        stage_started = time.perf_counter()
+        if history_list:
+            # Follow-ups depend on their own conversation, never share them
+            result = await run_pipeline()
+        else:
+            async def run_shared():
+                # The leader's working set travels with the result: it holds what was retrieved
+                return await run_pipeline(), working_set
+
+            flight_key = (" ".join(query.lower().split()), mode)
+            (shared_result, leader_set), shared = await search_flights.do(flight_key, run_shared)
+            record_cache("singleflight", shared)
+            if shared:
+                logger.info("🔗 Joined in-flight pipeline for identical query")
+                if working_set is not None and leader_set is not None:
+                    # Our own set was never filled: start the session from the chunks the leader retrieved
+                    working_set = leader_set.copy()
+            # Each waiter gets its own copy; persistence below adds per-user fields
+            result = dict(shared_result)
+        observe_stage("pipeline", time.perf_counter() - stage_started)
         
         logger.info(f"📤 Returning answer (language: {result['language']})")
         
         # Persistence Logic
-        final_session_id = session_id
-        
         # Only proceed if we have a user (even if session_id is missing, we can create one)
         if current_user:
+            stage_started = time.perf_counter()
             try:
-                chat_session = None
-                
-                # 1. Try to find existing session if an ID was provided
-                if session_id:
-                    chat_session = db.query(ChatSession).filter(
-                        ChatSession.id == session_id,
-                        ChatSession.user_id == current_user.id
-                    ).first()
-                
-                # 2. If not found (or no ID), create NEW session
-                if not chat_session:
-                    logger.info(f"ℹ️ Creating new session for user {current_user.id} (Proposed ID: {session_id} not found/valid)")
-                    chat_session = ChatSession(
-                        user_id=current_user.id,
-                        title="New Chat",
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    )
-                    db.add(chat_session)
-                    db.commit()
-                    db.refresh(chat_session)
-                    final_session_id = chat_session.id
-                
-                # 3. Save User Query
-                user_msg = ChatMessage(
-                    session_id=final_session_id,
-                    role="user",
-                    content=query,
-                    timestamp=datetime.utcnow()
-                )
-                db.add(user_msg)
-                
-                # 4. Save Assistant Answer
-                bot_msg = ChatMessage(
-                    session_id=final_session_id,
-                    role="assistant",
-                    content=result['answer'],
-                    timestamp=datetime.utcnow()
-                )
-                db.add(bot_msg)
-                
-                # 5. Auto-Title Logic
-                # If title is New Chat/empty, generate one
-                if chat_session.title in ["New Chat", None, ""]:
-                    words = query.split()
-                    selected_words = words[:6] # Max 6 words
-                    new_title = " ".join(selected_words).title()
-                    # Clean up basic punctuation if needed
-                    new_title = new_title.strip(".,!?")
-                    
-                    chat_session.title = new_title
-                    chat_session.updated_at = datetime.utcnow()
-                    db.add(chat_session)
-                    result['new_session_title'] = new_title
-                else:
-                    # Just update timestamp
-                    chat_session.updated_at = datetime.utcnow()
-                    db.add(chat_session)
-
-                db.commit()
+                # Reuses the session loaded above: no second lookup, one transaction for all writes
+                # (or none at all in the request with write-behind: it is queued and batched)
+                save = chat_writer.submit if chat_writer else save_exchange
+                saved = await save(db, user_id, chat_history, query, result['answer'])
+                if saved["new_session_title"]:
+                    result['new_session_title'] = saved["new_session_title"]
                 
                 # Add the actual session ID to the response so frontend can sync
-                result['session_id'] = final_session_id
+                result['session_id'] = saved["session_id"]
+                if working_set is not None:
+                    engine_rag.working_sets.put(saved["session_id"], working_set)
+
+                # The turns before this one move into the session summary, off the request path
+                if saved["session_id"] == session_id:
+                    schedule_summary_update(engine_rag, user_id, chat_history)
                 
             except Exception as db_err:
                 logger.error(f"⚠️ Failed to save chat history: {db_err}")
                 # Don't fail the request
+            observe_stage("persist", time.perf_counter() - stage_started)
         else:
             logger.warning("⚠️ No current_user, skipping persistence.")
-        
+
+        request.state.capture.update(
+            session_id=result.get("session_id"),
+            retrieved_ids=result.get("retrieved_ids", []),
+            degraded=result.get("degraded"),
+        )
         return SearchResponse(**result)
         
-    except HTTPException:
+    except (HTTPException, Overloaded):
         raise
     except Exception as e:
         logger.error(f"❌ Error processing query: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    """Load shedding: fail fast with 503 + Retry-After instead of timing out late"""
+    logger.warning(f"🚦 Shedding request to {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
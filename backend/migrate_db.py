@@ -1,36 +1,42 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-
-print(f"Connecting to: {DATABASE_URL}")
-
-try:
-    engine = create_engine(DATABASE_URL)
-    with engine.connect() as conn:
-        print("Adding updated_at column...")
-        try:
-            # Important: Autocommit might not be on by default for raw connections in some drivers
-            # So we use a transaction
-            trans = conn.begin()
-            conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();"))
-            trans.commit()
-            print("✅ Column added successfully (Transaction Committed).")
-        except Exception as e:
-            if "duplicate column" in str(e) or "already exists" in str(e):
-                print("⚠️ Column already exists.")
-            else:
-                print(f"❌ Failed to add column: {e}")
-                # trans.rollback() # if we had one active
-                
-        # Also update existing rows to match created_at or now
-        # conn.execute(text("UPDATE chat_sessions SET updated_at = created_at WHERE updated_at IS NULL;"))
-        # Using DEFAULT NOW() handles new ones, but existing ones might need backfill if added as NULLable.
-        # But I used DEFAULT NOW() in SQL, so it should be fine.
-        
-except Exception as e:
-    print(f"Error: {e}")
+"""
+MANA VARTHA AI - Database Migration CLI
+Applies the pending schema migrations from migrations.py to DATABASE_URL (the API also runs
+them at startup). Safe to re-run: applied versions are recorded in `schema_migrations`.
+
+Usage:
+    python migrate_db.py
+    python migrate_db.py --status
+"""
+
+import sys
+import logging
+import argparse
+
+from database import Base, write_engine
+from migrations import MIGRATIONS, applied_versions, run_migrations
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply MANA VARTHA AI schema migrations")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations, change nothing")
+    args = parser.parse_args()
+
+    print(f"Connecting to: {write_engine.url.render_as_string(hide_password=True)}")
+    try:
+        if args.status:
+            done = set(applied_versions(write_engine))
+            for migration in MIGRATIONS:
+                print(f"{'✅' if migration.version in done else '⏳'} {migration.version} {migration.description}")
+            return
+        Base.metadata.create_all(bind=write_engine)
+        applied = run_migrations(write_engine)
+        print(f"✅ Applied {', '.join(applied)}" if applied else "✅ Schema is up to date")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
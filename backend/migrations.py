@@ -0,0 +1,171 @@
+"""
+MANA VARTHA AI - Schema Migrations
+Ordered, recorded schema changes for databases created before a model change: `create_all` only
+creates missing tables, never columns or indexes on existing ones. Applied versions are stored
+in `schema_migrations`; every step is idempotent, so a fresh database just records them.
+
+Runs at startup after `create_all`, or by hand:
+    python migrate_db.py            # apply pending migrations
+    python migrate_db.py --status   # list applied / pending
+
+With several workers starting at once, Postgres serializes runners on an advisory lock.
+Indexes are built CONCURRENTLY on Postgres so chat writes continue during the build.
+"""
+
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from models import ChatSession, ChatMessage, ChatTombstone
+
+logger = logging.getLogger(__name__)
+
+ADVISORY_LOCK_ID = 0x4D564149  # "MVAI"
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: str
+    description: str
+    apply: Callable[[Connection], None]
+    # False: runs in autocommit (Postgres CREATE INDEX CONCURRENTLY can't run inside a transaction)
+    transactional: bool = True
+
+
+def _add_session_updated_at(conn: Connection):
+    columns = {c["name"] for c in inspect(conn).get_columns("chat_sessions")}
+    if "updated_at" not in columns:
+        conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN updated_at TIMESTAMP"))
+    conn.execute(text("UPDATE chat_sessions SET updated_at = created_at WHERE updated_at IS NULL"))
+
+
+def _add_session_summary(conn: Connection):
+    columns = {c["name"] for c in inspect(conn).get_columns("chat_sessions")}
+    if "summary" not in columns:
+        conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN summary TEXT"))
+    if "summary_through" not in columns:
+        conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN summary_through TIMESTAMP"))
+
+
+def _drop_invalid_indexes(conn: Connection, names: List[str]) -> List[str]:
+    """
+    Postgres: an interrupted or failed CREATE INDEX CONCURRENTLY leaves an INVALID index under the
+    name, which the planner never uses. Drop those so they are rebuilt; returns the dropped names.
+    """
+    invalid = list(conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = ANY(:names) AND NOT i.indisvalid"), {"names": names}).scalars())
+    for name in invalid:
+        logger.warning(f"⚠️ Index {name} is INVALID (interrupted concurrent build), rebuilding it")
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    return invalid
+
+
+def _create_indexes(*indexes) -> Callable[[Connection], None]:
+    def apply(conn: Connection):
+        existing = {i["name"] for table in {index.table.name for index in indexes}
+                    for i in inspect(conn).get_indexes(table)}
+        if conn.dialect.name == "postgresql":
+            existing -= set(_drop_invalid_indexes(conn, [index.name for index in indexes]))
+        for index in indexes:
+            if index.name in existing:
+                continue
+            started = time.perf_counter()
+            if conn.dialect.name == "postgresql":
+                columns = ", ".join(c.name for c in index.columns)
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} "
+                                  f"ON {index.table.name} ({columns})"))
+            else:
+                index.create(conn, checkfirst=True)
+            logger.info(f"🗂️ Built index {index.name} in {time.perf_counter() - started:.1f}s")
+    return apply
+
+
+def _create_tables(*models) -> Callable[[Connection], None]:
+    def apply(conn: Connection):
+        for model in models:
+            model.__table__.create(conn, checkfirst=True)
+    return apply
+
+
+def _index(model, name: str):
+    return next(i for i in model.__table__.indexes if i.name == name)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration("0001", "chat_sessions.updated_at (formerly migrate_db.py)", _add_session_updated_at),
+    Migration("0002", "composite indexes for history and sidebar queries",
+              _create_indexes(_index(ChatMessage, "ix_chat_messages_session_timestamp"),
+                              _index(ChatSession, "ix_chat_sessions_user_updated")),
+              transactional=False),
+    Migration("0003", "chat_tombstones for /chats/sync", _create_tables(ChatTombstone)),
+    Migration("0004", "chat_sessions.summary / summary_through (rolling conversation memory)", _add_session_summary),
+    # 0002 could be recorded over an INVALID index left by an interrupted build: check them again
+    Migration("0005", "rebuild chat indexes left INVALID by an interrupted concurrent build",
+              _create_indexes(_index(ChatMessage, "ix_chat_messages_session_timestamp"),
+                              _index(ChatSession, "ix_chat_sessions_user_updated")),
+              transactional=False),
+]
+
+
+def applied_versions(engine: Engine) -> List[str]:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return []
+        return list(conn.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    done = set(applied_versions(engine))
+    return [m for m in MIGRATIONS if m.version not in done]
+
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    """Postgres advisory lock so concurrently starting workers migrate one at a time."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    # Autocommit: an open transaction on this connection would stall CREATE INDEX CONCURRENTLY
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """Apply pending migrations in order; returns the versions applied by this call."""
+    _metadata.create_all(engine)
+    applied = []
+    with _migration_lock(engine):
+        for migration in pending_migrations(engine):
+            logger.info(f"📦 Applying migration {migration.version}: {migration.description}")
+            if migration.transactional:
+                with engine.begin() as conn:
+                    migration.apply(conn)
+            else:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    migration.apply(conn)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(schema_migrations.insert().values(version=migration.version,
+                                                                   applied_at=datetime.utcnow()))
+            except IntegrityError:
+                # Another process (no advisory lock on SQLite) recorded it first
+                continue
+            applied.append(migration.version)
+    return applied
@@ -0,0 +1,119 @@
+"""
+MANA VARTHA AI - Gemini Model Discovery Cache
+Resolves the Gemini fallback chain from a small local cache file instead of calling
+genai.list_models() on every worker start; stale entries are refreshed in the background.
+
+    GEMINI_MODEL_CACHE=.cache/gemini_models.json   # shared by all workers on the host
+    GEMINI_MODEL_CACHE_TTL=86400                   # seconds before a background refresh
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(BACKEND_DIR, ".cache", "gemini_models.json")
+DEFAULT_MODEL = "models/gemini-1.5-flash"
+
+
+def _list_available_models() -> List[str]:
+    import google.generativeai as genai
+    return [m.name for m in genai.list_models()]
+
+
+class ModelDiscovery:
+    """
+    Cache entries remember which API key they were listed with (as a hash), since model
+    access differs between keys. A stale entry is still used at startup; it is only
+    re-listed in the background.
+    """
+
+    def __init__(self, preferred: List[str], cache_path: str = DEFAULT_CACHE_PATH, ttl: float = 86400,
+                 api_key: Optional[str] = None, list_models: Callable[[], List[str]] = _list_available_models):
+        self.preferred = list(preferred)
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.key_fingerprint = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+        self._list_models = list_models
+        self.stale = True
+
+    @classmethod
+    def from_env(cls, preferred: List[str], **kwargs) -> "ModelDiscovery":
+        return cls(
+            preferred,
+            cache_path=os.getenv("GEMINI_MODEL_CACHE", DEFAULT_CACHE_PATH),
+            ttl=float(os.getenv("GEMINI_MODEL_CACHE_TTL", "86400")),
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            **kwargs
+        )
+
+    def chain_from(self, available: List[str]) -> List[str]:
+        # Preferred models in priority order; the client falls back along this chain at runtime
+        chain = [model for model in self.preferred if model in available]
+        return chain or [DEFAULT_MODEL]
+
+    def _read_cache(self) -> Optional[dict]:
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key_fingerprint") != self.key_fingerprint or not entry.get("available"):
+            return None
+        return entry
+
+    def _write_cache(self, available: List[str]):
+        try:
+            directory = os.path.dirname(os.path.abspath(self.cache_path))
+            os.makedirs(directory, exist_ok=True)
+            # Write-then-rename so concurrent workers never read a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key_fingerprint": self.key_fingerprint, "fetched_at": time.time(),
+                           "available": available}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write Gemini model cache {self.cache_path}: {e}")
+
+    def _fetch(self) -> List[str]:
+        available = self._list_models()
+        self._write_cache(available)
+        self.stale = False
+        return available
+
+    def resolve(self) -> List[str]:
+        """Model chain for startup: cached if possible, listed synchronously only on a cold cache."""
+        entry = self._read_cache()
+        if entry is not None:
+            age = time.time() - entry.get("fetched_at", 0)
+            self.stale = age > self.ttl
+            logger.info(f"📇 Gemini models from cache ({age / 3600:.1f}h old{', stale' if self.stale else ''})")
+            return self.chain_from(entry["available"])
+        try:
+            return self.chain_from(self._fetch())
+        except Exception as e:
+            # Don't block startup on the listing call; the circuit breakers cope with a missing model
+            logger.warning(f"⚠️ Gemini model listing failed ({e}), using preferred chain unverified")
+            self.stale = True
+            return list(self.preferred)
+
+    def refresh_in_background(self, on_update: Callable[[List[str]], None]) -> threading.Thread:
+        """Re-list models off the startup path and hand a changed chain to `on_update`."""
+        def run():
+            try:
+                chain = self.chain_from(self._fetch())
+                logger.info(f"📇 Gemini model cache refreshed: {chain}")
+                on_update(chain)
+            except Exception as e:
+                logger.warning(f"⚠️ Background Gemini model refresh failed: {e}")
+
+        thread = threading.Thread(target=run, name="gemini-model-refresh", daemon=True)
+        thread.start()
+        return thread
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -25,6 +25,13 @@ class ChatSession(Base):
     title = Column(String, default="New Chat")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Rolling summary of the conversation up to summary_through (the last message folded in),
+    # kept up to date in the background by chat_memory.py
+    summary = Column(Text, nullable=True)
+    summary_through = Column(DateTime, nullable=True)
+
+    # Sidebar: WHERE user_id = ? ORDER BY updated_at DESC (added to existing DBs by migrations.py)
+    __table_args__ = (Index("ix_chat_sessions_user_updated", "user_id", "updated_at"),)
 
     # Relationships
     user = relationship("User", back_populates="sessions")
@@ -39,5 +46,19 @@ class ChatMessage(Base):
     content = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    # History: WHERE session_id = ? ORDER BY timestamp DESC LIMIT 6 (added to existing DBs by migrations.py)
+    __table_args__ = (Index("ix_chat_messages_session_timestamp", "session_id", "timestamp"),)
+
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
+
+class ChatTombstone(Base):
+    """A deleted session, kept so /chats/sync can tell clients to drop it."""
+    __tablename__ = "chat_tombstones"
+
+    session_id = Column(String, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Sync: WHERE user_id = ? AND deleted_at > ? ORDER BY deleted_at
+    __table_args__ = (Index("ix_chat_tombstones_user_deleted", "user_id", "deleted_at"),)
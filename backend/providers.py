@@ -0,0 +1,189 @@
+"""
+MANA VARTHA AI - Embedding & LLM Providers
+Real providers (Cohere, Gemini) plus deterministic offline stand-ins for benchmarking and load tests.
+
+    EMBEDDING_PROVIDER=cohere|local   (default: cohere)
+    LLM_PROVIDER=gemini|fake          (default: gemini)
+"""
+
+import os
+import math
+import time
+import zlib
+import random
+import threading
+from typing import Callable, Iterator, List, Optional
+import numpy as np
+
+COHERE_EMBED_MODEL = "embed-multilingual-v3.0"
+
+
+def embedding_provider() -> str:
+    return os.getenv("EMBEDDING_PROVIDER", "cohere").strip().lower()
+
+
+def llm_provider() -> str:
+    return os.getenv("LLM_PROVIDER", "gemini").strip().lower()
+
+
+class CohereEmbedder:
+    """Cohere embed-multilingual-v3.0 (1024-d)."""
+
+    name = "cohere"
+
+    def __init__(self, api_key: str, model: str = COHERE_EMBED_MODEL):
+        import cohere
+        self.client = cohere.Client(api_key)
+        self.model = model
+
+    def embed(self, texts: List[str], input_type: str = "search_query", timeout: Optional[float] = None) -> np.ndarray:
+        request_options = {"timeout_in_seconds": max(1, int(timeout)), "max_retries": 0} if timeout else None
+        response = self.client.embed(
+            texts=texts,
+            model=self.model,
+            input_type=input_type,
+            request_options=request_options
+        )
+        return np.array(response.embeddings, dtype=np.float32)
+
+
+class LocalHashEmbedder:
+    """
+    Deterministic offline embedder: word and character n-grams are feature-hashed
+    (signed) into `dim` buckets and L2-normalized. Same text -> same vector on every
+    machine, and texts sharing words/subwords land close together, which is enough
+    to exercise retrieval end to end without network access.
+    """
+
+    name = "local"
+
+    def __init__(self, dim: int = 1024, min_n: int = 2, max_n: int = 4):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+
+    def _features(self, text: str) -> Iterator[str]:
+        for word in text.lower().split():
+            yield "w:" + word
+            padded = f"<{word}>"
+            for n in range(self.min_n, self.max_n + 1):
+                for i in range(len(padded) - n + 1):
+                    yield padded[i:i + n]
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Low bits pick the bucket, one high bit picks the sign
+            vec[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+    def embed(self, texts: List[str], input_type: str = "search_query", timeout: Optional[float] = None) -> np.ndarray:
+        return np.vstack([self.embed_one(t) for t in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
+
+
+def create_embedder(dim: int = 1024):
+    provider = embedding_provider()
+    if provider == "local":
+        return LocalHashEmbedder(dim=dim)
+    if provider != "cohere":
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER: {provider}")
+    api_key = os.getenv("COHERE_API_KEY")
+    if not api_key:
+        raise ValueError("COHERE_API_KEY not found in environment variables")
+    return CohereEmbedder(api_key)
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in for genai.GenerativeModel with a configurable latency distribution.
+
+    FAKE_LLM_MEDIAN_MS   median end-to-end latency (default 800)
+    FAKE_LLM_SIGMA       lognormal sigma; p99 ~= median * e^(2.33 * sigma) (default 0.5)
+    FAKE_LLM_ERROR_RATE  fraction of calls that raise (default 0)
+    FAKE_LLM_TTFT_MS     time to first chunk when streaming (default 200)
+    FAKE_LLM_CHUNKS      number of streamed chunks (default 8)
+    FAKE_LLM_SEED        RNG seed for reproducible runs (default 42)
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.median = float(os.getenv("FAKE_LLM_MEDIAN_MS", "800")) / 1000
+        self.sigma = float(os.getenv("FAKE_LLM_SIGMA", "0.5"))
+        self.error_rate = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+        self.ttft = float(os.getenv("FAKE_LLM_TTFT_MS", "200")) / 1000
+        self.chunks = max(1, int(os.getenv("FAKE_LLM_CHUNKS", "8")))
+        seed = int(os.getenv("FAKE_LLM_SEED", "42")) + zlib.crc32(model_name.encode())
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"FakeGenerativeModel({self.model_name!r})"
+
+    def _sample(self):
+        with self._lock:
+            latency = self.median * math.exp(self._rng.gauss(0, self.sigma))
+            failed = self._rng.random() < self.error_rate
+        return latency, failed
+
+    def _answer(self, prompt: str) -> str:
+        if "Rewritten Query:" in prompt:
+            # Query refinement prompt: hand back the user's input as the standalone query
+            marker = "Current User Input:"
+            return prompt.split(marker, 1)[-1].split("\n", 1)[0].strip() if marker in prompt else ""
+        if "Updated Summary:" in prompt:
+            # Conversation summary prompt: previous summary plus the opening words of each new turn
+            previous = prompt.split("Current Summary:\n", 1)[-1].split("\n", 1)[0]
+            turns = prompt.split("New Turns:\n", 1)[-1].split("\nTask:", 1)[0].splitlines()
+            notes = ["; ".join(" ".join(t.split()[:8]) for t in turns if t.strip())]
+            return " | ".join(([] if previous == "(none yet)" else [previous]) + notes)
+        # Echo the first lines of the supplied context so answers look plausible and stay deterministic
+        context = prompt.split("Context", 1)[-1].split("User Question", 1)[0]
+        lines = [l.strip() for l in context.splitlines() if len(l.strip()) > 20][:3]
+        body = "\n".join(lines) if lines else "సమాచారం అందుబాటులో లేదు."
+        return f"మనవార్త (offline): \n{body}\nసంక్షిప్తంగా: పరీక్ష సమాధానం."
+
+    def generate_content(self, prompt, generation_config=None, request_options=None, stream: bool = False, **kwargs):
+        latency, failed = self._sample()
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and latency > timeout:
+            time.sleep(max(0.0, timeout))
+            raise TimeoutError(f"{self.model_name} timed out after {timeout:.2f}s")
+        text = self._answer(str(prompt))
+        if stream:
+            return self._stream(text, latency, failed)
+        time.sleep(latency)
+        if failed:
+            raise RuntimeError(f"503 {self.model_name} unavailable (simulated)")
+        return _FakeResponse(text)
+
+    def _stream(self, text: str, latency: float, failed: bool) -> Iterator[_FakeResponse]:
+        time.sleep(min(self.ttft, latency))
+        if failed:
+            raise RuntimeError(f"503 {self.model_name} unavailable (simulated)")
+        step = max(1, math.ceil(len(text) / self.chunks))
+        pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        gap = max(0.0, latency - self.ttft) / max(1, len(pieces) - 1)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(gap)
+            yield _FakeResponse(piece)
+
+
+def llm_model_factory() -> Callable[[str], object]:
+    """Constructor used by GeminiClient for each model in the fallback chain."""
+    provider = llm_provider()
+    if provider == "fake":
+        return FakeGenerativeModel
+    if provider != "gemini":
+        raise ValueError(f"Unknown LLM_PROVIDER: {provider}")
+    import google.generativeai as genai
+    return genai.GenerativeModel
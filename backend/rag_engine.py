@@ -8,19 +8,50 @@ import ast
 import json
 import logging
 import re
-from typing import List, Dict, Tuple, Optional
-import pandas as pd
+import time
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
 import numpy as np
-import faiss
-import pickle
-import cohere
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from gemini_client import GeminiClient
+from deadline import Deadline
+from scheduler import Overloaded, llm_limiter, embed_limiter
+from metrics import REGISTRY, observe_stage, record_cache, stage_timer
+from providers import create_embedder, llm_model_factory, llm_provider
+from model_discovery import ModelDiscovery
+from capture import chunk_id
+from readiness import LoadProgress
+from shared_index import shared_index_enabled, ensure_snapshot, attach_snapshot, source_files
+from retrieval_ipc import RetrievalClient, RemoteChunks, RemoteIndex
+from working_set import WorkingSet, WorkingSets, working_sets_enabled
+
+if TYPE_CHECKING:
+    # pandas/faiss are imported where they are used so worker startup doesn't pay for them
+    import faiss
+    import pandas as pd
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ANSWERS = REGISTRY.counter("mvai_answers_total", "Answers produced by mode and outcome", labelnames=("mode", "outcome"))
+
+# Conversation context in prompts: a rolling summary plus the turns it doesn't cover yet, each
+# message cut to HISTORY_MESSAGE_CHARS, so prompt size stays bounded however long a chat runs
+HISTORY_MESSAGE_CHARS = 300
+SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "600"))
+
+
+def history_text(history: List[Dict[str, str]], summary: Optional[str] = None) -> str:
+    text = f"Summary of the earlier conversation: {summary}\n" if summary else ""
+    for msg in history:
+        role = "User" if msg['role'] == 'user' else "Assistant"
+        content = msg['content']
+        if len(content) > HISTORY_MESSAGE_CHARS:
+            content = content[:HISTORY_MESSAGE_CHARS] + "..."
+        text += f"{role}: {content}\n"
+    return text
+
 # Load environment variables
 load_dotenv(encoding='utf-8-sig')  # Handle UTF-8 BOM on Windows
 
@@ -30,33 +61,51 @@ class TeluguNewsRAG:
     Handles Telugu, English, and Romanized Telugu queries.
     """
     
-    def __init__(self, csv_path: str, embedding_dim: int = 1024):
+    def __init__(self, csv_path: str, embedding_dim: int = 1024, progress: Optional[LoadProgress] = None,
+                 retrieval_only: bool = False):
         """
         Initialize RAG engine with embeddings and FAISS index.
         
         Args:
             csv_path: Path to CSV with chunk_text and embedding columns
             embedding_dim: Expected embedding dimension (default: 1024 for Cohere multilingual-v3)
+            progress: Receives load progress (files parsed, vectors added) for /readyz
+            retrieval_only: Own the index and embedder but no LLM (used by retrieval_server.py)
         """
         self.csv_path = csv_path
+        self.progress = progress or LoadProgress()
         self.embedding_dim = embedding_dim
         self.similarity_threshold = 0.25  # Lower threshold to allow broader retrieval, strict gate later
         self.top_k = 15
         
-        # Initialize Cohere client
-        api_key = os.getenv("COHERE_API_KEY")
-        if not api_key:
-            raise ValueError("COHERE_API_KEY not found in environment variables")
-        self.cohere_client = cohere.Client(api_key)
+        # Per-stage time budgets (fraction of remaining request deadline, hard cap in seconds)
+        self.rewrite_budget = (0.2, 6.0)
+        self.embed_budget = (0.15, 5.0)
+        self.extractive_reserve = 0.5  # Always keep time to build a local fallback answer
+        self.min_generation_time = 1.0
+        
+        # With RETRIEVAL_SOCKET set, embedding and search run in the retrieval daemon
+        self.retrieval = None if retrieval_only else RetrievalClient.from_env()
+
+        # Per-session retrieval working sets for follow-ups (needs the chunk vectors in this process)
+        self.working_sets = WorkingSets.from_env() if self.retrieval is None and working_sets_enabled() else None
 
-        # Initialize Gemini client
+        # Initialize embedding provider (Cohere, or the offline hashed embedder with EMBEDDING_PROVIDER=local)
+        self.embedder = None
+        if self.retrieval is None:
+            self.embedder = create_embedder(dim=embedding_dim)
+            if hasattr(self.embedder, "client"):
+                self.cohere_client = self.embedder.client
+            logger.info(f"✅ Embedding provider: {self.embedder.name}")
+
+        # Initialize Gemini client (LLM_PROVIDER=fake swaps in the offline stand-in)
         google_api_key = os.getenv("GOOGLE_API_KEY")
-        if not google_api_key:
+        use_fake_llm = llm_provider() == "fake"
+        if retrieval_only:
+            pass
+        elif not google_api_key and not use_fake_llm:
             logger.warning("⚠️ GOOGLE_API_KEY not found. Answer generation will fail.")
         else:
-            # 1️⃣ Explicit Model Validation & Centralized Config
-            available_models = [m.name for m in genai.list_models()]
-            
             # Priority List: 2.5 Flash -> 1.5 Flash -> Pro
             preferred_models = [
                 "models/gemini-2.5-flash", 
@@ -64,30 +113,66 @@ class TeluguNewsRAG:
                 "models/gemini-pro"
             ]
             
-            selected_model = "models/gemini-1.5-flash" # Default fallback
-            for model in preferred_models:
-                if model in available_models:
-                    selected_model = model
-                    break
+            # 1️⃣ Explicit Model Validation & Centralized Config
+            # Resolved from the local discovery cache; only a cold cache lists models over the network
+            discovery = None
+            if use_fake_llm:
+                model_chain = preferred_models
+            else:
+                discovery = ModelDiscovery.from_env(preferred_models)
+                model_chain = discovery.resolve()
             
-            logger.info(f"✅ Selected Primary Model: {selected_model}")
-            self.gemini_model = genai.GenerativeModel(selected_model)
-            self.model_name = selected_model
+            logger.info(f"✅ Selected Primary Model: {model_chain[0]} (fallback chain: {model_chain})")
+            self.llm_client = GeminiClient.from_env(model_chain, model_factory=llm_model_factory(),
+                                                     limiter=llm_limiter)
+            self.gemini_model = self.llm_client.models[model_chain[0]]
+            self.model_name = model_chain[0]
+            if discovery is not None and discovery.stale:
+                discovery.refresh_in_background(self._set_model_chain)
         
         # Load index
         self.index_path = os.path.join(os.path.dirname(csv_path), "faiss_prod.index") if csv_path else "faiss_prod.index"
         
-        if os.path.exists(self.index_path) and os.path.exists(self.index_path + ".meta"):
+        # Bumped on every rebuild so dashboards can tell which index served a request
+        self.index_generation = 1
+        self.shared_index = shared_index_enabled()
+        if self.retrieval is not None:
+            logger.info(f"🔌 Using retrieval daemon at {self.retrieval.socket_path}")
+            self.progress.set_phase("connecting")
+            stats = self.retrieval.wait_until_ready(float(os.getenv("RETRIEVAL_CONNECT_TIMEOUT", "120")))
+            self.chunks, self.embeddings, self.index = RemoteChunks(self.retrieval), None, RemoteIndex(self.retrieval)
+            self.index_generation = stats.get("index_generation", 1)
+            self.progress.update(vectors_added=stats["chunks"])
+        elif self.shared_index:
+            # Multi-worker mode: every worker maps the same read-only snapshot
+            self.chunks, self.embeddings, self.index = self._attach_shared_index(progress=self.progress)
+            self.progress.update(vectors_added=self.index.ntotal)
+        elif os.path.exists(self.index_path) and os.path.exists(self.index_path + ".meta"):
             logger.info(f"🚀 Loading pre-built index from {self.index_path}...")
+            self.progress.set_phase("loading_snapshot")
             self.chunks, self.embeddings, self.index = self._load_index_from_disk()
+            self.progress.update(vectors_added=self.index.ntotal)
         else:
             logger.info("⚠️ Pre-built index not found. Building from scratch (This may take time)...")
-            self.chunks, self.embeddings, self.index = self._load_and_build_index()
+            self.chunks, self.embeddings, self.index = self._load_and_build_index(progress=self.progress)
             
         logger.info(f"✅ RAG Engine initialized with {len(self.chunks)} chunks")
         
+    def _set_model_chain(self, model_chain: List[str]):
+        self.llm_client.set_model_chain(model_chain)
+        self.gemini_model = self.llm_client.models[model_chain[0]]
+        self.model_name = model_chain[0]
+
     def save_index(self, path: str = None):
         """Save FAISS index and metadata to disk."""
+        if self.retrieval is not None:
+            logger.info("ℹ️ Index is owned by the retrieval daemon, nothing to save.")
+            return True
+        if self.shared_index:
+            logger.info("ℹ️ Shared index snapshot is already on disk, nothing to save.")
+            return True
+        import faiss
+        import pickle
         if path is None: path = self.index_path
         
         logger.info(f"💾 Saving index to {path}...")
@@ -107,6 +192,8 @@ class TeluguNewsRAG:
 
     def _load_index_from_disk(self):
         """Load FAISS index and metadata from disk."""
+        import faiss
+        import pickle
         try:
             index = faiss.read_index(self.index_path)
             with open(self.index_path + ".meta", "rb") as f:
@@ -115,23 +202,68 @@ class TeluguNewsRAG:
         except Exception as e:
             logger.error(f"❌ Failed to load index from disk: {e}")
             raise e
+
+    def _attach_shared_index(self, progress: Optional[LoadProgress] = None):
+        """Map the shared snapshot for the current sources, building it first if no worker has."""
+        def build():
+            # faiss_prod.index/.meta is only a shortcut while it is at least as new as every source CSV;
+            # after the daily job rewrites a CSV it is stale and the snapshot must come from the CSVs
+            pickled = [self.index_path, self.index_path + ".meta"]
+            if all(os.path.exists(p) for p in pickled):
+                sources = [p for p in source_files(self.csv_path) if os.path.exists(p)]
+                newest_source = max((os.path.getmtime(p) for p in sources), default=0.0)
+                if min(os.path.getmtime(p) for p in pickled) >= newest_source:
+                    chunks, embeddings, _ = self._load_index_from_disk()
+                    return chunks, embeddings
+                logger.info("ℹ️ Saved index is older than the source CSVs, parsing the CSVs instead")
+            return self._parse_sources(progress)
+
+        path = ensure_snapshot(self.csv_path, build)
+        if progress:
+            progress.set_phase("loading_snapshot")
+        logger.info(f"🔗 Attaching shared index snapshot {path}")
+        return attach_snapshot(path)
     
     def reload_data(self):
         """Reload data from CSV and rebuild index."""
         logger.info("♻️ Reloading data and rebuilding index...")
         try:
-            self.chunks, self.embeddings, self.index = self._load_and_build_index()
+            if self.retrieval is not None:
+                # The daemon rebuilds while it keeps serving the old index, then swaps
+                stats = self.retrieval.reload()
+                self.index_generation = stats.get("index_generation", self.index_generation)
+                logger.info(f"✅ Retrieval daemon reloaded. Total chunks: {stats.get('chunks')}")
+                return True
+            if self.shared_index:
+                # The first worker to reload builds the new snapshot; the others attach to it
+                self.chunks, self.embeddings, self.index = self._attach_shared_index()
+            else:
+                self.chunks, self.embeddings, self.index = self._load_and_build_index()
+            self.index_generation += 1
             logger.info(f"✅ Data reloaded successfully. Total chunks: {len(self.chunks)}")
             return True
         except Exception as e:
             logger.error(f"❌ Failed to reload data: {e}")
             return False
     
-    def _load_and_build_index(self) -> Tuple[List[str], np.ndarray, faiss.IndexFlatIP]:
+    def _load_and_build_index(self, progress: Optional[LoadProgress] = None) -> Tuple[List[str], np.ndarray, "faiss.IndexFlatIP"]:
         """
         Load CSV(s) in chunks, parse embeddings, and build FAISS index.
         Supports single file or directory of CSVs.
+        Pass `progress` for the initial load only; a live reload must not look like startup.
         """
+        import faiss
+        valid_chunks, embeddings_array = self._parse_sources(progress)
+        if progress:
+            progress.set_phase("indexing")
+        index = faiss.IndexFlatIP(self.embedding_dim)
+        index.add(embeddings_array)
+        
+        return valid_chunks, embeddings_array, index
+
+    def _parse_sources(self, progress: Optional[LoadProgress] = None) -> Tuple[List[str], np.ndarray]:
+        """Parse chunk texts and embeddings from the source CSV file or directory."""
+        import pandas as pd
         valid_chunks: List[str] = []
         valid_embeddings: List[np.ndarray] = []
 
@@ -151,6 +283,9 @@ class TeluguNewsRAG:
              raise ValueError(f"No CSV files found in {self.csv_path}")
 
         logger.info(f"📚 Found {len(files_to_load)} files to process.")
+        if progress:
+            progress.set_phase("parsing")
+            progress.update(files_total=len(files_to_load), files_parsed=0, vectors_added=0)
 
         text_col = None
         embedding_format = None
@@ -174,7 +309,11 @@ class TeluguNewsRAG:
                 batch_texts, batch_embs = self._extract_embeddings(chunk_df, text_col, embedding_format)
                 valid_chunks.extend(batch_texts)
                 valid_embeddings.extend(batch_embs)
+                if progress:
+                    progress.add(vectors_added=len(batch_embs))
                 del chunk_df
+            if progress:
+                progress.add(files_parsed=1)
 
         if not valid_embeddings:
             raise ValueError("No valid embeddings found in any file")
@@ -182,26 +321,24 @@ class TeluguNewsRAG:
         logger.info(f"✅ Loaded {len(valid_embeddings)} embeddings values successfully.")
         
         embeddings_array = np.vstack(valid_embeddings).astype('float32')
-        index = faiss.IndexFlatIP(self.embedding_dim)
-        index.add(embeddings_array)
-        
-        return valid_chunks, embeddings_array, index
+        return valid_chunks, embeddings_array
     
-    def _find_text_column(self, df: pd.DataFrame) -> Optional[str]:
+    def _find_text_column(self, df: "pd.DataFrame") -> Optional[str]:
         for col in ['chunk', 'chunk_text', 'content', 'text', 'article', 'news_text', 'Text', 'Content']:
             if col in df.columns: return col
         for col in df.columns:
             if any(word in col.lower() for word in ['chunk', 'text', 'content', 'article']): return col
         return None
     
-    def _detect_embedding_format(self, df: pd.DataFrame) -> str:
+    def _detect_embedding_format(self, df: "pd.DataFrame") -> str:
         for col in ['embedding', 'embeddings', 'vector', 'emb', 'Embedding']:
             if col in df.columns: return f"single_column:{col}"
         numeric_cols = df.select_dtypes(include=['float64', 'float32', 'int64', 'int32']).columns
         if len(numeric_cols) >= 100: return f"spread:{len(numeric_cols)}_columns"
         return "unknown"
     
-    def _extract_embeddings(self, df: pd.DataFrame, text_col: str, embedding_format: str) -> Tuple[List[str], List[np.ndarray]]:
+    def _extract_embeddings(self, df: "pd.DataFrame", text_col: str, embedding_format: str) -> Tuple[List[str], List[np.ndarray]]:
+        import pandas as pd
         batch_chunks = []
         batch_embeddings = []
         
@@ -300,72 +437,134 @@ class TeluguNewsRAG:
             cleaned_lines.append(line)
         return '\n'.join(cleaned_lines)
 
-    def _safe_generate_content(self, prompt: str, retry: bool = True) -> Optional[str]:
+    def _safe_generate_content(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
         """
         3️⃣ Automatic Safe Fallback (FAIL-SAFE)
-        Wraps Gemini calls with error handling, logging, and retry logic.
+        Delegates to the resilient Gemini client (backoff, circuit breakers, model fallback).
+        Returns None when generation is unavailable or `timeout` runs out so callers can degrade gracefully.
+        Raises Overloaded when the Gemini admission queue is full.
         """
-        if not hasattr(self, 'gemini_model'):
+        if not hasattr(self, 'llm_client'):
             logger.error("❌ Gemini model not initialized.")
             return None
 
-        try:
-            response = self.gemini_model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(temperature=0.3)
-            )
-            if response.text:
-                return response.text.strip()
-        except Exception as e:
-            logger.warning(f"⚠️ Gemini {self.model_name} Error: {e}")
-            if retry:
-                logger.info("🔄 Retrying generation...")
-                try:
-                    # Retry logic (could use sleep here if heavy load, but keeping it simple)
-                    response = self.gemini_model.generate_content(prompt)
-                    if response.text:
-                        return response.text.strip()
-                except Exception as retry_e:
-                    logger.error(f"❌ Gemini Retry Failed: {retry_e}")
-        
-        return None
-
-    def _retrieve_chunks(self, query: str) -> List[Tuple[str, float]]:
+        queued_at = time.monotonic()
+        with llm_limiter.slot(timeout=timeout):
+            if timeout is not None:
+                # Time spent waiting for a slot counts against the caller's budget
+                timeout -= time.monotonic() - queued_at
+            return self.llm_client.generate(prompt, timeout=timeout)
+
+    def llm_health(self) -> Dict[str, Dict[str, object]]:
+        """Circuit breaker state per Gemini model (exposed via /health)."""
+        if not hasattr(self, 'llm_client'):
+            return {}
+        return self.llm_client.breaker_states()
+
+    def llm_hedge_stats(self) -> Dict[str, object]:
+        """How often hedged Gemini requests fired and won (exposed via /health)."""
+        if not hasattr(self, 'llm_client'):
+            return {}
+        return self.llm_client.hedge_stats()
+
+    def _retrieve_chunks(self, query: str, timeout: Optional[float] = None,
+                         working_set: Optional[WorkingSet] = None) -> List[Tuple[str, float]]:
+        """
+        Embed + search. With the session's `working_set`, a follow-up it covers is answered from
+        the remembered chunks (and a query it has embedded before isn't embedded again); otherwise
+        the full index is searched and the results are remembered.
+        """
         normalized_query = self._normalize_query(query)
-        try:
-            response = self.cohere_client.embed(
-                texts=[normalized_query],
-                model="embed-multilingual-v3.0",
-                input_type="search_query"
-            )
-            query_embedding = np.array(response.embeddings[0], dtype=np.float32)
-            query_embedding = query_embedding / np.linalg.norm(query_embedding)
-        except Exception as e:
-            logger.error(f"❌ Error generating query embedding: {e}")
-            return []
+        if self.retrieval is not None:
+            return self._retrieve_remote(normalized_query, timeout)
+        if working_set is not None and working_set.generation != self.index_generation:
+            working_set.reset(self.index_generation)
+        follow_up = working_set is not None and len(working_set) > 0
+
+        query_embedding = working_set.query_embedding(normalized_query) if follow_up else None
+        if follow_up:
+            record_cache("working_set_embedding", query_embedding is not None)
+        if query_embedding is None:
+            try:
+                with embed_limiter.slot(timeout=timeout), stage_timer("embed"):
+                    query_embedding = self.embedder.embed([normalized_query], input_type="search_query", timeout=timeout)[0]
+                query_embedding = query_embedding / np.linalg.norm(query_embedding)
+            except Overloaded:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error generating query embedding: {e}")
+                return []
+
+        if follow_up:
+            ws = self.working_sets
+            with stage_timer("working_set"):
+                hits = working_set.search(query_embedding, self.similarity_threshold, self.top_k,
+                                          min(ws.min_hits, self.top_k), ws.query_similarity)
+            record_cache("working_set", hits is not None)
+            if hits is not None:
+                logger.info(f"🧠 Follow-up answered from the session working set ({len(hits)} chunks)")
+                working_set.remember(normalized_query, query_embedding, [])
+                return [(self.chunks[position], score) for position, score in hits]
         
-        similarities, indices = self.index.search(query_embedding.reshape(1, -1), self.top_k * 2)
+        with stage_timer("search"):
+            similarities, indices = self.index.search(query_embedding.reshape(1, -1), self.top_k * 2)
         results = []
         for sim, idx in zip(similarities[0], indices[0]):
             if sim >= self.similarity_threshold:
-                results.append((self.chunks[idx], float(sim)))
-        return results[:self.top_k]
+                results.append((int(idx), float(sim)))
+        results = results[:self.top_k]
+        if working_set is not None:
+            working_set.remember(normalized_query, query_embedding,
+                                 [(idx, np.asarray(self.embeddings[idx], dtype=np.float32)) for idx, _ in results])
+        return [(self.chunks[idx], sim) for idx, sim in results]
+
+    def _retrieve_remote(self, normalized_query: str, timeout: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Embed + search in the retrieval daemon; same candidates, threshold and cut-off as the local path."""
+        try:
+            with embed_limiter.slot(timeout=timeout), stage_timer("retrieval_rpc"):
+                hits, timings = self.retrieval.search(normalized_query, self.top_k * 2, self.similarity_threshold,
+                                                      timeout=timeout)
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Retrieval daemon request failed: {e}")
+            return []
+        observe_stage("embed", timings["embed"])
+        observe_stage("search", timings["search"])
+        return [(text, score) for _, score, text in hits][:self.top_k]
 
-    def _rewrite_query(self, query: str, history: List[Dict[str, str]]) -> str:
+    def warm_up(self, queries: List[str], timeout: float = 60.0) -> int:
+        """
+        Run representative queries through embed + search before taking traffic: opens the
+        embedding client's connections and pages the index vectors into memory.
+        Returns how many queries ran within `timeout`.
+        """
+        self.progress.update(warmup_total=len(queries), warmup_done=0)
+        deadline = Deadline(timeout)
+        done = 0
+        for query in queries:
+            if deadline.expired():
+                logger.warning(f"⏱️ Warm-up stopped after {done}/{len(queries)} queries (timeout)")
+                break
+            try:
+                self._retrieve_chunks(query, timeout=deadline.budget(1.0, cap=self.embed_budget[1]))
+            except Exception as e:
+                logger.warning(f"⚠️ Warm-up query failed: {e}")
+            done += 1
+            self.progress.update(warmup_done=done)
+        return done
+
+    def _rewrite_query(self, query: str, history: List[Dict[str, str]], timeout: Optional[float] = None,
+                       summary: Optional[str] = None) -> str:
         """
         Uses LLM to rewrite the user query based on conversation history.
         This handles pronouns, follow-ups (Enduku?), and context switching.
         """
-        if not history:
+        if not history and not summary:
             return query
             
-        # Limit history to last few turns
-        recent_history = history[-6:] 
-        
-        hist_text = ""
-        for msg in recent_history:
-            role = "User" if msg['role'] == 'user' else "Assistant"
-            hist_text += f"{role}: {msg['content']}\n"
+        # Limit history to last few turns (older ones are in the summary)
+        hist_text = history_text(history[-6:], summary)
             
         prompt = f"""You are a query refinement AI for a Telugu news bot.
 Conversation History:
@@ -385,17 +584,79 @@ Rewritten Query:"""
         try:
             final_prompt = prompt.format(hist_text=hist_text, query=query)
             
-            rewritten = self._safe_generate_content(final_prompt)
+            with stage_timer("rewrite"):
+                rewritten = self._safe_generate_content(final_prompt, timeout=timeout)
             
             if not rewritten:
                 return query
                 
             logger.info(f"🔄 Contextualized Query: '{query}' -> '{rewritten}'")
             return rewritten
+        except Overloaded:
+            raise
         except Exception as e:
             logger.warning(f"⚠️ Query Rewrite Error: {e}")
             return query
 
+    def summarize_conversation(self, summary: Optional[str], messages: List[Dict[str, str]],
+                               timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Folds `messages` into the rolling conversation summary (None for a new one).
+        Returns the updated summary, at most SUMMARY_MAX_CHARS, or None when generation fails.
+        """
+        prompt = f"""You maintain the running memory of a conversation between a user and a Telugu news assistant.
+Current Summary:
+{summary or "(none yet)"}
+
+New Turns:
+{history_text(messages)}
+Task: Update the summary so it also covers the new turns.
+- Keep the topics, people, places, dates and numbers discussed, and what the user wants to know.
+- Drop greetings, formatting and repeated details.
+- Write in the language of the conversation, at most {SUMMARY_MAX_CHARS // 6} words.
+- Output ONLY the summary text.
+
+Updated Summary:"""
+        with stage_timer("summarize"):
+            updated = self._safe_generate_content(prompt, timeout=timeout)
+        if not updated:
+            return None
+        updated = " ".join(updated.split())
+        if len(updated) > SUMMARY_MAX_CHARS:
+            updated = updated[:SUMMARY_MAX_CHARS].rsplit(" ", 1)[0]
+        return updated
+
+    def _extractive_answer(self, query: str, retrieved_chunks: List[Tuple[str, float]],
+                           max_sentences: int = 4, max_chars: int = 700) -> str:
+        """
+        Fast local fallback: pick the sentences from the top chunks that best match the query.
+        No network calls, so it is always available within the deadline.
+        """
+        query_terms = set(self._normalize_query(query).lower().split())
+        candidates = []
+        for rank, (chunk, sim) in enumerate(retrieved_chunks[:3]):
+            sentences = [x.strip() for x in re.split(r'(?<=[.!?।])\s+|\n+', chunk) if len(x.strip()) > 20]
+            for pos, sentence in enumerate(sentences):
+                overlap = len(query_terms & set(sentence.lower().split()))
+                # Prefer similar chunks, query-term overlap and lead sentences
+                score = sim + 0.1 * overlap - 0.02 * pos
+                candidates.append((score, rank, pos, sentence))
+
+        if not candidates:
+            return ""
+
+        picked = sorted(candidates, reverse=True)[:max_sentences]
+        picked.sort(key=lambda c: (c[1], c[2]))  # Keep reading order
+
+        lines = ["సంబంధిత వార్తల నుండి ముఖ్యాంశాలు:"]
+        total = 0
+        for _, _, _, sentence in picked:
+            if total + len(sentence) > max_chars and len(lines) > 1:
+                break
+            lines.append(sentence)
+            total += len(sentence)
+        return "\n".join(lines)
+
     def generate_daily_brief(self) -> Dict[str, str]:
         """
         Generates a 'Morning Briefing' style summary from random/top content.
@@ -438,16 +699,28 @@ Output (Telugu):
         else:
             return {"title": "Error", "content": "క్షమించండి, వార్తా సమాహారం సిద్ధం చేయలేకపోయాను."}
 
-    def generate_answer(self, query: str, mode: str = "standard", history: List[Dict] = []) -> Dict[str, any]:
+    def generate_answer(self, query: str, mode: str = "standard", history: List[Dict] = [],
+                        deadline: Optional[Deadline] = None, summary: Optional[str] = None,
+                        working_set: Optional[WorkingSet] = None) -> Dict[str, any]:
         """
         Main Agentic Pipeline with Mode Support and Conversational Memory:
         Modes:
         - 'standard': Balanced (Bridge + Answer + Why This Matters)
         - 'quick': Concise, bullets, no fluff
         - 'deep': Extensive context, background, analysis
+        
+        `deadline` bounds the whole pipeline. Each stage gets a share of the remaining time;
+        if generation cannot finish in time an extractive answer is returned with degraded=True.
+        `summary` is the session's rolling summary; `history` then only needs the turns after it.
+        `working_set` is the session's retrieval working set (see working_set.py).
         """
+        if deadline is None:
+            deadline = Deadline(None)
+        
         # 1. Contextualize (Rewrite) Query
-        search_query = self._rewrite_query(query, history)
+        fraction, cap = self.rewrite_budget
+        search_query = self._rewrite_query(query, history, timeout=deadline.budget(fraction, cap, reserve=self.extractive_reserve),
+                                           summary=summary)
         
         logger.info(f"💬 Processing query: {query} (Search: {search_query}) [Mode: {mode}]")
         language = self._detect_language(search_query)
@@ -458,19 +731,24 @@ Output (Telugu):
         # 4️⃣ Greeting & Short Input Bypass (IMPORTANT)
         if is_greeting:
             logger.info("👋 Detected greeting, bypassing RAG/Gemini.")
+            ANSWERS.inc(mode=mode, outcome="greeting")
             return {
                 "query": query,
                 "answer": "నమస్కారం! నేను మనవార్త AI ని. తాజా వార్తల కోసం అడగండి.",
                 "sources": [],
                 "language": language,
-                "chunks_retrieved": 0
+                "chunks_retrieved": 0,
+                "retrieved_ids": [],
+                "degraded": False
             }
 
         retrieved_chunks = []
         context_text = ""
         
         # 3. Retrieval (Use Rewritten Query)
-        retrieved_chunks = self._retrieve_chunks(search_query)
+        fraction, cap = self.embed_budget
+        retrieved_chunks = self._retrieve_chunks(search_query, timeout=deadline.budget(fraction, cap, reserve=self.extractive_reserve),
+                                                 working_set=working_set)
         if retrieved_chunks:
             for i, (chunk, _) in enumerate(retrieved_chunks, 1):
                 context_text += f"Article {i}:\n{chunk}\n\n"
@@ -515,13 +793,9 @@ Output (Telugu):
 
         # 5. Build Final Prompt with History
         history_section = ""
-        if history:
+        if history or summary:
             history_section = "Conversation History (for context):\n"
-            for msg in history[-4:]: # Last 4 turns
-                role = "User" if msg['role'] == 'user' else "Assistant"
-                # Truncate content
-                content = msg['content'][:300] + "..." if len(msg['content']) > 300 else msg['content']
-                history_section += f"{role}: {content}\n"
+            history_section += history_text(history[-4:], summary) # Last 4 turns
             history_section += "\n"
 
         prompt = f"""You are 'Manavartha', a Senior Telugu News Editor and highly intelligent AI Assistant.
@@ -548,35 +822,50 @@ Generative Response:
 """
         
         answer = ""
-        if not is_greeting:
-            raw_answer = self._safe_generate_content(prompt)
-            answer = self._clean_output(raw_answer) if raw_answer else None
+        degraded = False
+        generation_timeout = deadline.budget(1.0, reserve=self.extractive_reserve)
+        if generation_timeout is not None and generation_timeout < self.min_generation_time:
+            logger.warning(f"⏱️ Only {generation_timeout:.2f}s left, skipping generation")
+            raw_answer = None
         else:
-            # Greeting bypass - already handled via intent router conceptually, 
-            # but if we reached here with is_greeting=True (logic flow), we should respond simply.
-            # Actually, standard flow skips retrieval but still prompts? 
-            # Let's use a lightweight fallback if prompt fails or just prompt.
-            raw_answer = self._safe_generate_content(prompt)
-            answer = self._clean_output(raw_answer) if raw_answer else "నమస్కారం! నేను మనవార్త AI ని. మీకు ఎలా సహాయపడగలను?"
+            try:
+                with stage_timer("generate"):
+                    raw_answer = self._safe_generate_content(prompt, timeout=generation_timeout)
+            except Overloaded:
+                # We already hold the retrieved context, so degrade instead of shedding this late
+                logger.warning("🚦 Gemini queue full at generation stage")
+                raw_answer = None
+        answer = self._clean_output(raw_answer) if raw_answer else None
+
+        if not answer and retrieved_chunks:
+            # Deadline hit or Gemini unavailable: answer locally from what we retrieved
+            logger.warning("🩹 Generation unavailable in time, returning extractive answer")
+            with stage_timer("extractive"):
+                answer = self._extractive_answer(search_query, retrieved_chunks)
+            degraded = True
 
         if not answer:
              # Final Fail-Safe Fallback
              answer = "క్షమించండి, ప్రస్తుతం సమాచారాన్ని పొందడంలో అంతరాయం ఏర్పడింది. కొద్దిసేపటి తర్వాత ప్రయత్నించండి."
+             degraded = True
         
+        ANSWERS.inc(mode=mode, outcome="degraded" if degraded else "ok")
         return {
             "query": query,
             "answer": answer,
             "sources": [chunk for chunk, _ in retrieved_chunks[:3]],
             "language": language,
-            "chunks_retrieved": len(retrieved_chunks)
+            "chunks_retrieved": len(retrieved_chunks),
+            "retrieved_ids": [chunk_id(chunk) for chunk, _ in retrieved_chunks],
+            "degraded": degraded
         }
 
 # Singleton instance
 rag_engine: Optional[TeluguNewsRAG] = None
 
-def initialize_rag(csv_path: str) -> TeluguNewsRAG:
+def initialize_rag(csv_path: str, progress: Optional[LoadProgress] = None) -> TeluguNewsRAG:
     global rag_engine
-    rag_engine = TeluguNewsRAG(csv_path)
+    rag_engine = TeluguNewsRAG(csv_path, progress=progress)
     return rag_engine
 
 def get_rag_engine() -> TeluguNewsRAG:
@@ -0,0 +1,114 @@
+"""
+MANA VARTHA AI - Startup Readiness
+Load progress of the RAG engine and the optional warm-up phase behind /livez and /readyz
+
+    WARMUP_QUERIES="తెలంగాణ వార్తలు|cricket news"   # '|'-separated queries to run before ready
+    WARMUP_FILE=captures/search.jsonl               # or a file: one query per line, or a capture JSONL
+    WARMUP_LIMIT=50                                 # max queries taken from the file
+    WARMUP_TIMEOUT=60                               # seconds; warm-up never blocks readiness longer
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("starting", "connecting", "loading_snapshot", "parsing", "indexing", "warming", "ready", "failed")
+
+
+class LoadProgress:
+    """Mutable progress record written by the loader thread and read by the health endpoints."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.phase = "starting"
+        self.files_total = 0
+        self.files_parsed = 0
+        self.vectors_added = 0
+        self.warmup_total = 0
+        self.warmup_done = 0
+        self.ready_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set_phase(self, phase: str):
+        if phase not in PHASES:
+            raise ValueError(f"Unknown load phase: {phase}")
+        with self._lock:
+            self.phase = phase
+            if phase == "ready":
+                self.ready_at = time.time()
+        logger.info(f"🚦 Load phase: {phase}")
+
+    def update(self, **counters: int):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, value)
+
+    def add(self, **counters: int):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def fail(self, error: Exception):
+        with self._lock:
+            self.phase = "failed"
+            self.error = str(error)
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    def retry_after(self) -> int:
+        """Seconds a client should wait before retrying: ETA from file progress when known."""
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            if self.phase == "parsing" and self.files_total and self.files_parsed:
+                eta = elapsed / self.files_parsed * (self.files_total - self.files_parsed)
+                return int(min(60, max(1, eta)))
+        return 5
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.ready_at or time.time()
+            return {
+                "phase": self.phase,
+                "elapsed_seconds": round(end - self.started_at, 2),
+                "files_total": self.files_total,
+                "files_parsed": self.files_parsed,
+                "vectors_added": self.vectors_added,
+                "warmup_total": self.warmup_total,
+                "warmup_done": self.warmup_done,
+                "error": self.error,
+            }
+
+
+# Progress of this worker's initial load
+LOAD_PROGRESS = LoadProgress()
+
+
+def warmup_queries_from_env() -> List[str]:
+    queries = [q.strip() for q in os.getenv("WARMUP_QUERIES", "").split("|") if q.strip()]
+    path = os.getenv("WARMUP_FILE")
+    limit = int(os.getenv("WARMUP_LIMIT", "50"))
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if line.startswith("{"):
+                        # Traffic capture line (see capture.py): replay the real query mix
+                        line = json.loads(line).get("query", "").strip()
+                    if line and line not in queries:
+                        queries.append(line)
+                    if len(queries) >= limit:
+                        break
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Could not read WARMUP_FILE {path}: {e}")
+    return queries
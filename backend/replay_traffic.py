@@ -0,0 +1,254 @@
+"""
+MANA VARTHA AI - Traffic Replay
+Re-issues a /search capture (CAPTURE_PATH, see capture.py) against a build and diffs two runs.
+
+Usage:
+    # Replay at the original pace (or --speed 2 for twice as fast) and record the results
+    python replay_traffic.py run captures/search.jsonl --base-url http://localhost:8000 --out replay_main.jsonl
+    python replay_traffic.py run captures/search.jsonl --base-url http://localhost:8001 --out replay_branch.jsonl
+
+    # Per-stage latency and retrieved-id overlap between two builds (or a capture and a replay)
+    python replay_traffic.py diff replay_main.jsonl replay_branch.jsonl
+
+Arrivals keep the captured inter-arrival gaps (divided by --speed), independent of how
+fast the build answers. Follow-ups wait for the previous turn of their conversation so
+they are sent with a real session (and therefore real history) on the replayed build.
+Per-stage timings come from the Server-Timing header.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from load_test import ensure_users
+
+
+def load_records(path: str) -> List[Dict]:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                record.setdefault("seq", len(records))
+                records.append(record)
+    return records
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Stage -> ms from a Server-Timing header, including the server's "total"."""
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                stages[name] = float(value)
+    return stages
+
+
+class Replayer:
+    def __init__(self, client: httpx.AsyncClient, headers: Dict[str, str]):
+        self.client = client
+        self.headers = headers
+        # conversation key -> future resolving to the session id of its latest replayed turn
+        self.sessions: Dict[str, asyncio.Future] = {}
+        self.results: List[Dict] = []
+
+    async def send(self, record: Dict, previous_turn: Optional[asyncio.Future], this_turn: Optional[asyncio.Future]):
+        session_id = await previous_turn if previous_turn is not None else None
+        params = {"query": record["query"], "mode": record.get("mode", "standard")}
+        if session_id:
+            params["session_id"] = session_id
+        started = time.perf_counter()
+        result = {"seq": record["seq"], "query": record["query"], "mode": params["mode"],
+                  "history_len": record.get("history_len", 0), "conversation": record.get("conversation")}
+        try:
+            r = await self.client.get("/search", params=params, headers=self.headers)
+            body = r.json() if r.status_code == 200 else {}
+            stages = parse_server_timing(r.headers.get("Server-Timing"))
+            server_total = stages.pop("total", None)
+            result.update(status=r.status_code, stages_ms=stages, retrieved_ids=body.get("retrieved_ids") or [],
+                          degraded=body.get("degraded"))
+            if server_total is not None:
+                # Same meaning as a capture's total_ms, so captures and replays diff cleanly
+                result["total_ms"] = server_total
+            session_id = body.get("session_id") or session_id
+        except httpx.HTTPError as e:
+            result.update(status=0, stages_ms={}, retrieved_ids=[], error=str(e))
+        result["client_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result.setdefault("total_ms", result["client_ms"])
+        self.results.append(result)
+        if this_turn is not None:
+            this_turn.set_result(session_id)
+
+    def chain(self, record: Dict):
+        """(previous turn, this turn) futures for the record's conversation."""
+        key = record.get("conversation")
+        if not key:
+            return None, None
+        # A conversation that started before the capture window is replayed from its first captured turn
+        previous = self.sessions.get(key)
+        this_turn = asyncio.get_running_loop().create_future()
+        self.sessions[key] = this_turn
+        return previous, this_turn
+
+
+async def run_replay(args) -> List[Dict]:
+    records = load_records(args.capture)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        raise SystemExit("Capture is empty")
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        if args.token:
+            headers = {"Authorization": f"Bearer {args.token}"}
+        else:
+            user = (await ensure_users(client, 1, f"replay_{int(time.time())}"))[0]
+            headers = user.headers
+        replayer = Replayer(client, headers)
+
+        print(f"▶️ Replaying {len(records):,} requests at {args.speed}x against {args.base_url}")
+        t0 = records[0].get("ts", 0.0)
+        started = time.perf_counter()
+        offset = 0.0
+        last_ts = t0
+        tasks = []
+        for record in records:
+            ts = record.get("ts", last_ts)
+            gap = max(0.0, ts - last_ts)
+            if args.max_gap is not None:
+                # Collapse long idle stretches (overnight lulls) without touching bursts
+                gap = min(gap, args.max_gap)
+            offset += gap / args.speed
+            last_ts = ts
+            await asyncio.sleep(max(0.0, started + offset - time.perf_counter()))
+            previous, this_turn = replayer.chain(record)
+            tasks.append(asyncio.create_task(replayer.send(record, previous, this_turn)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    results = sorted(replayer.results, key=lambda r: r["seq"])
+    errors = sum(1 for r in results if r["status"] != 200)
+    print(f"✅ Replayed {len(results):,} requests in {elapsed:.1f}s "
+          f"({len(results) / elapsed:.2f} rps, {errors} non-200)")
+    with open(args.out, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    print(f"💾 Results written to {args.out}")
+    return results
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    arr = np.array(values)
+    return {f"p{q}": round(float(np.percentile(arr, q)), 1) for q in (50, 95, 99)}
+
+
+def _overlap(a: List[str], b: List[str]) -> Dict[str, float]:
+    sa, sb = set(a), set(b)
+    union = sa | sb
+    return {
+        "jaccard": len(sa & sb) / len(union) if union else 1.0,
+        "recall": len(sa & sb) / len(sa) if sa else 1.0,
+        "top1": float(bool(a) and bool(b) and a[0] == b[0]) if (a or b) else 1.0,
+        "identical": float(a == b),
+    }
+
+
+def diff(path_a: str, path_b: str, show: int = 5, max_regression: Optional[float] = None,
+         min_delta_ms: float = 5.0) -> int:
+    a_records = {r["seq"]: r for r in load_records(path_a)}
+    b_records = {r["seq"]: r for r in load_records(path_b)}
+    common = sorted(a_records.keys() & b_records.keys())
+    print(f"Comparing {path_a} ({len(a_records):,}) -> {path_b} ({len(b_records):,}), {len(common):,} matched requests")
+
+    status_changed = [s for s in common if a_records[s].get("status") != b_records[s].get("status")]
+    for label, records in (("A", a_records), ("B", b_records)):
+        non_ok = sum(1 for s in common if records[s].get("status") != 200)
+        degraded = sum(1 for s in common if records[s].get("degraded"))
+        print(f"  {label}: non-200 {non_ok} ({non_ok / max(1, len(common)) * 100:.1f}%), degraded answers {degraded}")
+    print(f"  status changed on {len(status_changed)} requests")
+
+    # Per-stage latency: every stage either side reported, plus end-to-end
+    stages = sorted({st for s in common for st in a_records[s].get("stages_ms", {})}
+                    | {st for s in common for st in b_records[s].get("stages_ms", {})})
+    print(f"\n  {'stage':<14} {'n':>6} {'A p50':>9} {'B p50':>9} {'Δp50':>8} {'A p95':>9} {'B p95':>9} {'Δp95':>8} {'A p99':>9} {'B p99':>9}")
+    regressions = []
+    for stage in stages + ["total"]:
+        if stage == "total":
+            pairs = [(a_records[s]["total_ms"], b_records[s]["total_ms"]) for s in common
+                     if "total_ms" in a_records[s] and "total_ms" in b_records[s]]
+        else:
+            pairs = [(a_records[s]["stages_ms"][stage], b_records[s]["stages_ms"][stage]) for s in common
+                     if stage in a_records[s].get("stages_ms", {}) and stage in b_records[s].get("stages_ms", {})]
+        if not pairs:
+            continue
+        pa, pb = _percentiles([p[0] for p in pairs]), _percentiles([p[1] for p in pairs])
+        d50 = (pb["p50"] - pa["p50"]) / pa["p50"] if pa["p50"] else 0.0
+        d95 = (pb["p95"] - pa["p95"]) / pa["p95"] if pa["p95"] else 0.0
+        print(f"  {stage:<14} {len(pairs):>6} {pa['p50']:>9} {pb['p50']:>9} {d50 * 100:>+7.1f}% "
+              f"{pa['p95']:>9} {pb['p95']:>9} {d95 * 100:>+7.1f}% {pa['p99']:>9} {pb['p99']:>9}")
+        # Relative and absolute: a 0.2 -> 0.3 ms FAISS lookup is +50% but not a regression
+        if max_regression is not None and d95 > max_regression and pb["p95"] - pa["p95"] > min_delta_ms:
+            regressions.append(stage)
+
+    # Retrieval agreement, only where both builds answered
+    both_ok = [s for s in common if a_records[s].get("status") == 200 and b_records[s].get("status") == 200]
+    if both_ok:
+        overlaps = {s: _overlap(a_records[s].get("retrieved_ids", []), b_records[s].get("retrieved_ids", []))
+                    for s in both_ok}
+        mean = {k: sum(o[k] for o in overlaps.values()) / len(overlaps) for k in ("jaccard", "recall", "top1", "identical")}
+        print(f"\n  Retrieved ids over {len(both_ok):,} requests: jaccard {mean['jaccard']:.3f} | "
+              f"recall of A in B {mean['recall']:.3f} | top-1 agreement {mean['top1']:.3f} | "
+              f"identical {mean['identical']:.3f}")
+        worst = sorted(overlaps.items(), key=lambda kv: kv[1]["jaccard"])[:show]
+        for seq, o in worst:
+            if o["jaccard"] >= 1.0:
+                break
+            print(f"    seq {seq:<6} jaccard {o['jaccard']:.2f}  {a_records[seq].get('mode', '')[:8]:<8} {a_records[seq].get('query', '')[:70]}")
+
+    if regressions:
+        print(f"\n❌ p95 regressed more than {max_regression * 100:.0f}% in: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured /search traffic and diff builds")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Replay a capture against a running backend")
+    run.add_argument("capture", help="Capture file written via CAPTURE_PATH")
+    run.add_argument("--base-url", default="http://localhost:8000")
+    run.add_argument("--speed", type=float, default=1.0, help="Rate multiplier (2 = twice the captured rate)")
+    run.add_argument("--max-gap", type=float, help="Cap idle gaps between requests (seconds, before --speed)")
+    run.add_argument("--limit", type=int, help="Replay only the first N requests")
+    run.add_argument("--token", help="Bearer token to use (default: sign up a throwaway replay user)")
+    run.add_argument("--timeout", type=float, default=120)
+    run.add_argument("--out", default="replay_results.jsonl")
+
+    cmp_ = sub.add_parser("diff", help="Compare two capture/replay files request by request")
+    cmp_.add_argument("a")
+    cmp_.add_argument("b")
+    cmp_.add_argument("--show", type=int, default=5, help="Lowest-overlap queries to list")
+    cmp_.add_argument("--max-regression", type=float, help="Exit 1 if any stage p95 grows by more than this fraction")
+    cmp_.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore p95 growth smaller than this many ms")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        asyncio.run(run_replay(args))
+    else:
+        sys.exit(diff(args.a, args.b, args.show, args.max_regression, args.min_delta_ms))
+
+
+if __name__ == "__main__":
+    main()
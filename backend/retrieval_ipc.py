@@ -0,0 +1,228 @@
+"""
+MANA VARTHA AI - Retrieval IPC Protocol & Client
+Compact binary protocol between the web tier and the standalone retrieval daemon
+(retrieval_server.py) over a Unix domain socket, plus the thin client used by rag_engine.
+
+    RETRIEVAL_SOCKET=/run/mvai/retrieval.sock   # set on the web tier to use the daemon
+    RETRIEVAL_CONNECT_TIMEOUT=120                # seconds to wait for the daemon at startup
+
+Frames (network byte order), one request -> one response, matched by request id:
+    request   op:u8 flags:u8 k:u16 request_id:u32 threshold:f32 timeout_ms:u32 payload_len:u32  + payload
+    response  status:u8 flags:u8 count:u16 request_id:u32 payload_len:u32
+              queue_ms:f32 embed_ms:f32 search_ms:f32                                         + payload
+
+    SEARCH  payload: UTF-8 query         -> count x (chunk_index:u32 score:f32 text_len:u32 text)
+    FETCH   payload: count x u32 indices -> same hit layout, score 0
+    STATS   payload: empty               -> JSON
+    RELOAD  payload: empty               -> JSON (returns once the new index is live)
+    OVERLOADED responses carry the suggested retry-after seconds in `count`.
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import logging
+import itertools
+import threading
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional, Tuple
+
+from scheduler import Overloaded
+
+logger = logging.getLogger(__name__)
+
+REQUEST_HEADER = struct.Struct("!BBHIfII")
+RESPONSE_HEADER = struct.Struct("!BBHIIfff")
+HIT = struct.Struct("!IfI")
+INDEX = struct.Struct("!I")
+MAX_PAYLOAD = 64 * 2**20
+
+OP_SEARCH, OP_FETCH, OP_STATS, OP_RELOAD = 1, 2, 3, 4
+STATUS_OK, STATUS_ERROR, STATUS_OVERLOADED = 0, 1, 2
+
+
+class RetrievalError(Exception):
+    """The daemon answered with an error, or the connection broke mid-request."""
+
+
+def retrieval_socket() -> Optional[str]:
+    return os.getenv("RETRIEVAL_SOCKET") or None
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        part = sock.recv(size - len(buf))
+        if not part:
+            raise ConnectionResetError("retrieval daemon closed the connection")
+        buf.extend(part)
+    return bytes(buf)
+
+
+def encode_hits(hits: List[Tuple[int, float, str]]) -> bytes:
+    parts = []
+    for idx, score, text in hits:
+        data = text.encode("utf-8")
+        parts.append(HIT.pack(idx, score, len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_hits(payload: bytes, count: int) -> List[Tuple[int, float, str]]:
+    hits, offset = [], 0
+    for _ in range(count):
+        idx, score, size = HIT.unpack_from(payload, offset)
+        offset += HIT.size
+        hits.append((idx, score, payload[offset:offset + size].decode("utf-8")))
+        offset += size
+    return hits
+
+
+class RetrievalClient:
+    """
+    Blocking client with a small pool of Unix socket connections; safe to share between
+    the threads that run /search. The daemon batches requests arriving on all connections.
+    """
+
+    def __init__(self, socket_path: str, pool_size: int = 16):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self._idle: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._len_cache: Tuple[float, int] = (0.0, 0)
+
+    @classmethod
+    def from_env(cls) -> Optional["RetrievalClient"]:
+        path = retrieval_socket()
+        return cls(path) if path else None
+
+    def _checkout(self) -> socket.socket:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _checkin(self, sock: socket.socket):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(sock)
+                return
+        sock.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            sock.close()
+
+    def call(self, op: int, payload: bytes = b"", k: int = 0, threshold: float = 0.0,
+             timeout: Optional[float] = None) -> Tuple[Tuple, bytes]:
+        """One request/response exchange; returns (response header fields, payload)."""
+        request_id = next(self._ids) & 0xFFFFFFFF
+        timeout_ms = int(timeout * 1000) if timeout else 0
+        try:
+            sock = self._checkout()
+        except OSError as e:
+            # Daemon down or restarting: shed like any other saturated dependency
+            logger.warning(f"⚠️ Retrieval daemon unavailable at {self.socket_path}: {e}")
+            raise Overloaded("retrieval", retry_after=2) from e
+        try:
+            sock.settimeout(max(timeout, 0.001) if timeout is not None else None)
+            sock.sendall(REQUEST_HEADER.pack(op, 0, k, request_id, threshold, timeout_ms, len(payload)) + payload)
+            header = RESPONSE_HEADER.unpack(recv_exact(sock, RESPONSE_HEADER.size))
+            body = recv_exact(sock, header[4]) if header[4] else b""
+        except BaseException:
+            # A late response would be read by the next caller: never reuse a socket after a failure
+            sock.close()
+            raise
+        if header[3] != request_id:
+            sock.close()
+            raise RetrievalError(f"response id {header[3]} does not match request {request_id}")
+        self._checkin(sock)
+
+        status = header[0]
+        if status == STATUS_OVERLOADED:
+            raise Overloaded("retrieval", retry_after=max(1, header[2]))
+        if status != STATUS_OK:
+            raise RetrievalError(body.decode("utf-8", errors="replace") or "retrieval daemon error")
+        return header, body
+
+    def search(self, query: str, k: int, threshold: float,
+               timeout: Optional[float] = None) -> Tuple[List[Tuple[int, float, str]], Dict[str, float]]:
+        """Top-k hits above `threshold` plus the daemon's queue/embed/search timings in seconds."""
+        header, body = self.call(OP_SEARCH, query.encode("utf-8"), k=k, threshold=threshold, timeout=timeout)
+        timings = {"queue": header[5] / 1000, "embed": header[6] / 1000, "search": header[7] / 1000}
+        return decode_hits(body, header[2]), timings
+
+    def fetch(self, indices: List[int], timeout: Optional[float] = 10.0) -> List[str]:
+        payload = b"".join(INDEX.pack(i) for i in indices)
+        header, body = self.call(OP_FETCH, payload, timeout=timeout)
+        return [text for _, _, text in decode_hits(body, header[2])]
+
+    def stats(self, timeout: Optional[float] = 5.0) -> Dict[str, Any]:
+        _, body = self.call(OP_STATS, timeout=timeout)
+        return json.loads(body)
+
+    def reload(self) -> Dict[str, Any]:
+        """Ask the daemon to rebuild; blocks until the new index serves (or the rebuild fails)."""
+        _, body = self.call(OP_RELOAD, timeout=None)
+        return json.loads(body)
+
+    def chunk_count(self, max_age: float = 5.0) -> int:
+        checked_at, count = self._len_cache
+        if time.monotonic() - checked_at > max_age:
+            count = int(self.stats()["chunks"])
+            self._len_cache = (time.monotonic(), count)
+        return count
+
+    def wait_until_ready(self, timeout: float) -> Dict[str, Any]:
+        """Poll until the daemon answers STATS (it only binds its socket once the index is loaded)."""
+        started = time.monotonic()
+        while True:
+            try:
+                return self.stats()
+            except (Overloaded, OSError, RetrievalError) as e:
+                if time.monotonic() - started > timeout:
+                    raise RuntimeError(f"Retrieval daemon at {self.socket_path} not ready after {timeout:.0f}s") from e
+                time.sleep(0.5)
+
+
+class RemoteChunks(Sequence):
+    """Chunk texts held by the daemon; behaves like a list of str (len, indexing, random.sample)."""
+
+    def __init__(self, client: RetrievalClient):
+        self.client = client
+
+    def __len__(self) -> int:
+        return self.client.chunk_count()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.client.fetch(list(range(*i.indices(len(self)))))
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        texts = self.client.fetch([i])
+        if not texts:
+            raise IndexError("chunk index out of range")
+        return texts[0]
+
+
+class RemoteIndex:
+    """Stand-in for the FAISS index on the web tier: exposes ntotal for /health and /metrics."""
+
+    def __init__(self, client: RetrievalClient):
+        self.client = client
+
+    @property
+    def ntotal(self) -> int:
+        return self.client.chunk_count()
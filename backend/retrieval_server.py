@@ -0,0 +1,346 @@
+"""
+MANA VARTHA AI - Retrieval Daemon
+Standalone process that owns the embedder, the index and the chunk texts, and serves
+batched search requests to the web tier over a Unix domain socket (protocol: retrieval_ipc.py).
+FAISS threads and index rebuilds then never compete with the web workers' event loops.
+
+    RETRIEVAL_SOCKET=/run/mvai/retrieval.sock
+    RETRIEVAL_MAX_BATCH=32          # queries embedded and searched together
+    RETRIEVAL_BATCH_WINDOW_MS=0     # extra wait to fill a batch (0: batch whatever queued meanwhile)
+    RETRIEVAL_BATCH_WORKERS=2       # batches in flight at once
+    RETRIEVAL_MAX_QUEUE=1024        # queued queries before requests are shed as overloaded
+    RETRIEVAL_EMBED_CACHE=4096      # query embeddings kept (LRU)
+    RETRIEVAL_OMP_THREADS=          # FAISS OpenMP threads (default: FAISS decides)
+
+Usage:
+    python retrieval_server.py --data-path data/chunks --socket /run/mvai/retrieval.sock
+    kill -HUP <pid>                 # rebuild the index from the data path; old index serves meanwhile
+"""
+
+import os
+import json
+import time
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from retrieval_ipc import (
+    REQUEST_HEADER, RESPONSE_HEADER, INDEX, MAX_PAYLOAD,
+    OP_SEARCH, OP_FETCH, OP_STATS, OP_RELOAD,
+    STATUS_OK, STATUS_ERROR, STATUS_OVERLOADED, encode_hits,
+)
+
+logger = logging.getLogger(__name__)
+
+load_dotenv(encoding='utf-8-sig')
+
+
+class _Query:
+    __slots__ = ("text", "k", "threshold", "deadline", "enqueued", "future")
+
+    def __init__(self, text: str, k: int, threshold: float, timeout_ms: int, future: asyncio.Future):
+        self.text = text
+        self.k = k
+        self.threshold = threshold
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + timeout_ms / 1000 if timeout_ms else None
+        self.future = future
+
+
+class RetrievalService:
+    """Request batching, the query-embedding cache and index swaps around one TeluguNewsRAG."""
+
+    def __init__(self, data_path: str, max_batch: int = 32, batch_window: float = 0.0, batch_workers: int = 2,
+                 max_queue: int = 1024, cache_size: int = 4096):
+        from rag_engine import TeluguNewsRAG
+        self.rag = TeluguNewsRAG(data_path, retrieval_only=True)
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.batch_workers = batch_workers
+        self.max_queue = max_queue
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Batches read (chunks, index) under this lock so a reload never mixes old and new
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=batch_workers + 1, thread_name_prefix="retrieval")
+        self._queue: Optional[asyncio.Queue] = None
+        self.started_at = time.time()
+        self.counters = {"requests": 0, "batches": 0, "batched_queries": 0, "shed": 0, "expired": 0,
+                         "errors": 0, "cache_hits": 0, "cache_misses": 0, "reloads": 0}
+
+    @classmethod
+    def from_env(cls, data_path: str) -> "RetrievalService":
+        return cls(
+            data_path,
+            max_batch=int(os.getenv("RETRIEVAL_MAX_BATCH", "32")),
+            batch_window=float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "0")) / 1000,
+            batch_workers=int(os.getenv("RETRIEVAL_BATCH_WORKERS", "2")),
+            max_queue=int(os.getenv("RETRIEVAL_MAX_QUEUE", "1024")),
+            cache_size=int(os.getenv("RETRIEVAL_EMBED_CACHE", "4096")),
+        )
+
+    # --- batching ---------------------------------------------------------------------------
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        for _ in range(self.batch_workers):
+            asyncio.create_task(self._batch_loop())
+
+    async def search(self, text: str, k: int, threshold: float, timeout_ms: int) -> Tuple[bytes, int, Tuple]:
+        if self._queue.qsize() >= self.max_queue:
+            self.counters["shed"] += 1
+            return b"", STATUS_OVERLOADED, (1, 0.0, 0.0, 0.0)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Query(text, k, threshold, timeout_ms, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Whatever queued while the previous batch ran goes into this one
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if self.batch_window and len(batch) < self.max_batch:
+                fill_until = loop.time() + self.batch_window
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), fill_until - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+            now = time.monotonic()
+            live = []
+            for query in batch:
+                if query.deadline is not None and now > query.deadline:
+                    # The client has already given up on this one
+                    self.counters["expired"] += 1
+                    query.future.set_result((b"", STATUS_ERROR, (0, 0.0, 0.0, 0.0)))
+                else:
+                    live.append(query)
+            if not live:
+                continue
+            try:
+                results = await loop.run_in_executor(self._executor, self._run_batch, live)
+            except Exception as e:
+                logger.error(f"❌ Retrieval batch of {len(live)} failed: {e}")
+                self.counters["errors"] += 1
+                results = [(str(e).encode("utf-8"), STATUS_ERROR, (0, 0.0, 0.0, 0.0))] * len(live)
+            for query, result in zip(live, results):
+                if not query.future.done():
+                    query.future.set_result(result)
+
+    def _embed(self, texts: List[str], timeout: Optional[float]) -> Dict[str, np.ndarray]:
+        """Unit-normalized query embeddings, from the LRU where possible and one provider call for the rest."""
+        found: Dict[str, np.ndarray] = {}
+        with self._cache_lock:
+            for text in texts:
+                vector = self._cache.get(text)
+                if vector is not None:
+                    self._cache.move_to_end(text)
+                    found[text] = vector
+        missing = [t for t in dict.fromkeys(texts) if t not in found]
+        self.counters["cache_hits"] += len(texts) - len(missing)
+        self.counters["cache_misses"] += len(missing)
+        if missing:
+            vectors = self.rag.embedder.embed(missing, input_type="search_query", timeout=timeout)
+            vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            with self._cache_lock:
+                for text, vector in zip(missing, vectors.astype(np.float32)):
+                    found[text] = vector
+                    self._cache[text] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return found
+
+    def _run_batch(self, batch: List[_Query]) -> List[Tuple[bytes, int, Tuple]]:
+        started = time.monotonic()
+        # One provider call serves the whole batch: bound it by the loosest deadline, so a nearly
+        # expired query can't cut the embedding short (and fail) for queries with budget left
+        deadlines = [q.deadline for q in batch]
+        timeout = None if None in deadlines else max(0.5, max(deadlines) - started)
+        vectors = self._embed([q.text for q in batch], timeout)
+        embedded = time.monotonic()
+
+        with self._swap_lock:
+            chunks, index = self.rag.chunks, self.rag.index
+        matrix = np.stack([vectors[q.text] for q in batch])
+        similarities, indices = index.search(matrix, max(q.k for q in batch))
+        searched = time.monotonic()
+
+        self.counters["batches"] += 1
+        self.counters["batched_queries"] += len(batch)
+        embed_ms, search_ms = (embedded - started) * 1000, (searched - embedded) * 1000
+        results = []
+        for row, query in enumerate(batch):
+            hits = [(int(idx), float(sim), chunks[idx])
+                    for sim, idx in zip(similarities[row][:query.k], indices[row][:query.k])
+                    if idx >= 0 and sim >= query.threshold]
+            queue_ms = (started - query.enqueued) * 1000
+            results.append((encode_hits(hits), STATUS_OK, (len(hits), queue_ms, embed_ms, search_ms)))
+        return results
+
+    # --- other ops --------------------------------------------------------------------------
+
+    def fetch(self, indices: List[int]) -> Tuple[bytes, int]:
+        with self._swap_lock:
+            chunks = self.rag.chunks
+        # Out-of-range indices are skipped; the response count says how many came back
+        hits = [(i, 0.0, chunks[i]) for i in indices if 0 <= i < len(chunks)]
+        return encode_hits(hits), len(hits)
+
+    def stats(self) -> Dict:
+        with self._swap_lock:
+            chunks, index = self.rag.chunks, self.rag.index
+        batches = self.counters["batches"]
+        return dict(self.counters,
+                    chunks=len(chunks),
+                    dim=int(index.d),
+                    index_generation=self.rag.index_generation,
+                    shared_index=self.rag.shared_index,
+                    queue_depth=self._queue.qsize() if self._queue else 0,
+                    avg_batch=round(self.counters["batched_queries"] / batches, 2) if batches else 0.0,
+                    embed_cache_size=len(self._cache),
+                    uptime_seconds=round(time.time() - self.started_at, 1))
+
+    def reload(self) -> Dict:
+        """Rebuild from the data path while the old index keeps serving, then swap both references at once."""
+        generation = self.rag.index_generation
+        with self._reload_lock:
+            # Requests that queued behind a running reload share its result
+            if self.rag.index_generation == generation:
+                logger.info("♻️ Rebuilding retrieval index...")
+                if self.rag.shared_index:
+                    state = self.rag._attach_shared_index()
+                else:
+                    state = self.rag._load_and_build_index()
+                with self._swap_lock:
+                    self.rag.chunks, self.rag.embeddings, self.rag.index = state
+                    self.rag.index_generation += 1
+                self.counters["reloads"] += 1
+                logger.info(f"✅ Retrieval index generation {self.rag.index_generation}: {len(state[0])} chunks")
+        return self.stats()
+
+    # --- socket -----------------------------------------------------------------------------
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Requests on one connection may be answered out of order; the client matches request ids
+        pending = set()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(REQUEST_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                op, _, k, request_id, threshold, timeout_ms, size = REQUEST_HEADER.unpack(header)
+                if size > MAX_PAYLOAD:
+                    logger.warning(f"⚠️ Dropping connection: {size}-byte payload exceeds limit")
+                    break
+                payload = await reader.readexactly(size) if size else b""
+                task = asyncio.create_task(self._dispatch(writer, op, k, request_id, threshold, timeout_ms, payload))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+    async def _dispatch(self, writer: asyncio.StreamWriter, op: int, k: int, request_id: int,
+                        threshold: float, timeout_ms: int, payload: bytes):
+        self.counters["requests"] += 1
+        loop = asyncio.get_running_loop()
+        count, timings = 0, (0.0, 0.0, 0.0)
+        try:
+            if op == OP_SEARCH:
+                body, status, (count, *timings) = await self.search(payload.decode("utf-8"), k, threshold, timeout_ms)
+            elif op == OP_FETCH:
+                indices = [i for (i,) in INDEX.iter_unpack(payload)]
+                body, count = await loop.run_in_executor(self._executor, self.fetch, indices)
+                status = STATUS_OK
+            elif op == OP_STATS:
+                body, status = json.dumps(self.stats()).encode("utf-8"), STATUS_OK
+            elif op == OP_RELOAD:
+                # Not on the batch executor: searches keep running during the rebuild
+                stats = await asyncio.to_thread(self.reload)
+                body, status = json.dumps(stats).encode("utf-8"), STATUS_OK
+            else:
+                body, status = f"unknown op {op}".encode("utf-8"), STATUS_ERROR
+        except Exception as e:
+            logger.error(f"❌ Retrieval op {op} failed: {e}")
+            self.counters["errors"] += 1
+            body, status, count = str(e).encode("utf-8"), STATUS_ERROR, 0
+        writer.write(RESPONSE_HEADER.pack(status, 0, count, request_id, len(body), *timings) + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def _claim_socket(path: str):
+    """Remove a stale socket file, refusing to start if another daemon is still listening on it."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise SystemExit(f"❌ Another retrieval daemon is already listening on {path}")
+
+
+async def serve(service: RetrievalService, socket_path: str):
+    _claim_socket(socket_path)
+    await service.start()
+    server = await asyncio.start_unix_server(service.handle_connection, path=socket_path)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    loop.add_signal_handler(signal.SIGHUP, lambda: loop.run_in_executor(None, service.reload))
+    stats = service.stats()
+    logger.info(f"🛰️ Retrieval daemon serving {stats['chunks']:,} chunks on {socket_path} (pid {os.getpid()})")
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        logger.info("👋 Retrieval daemon stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone retrieval daemon for the web tier")
+    parser.add_argument("--data-path", default=os.getenv("DATA_PATH", "data/chunks"))
+    parser.add_argument("--socket", default=os.getenv("RETRIEVAL_SOCKET", "/tmp/mvai-retrieval.sock"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    threads = os.getenv("RETRIEVAL_OMP_THREADS")
+    if threads:
+        import faiss
+        faiss.omp_set_num_threads(int(threads))
+
+    # Load before binding: clients treat a connectable socket as "index ready"
+    service = RetrievalService.from_env(args.data_path)
+    asyncio.run(serve(service, args.socket))
+
+
+if __name__ == "__main__":
+    main()
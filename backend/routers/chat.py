@@ -1,15 +1,29 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from database import get_db
-from models import User, ChatSession, ChatMessage
-from auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import ChatSession
+from auth import Principal, get_current_user
+from chat_store import list_messages, list_sessions
+from chat_sync import changes_since, record_deletion
+from write_behind import get_chat_writer
 from pydantic import BaseModel
 from datetime import datetime
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chats", tags=["Chat History"])
 
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+# Cursor for the next (older) page; absent on the last page. Also in the body of /chats/{id}
+NEXT_CURSOR_HEADER = "X-Next-Before"
+
 # Pydantic Schemas
 class MessageResponse(BaseModel):
     id: str
@@ -25,6 +39,8 @@ class SessionResponse(BaseModel):
     title: str
     created_at: datetime
     messages: List[MessageResponse] = []
+    # Pass as `before` to get the preceding messages; None when these are the oldest
+    next_before: Optional[str] = None
     
     class Config:
         orm_mode = True
@@ -33,72 +49,122 @@ class SessionListResponse(BaseModel):
     id: str
     title: str
     created_at: datetime
+    updated_at: Optional[datetime] = None
     
     class Config:
         orm_mode = True
 
+class SyncMessageResponse(MessageResponse):
+    session_id: str
+
+class SyncResponse(BaseModel):
+    sessions: List[SessionListResponse]       # created or updated since the cursor
+    messages: List[SyncMessageResponse]       # added since the cursor
+    deleted_session_ids: List[str]
+    cursor: str                               # pass back as `since` next time
+    has_more: bool                            # more pages now: call again with `cursor`
+    reset: bool = False                       # cursor too old: drop local history, this is a full sync
+
+async def _wait_for_pending_writes(user: Principal):
+    """Read-your-writes: answers saved by the write-behind queue must show up in the history views."""
+    chat_writer = get_chat_writer()
+    if chat_writer and not await asyncio.to_thread(chat_writer.wait_for_user, user.id):
+        logger.warning(f"⚠️ Chat history for user {user.id} served before pending writes flushed")
+
 # Router
 @router.get("/", response_model=List[SessionListResponse])
-def get_user_chat_sessions(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_user_chat_sessions(
+    response: Response,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = Query(None, description=f"Cursor from the {NEXT_CURSOR_HEADER} header of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Get all chat sessions for current user (newest first)"""
-    sessions = db.query(ChatSession).filter(
-        ChatSession.user_id == current_user.id
-    ).order_by(desc(ChatSession.updated_at)).all()
+    """Get the user's chat sessions, most recently active first, one page at a time"""
+    await _wait_for_pending_writes(current_user)
+    try:
+        sessions, next_before = await list_sessions(db, current_user.id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_before:
+        response.headers[NEXT_CURSOR_HEADER] = next_before
     return sessions
 
+@router.get("/sync", response_model=SyncResponse)
+async def sync_chat_history(
+    since: Optional[str] = Query(None, description="`cursor` from the previous sync; omit for a full sync"),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE, description="Rows per stream and page"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Sessions, messages and deletions since the client's last sync (upsert by id; rows may repeat)"""
+    await _wait_for_pending_writes(current_user)
+    try:
+        return await changes_since(db, current_user.id, since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/{session_id}", response_model=SessionResponse)
-def get_chat_details(
+async def get_chat_details(
     session_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = Query(None, description="Cursor from `next_before` of the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Get specific chat session with messages"""
-    session = db.query(ChatSession).filter(
-        ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
-    ).first()
+    """Get a chat session with its latest messages (oldest first); page back with `before`"""
+    await _wait_for_pending_writes(current_user)
+    session = (await db.execute(
+        select(ChatSession.id, ChatSession.title, ChatSession.created_at)
+        .where(ChatSession.id == session_id, ChatSession.user_id == current_user.id)
+    )).first()
     
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
-        
-    # Sort messages by timestamp
-    session.messages.sort(key=lambda x: x.timestamp)
-    return session
+
+    try:
+        messages, next_before = await list_messages(db, session_id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_before:
+        response.headers[NEXT_CURSOR_HEADER] = next_before
+    return {"id": session.id, "title": session.title, "created_at": session.created_at,
+            "messages": messages, "next_before": next_before}
 
 @router.post("/", response_model=SessionResponse)
-def create_chat_session(
+async def create_chat_session(
     title: str = Body(default="New Chat"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Create a new chat session"""
     new_session = ChatSession(
         user_id=current_user.id,
-        title=title
+        title=title,
+        messages=[]
     )
     db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
+    await db.commit()
     return new_session
 
 @router.delete("/{session_id}")
-def delete_chat_session(
+async def delete_chat_session(
     session_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Delete a chat session"""
-    session = db.query(ChatSession).filter(
-        ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
-    ).first()
+    await _wait_for_pending_writes(current_user)
+    session = (await db.execute(
+        select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == current_user.id)
+    )).scalars().first()
     
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
         
-    db.delete(session)
-    db.commit()
+    # Awaitable so the delete-orphan cascade can load the session's messages
+    await db.delete(session)
+    await record_deletion(db, current_user.id, session_id)
+    await db.commit()
     return {"message": "Session deleted"}
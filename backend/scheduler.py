@@ -0,0 +1,171 @@
+"""
+MANA VARTHA AI - Admission Control
+Bounded concurrency with a priority wait queue for Gemini and Cohere calls
+
+Limits are per process: every API worker has its own LLM_*/EMBED_* slots, and priorities only
+order calls that queue in the same process. Jobs that run as their own process (the
+daily_update.py cron job) never wait behind or ahead of /search here, so they get a small
+limiter of their own instead (DAILY_UPDATE_EMBED_MAX_CONCURRENCY); provider quota has to cover
+workers x EMBED_MAX_CONCURRENCY plus that.
+"""
+
+import os
+import math
+import heapq
+import time
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+    INTERACTIVE = 0  # /search
+    BRIEF = 1        # /daily-brief regeneration
+    INGEST = 2       # ingestion / re-embedding run inside an API process
+
+
+class Overloaded(Exception):
+    """Raised when a call is shed instead of queued; maps to HTTP 503 + Retry-After."""
+
+    def __init__(self, limiter: str, retry_after: int):
+        super().__init__(f"{limiter} is overloaded, retry after {retry_after}s")
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+
+# Priority of the work running in the current request/thread (copied into asyncio.to_thread)
+current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("current_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: Priority):
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class PriorityLimiter:
+    """
+    At most `max_concurrent` calls run at once; up to `max_queue` more wait in priority order.
+    When the queue is full (or the wait would outlast the caller's timeout) the call is shed
+    right away with Overloaded instead of timing out late.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait: float = 30.0):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.active = 0
+        self.shed = 0
+        self.admitted = 0
+        self._queue = []  # heap of (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._avg_hold = 1.0  # EWMA of slot hold time, used for Retry-After
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, max_concurrent: int, max_queue: int) -> "PriorityLimiter":
+        return cls(
+            name,
+            max_concurrent=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(max_concurrent))),
+            max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", str(max_queue))),
+            max_wait=float(os.getenv(f"{prefix}_MAX_WAIT", "30")),
+        )
+
+    def _retry_after(self) -> int:
+        waiting = len(self._queue) + 1
+        return max(1, math.ceil(self._avg_hold * waiting / self.max_concurrent))
+
+    def _acquire(self, priority: Priority, timeout: Optional[float]):
+        with self._lock:
+            if self.active < self.max_concurrent and not self._queue:
+                self.active += 1
+                self.admitted += 1
+                return
+            if len(self._queue) >= self.max_queue:
+                self.shed += 1
+                raise Overloaded(self.name, self._retry_after())
+            waiter = _Waiter()
+            heapq.heappush(self._queue, (int(priority), next(self._seq), waiter))
+
+        wait_for = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        waiter.event.wait(max(0.0, wait_for))
+        with self._lock:
+            if waiter.granted:
+                self.admitted += 1
+                return
+            # Timed out in the queue: give up our place
+            self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+            heapq.heapify(self._queue)
+            self.shed += 1
+            raise Overloaded(self.name, self._retry_after())
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without waiting; False if none is free or callers are already queued."""
+        with self._lock:
+            if self.active < self.max_concurrent and not self._queue:
+                self.active += 1
+                self.admitted += 1
+                return True
+            return False
+
+    def release(self, held: float = 0.0):
+        """Give back a slot taken with try_acquire()."""
+        self._release(held)
+
+    def _release(self, held: float):
+        with self._lock:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+            if self._queue:
+                # Hand the slot straight to the next waiter; `active` stays the same
+                _, _, waiter = heapq.heappop(self._queue)
+                waiter.granted = True
+                waiter.event.set()
+                return
+            self.active -= 1
+
+    @contextmanager
+    def slot(self, priority: Optional[Priority] = None, timeout: Optional[float] = None):
+        """Hold one concurrency slot for the duration of the block."""
+        if priority is None:
+            priority = current_priority.get()
+        self._acquire(priority, timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "active": self.active,
+                "queued": len(self._queue),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "shed": self.shed,
+            }
+
+
+# Process-wide limiters
+llm_limiter = PriorityLimiter.from_env("gemini", "LLM", max_concurrent=8, max_queue=32)
+embed_limiter = PriorityLimiter.from_env("cohere", "EMBED", max_concurrent=8, max_queue=64)
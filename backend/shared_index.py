@@ -0,0 +1,253 @@
+"""
+MANA VARTHA AI - Shared Index Snapshot
+Read-only mmap'd snapshot of the vector matrix and chunk texts, so N uvicorn/gunicorn workers
+share one copy of the index through the page cache instead of each holding a private one.
+
+    SHARED_INDEX=true                 # rag_engine attaches to the snapshot instead of loading FAISS
+    SHARED_INDEX_DIR=data/index_shared  # default: index_shared next to the data path
+
+Layout (one directory per source fingerprint, switched atomically via CURRENT):
+    index_shared/CURRENT                      name of the live snapshot
+    index_shared/snap-<fingerprint>/vectors.npy        float32 (N, dim), same vectors FAISS would index
+    index_shared/snap-<fingerprint>/chunks.bin         UTF-8 chunk texts back to back
+    index_shared/snap-<fingerprint>/chunk_offsets.npy  int64 (N + 1) byte offsets into chunks.bin
+    index_shared/snap-<fingerprint>/manifest.json
+
+Usage:
+    python shared_index.py build --data-path data/chunks   # build once before starting workers
+    python shared_index.py info --data-path data/chunks
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import argparse
+from collections.abc import Sequence
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+KEEP_SNAPSHOTS = 2  # live + previous: workers that haven't reloaded yet still map the old one
+
+
+def shared_index_enabled() -> bool:
+    return os.getenv("SHARED_INDEX", "false").lower() in ("1", "true", "yes")
+
+
+def default_snapshot_root(data_path: str) -> str:
+    # Next to the data path, file or directory alike: never inside the directory of source CSVs
+    base = os.path.dirname(os.path.abspath(data_path))
+    return os.getenv("SHARED_INDEX_DIR") or os.path.join(base, "index_shared")
+
+
+def source_files(data_path: str) -> List[str]:
+    """The chunk CSV itself, or the CSVs of a data directory in name order."""
+    if os.path.isdir(data_path):
+        return sorted(os.path.join(data_path, f) for f in os.listdir(data_path) if f.endswith(".csv"))
+    return [data_path]
+
+
+def source_fingerprint(data_path: str) -> str:
+    """Changes whenever a source CSV is added, removed or rewritten."""
+    digest = hashlib.sha256()
+    for path in source_files(data_path):
+        st = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class ChunkStore(Sequence):
+    """Chunk texts decoded on access from a read-only mmap; behaves like a list of str."""
+
+    def __init__(self, blob_path: str, offsets_path: str):
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        with open(blob_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # An empty corpus can't be mmap'd; ACCESS_READ pages are shared and never copied
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        return self._blob[int(self._offsets[i]):int(self._offsets[i + 1])].decode("utf-8")
+
+
+class MmapFlatIndex:
+    """
+    Exact inner-product search over a read-only mmap'd matrix, with the same search()
+    contract as faiss.IndexFlatIP. Scores are computed in blocks so the per-query scratch
+    memory stays bounded no matter how large the corpus is.
+    """
+
+    def __init__(self, vectors: np.ndarray, block_rows: int = 262144):
+        self.vectors = vectors
+        self.d = vectors.shape[1]
+        self.block_rows = block_rows
+
+    @property
+    def ntotal(self) -> int:
+        return self.vectors.shape[0]
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        n = self.ntotal
+        k = min(k, n)
+        nq = queries.shape[0]
+        if k == 0:
+            return np.zeros((nq, 0), dtype=np.float32), np.zeros((nq, 0), dtype=np.int64)
+        best_scores = np.full((nq, k), -np.inf, dtype=np.float32)
+        best_ids = np.full((nq, k), -1, dtype=np.int64)
+        for start in range(0, n, self.block_rows):
+            block = self.vectors[start:start + self.block_rows]
+            scores = queries @ block.T
+            # Merge this block's candidates with the running top-k
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_ids = np.concatenate(
+                [best_ids, np.broadcast_to(np.arange(start, start + block.shape[0]), scores.shape)], axis=1)
+            top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(merged_scores, top, axis=1)
+            best_ids = np.take_along_axis(merged_ids, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
+
+@contextmanager
+def _build_lock(root: str) -> Iterator[None]:
+    """Cross-process lock so only one worker builds a snapshot; the rest wait and attach."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def current_snapshot(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(root, name)
+    return path if name and os.path.isdir(path) else None
+
+
+def write_snapshot(root: str, fingerprint: str, chunks: List[str], embeddings: np.ndarray, source: str = "") -> str:
+    """Write a complete snapshot next to the live one, then flip CURRENT to it."""
+    name = f"snap-{fingerprint}"
+    final_dir = os.path.join(root, name)
+    tmp_dir = os.path.join(root, f".{name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    np.save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    with open(os.path.join(tmp_dir, "chunks.bin"), "wb") as blob:
+        for i, chunk in enumerate(chunks):
+            data = str(chunk).encode("utf-8")
+            blob.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(os.path.join(tmp_dir, "chunk_offsets.npy"), offsets)
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "count": len(chunks), "dim": int(vectors.shape[1]),
+                   "created_at": time.time(), "source": source}, f)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.rename(tmp_dir, final_dir)
+    pointer_tmp = os.path.join(root, f".{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+    _prune(root, keep=name)
+    logger.info(f"💾 Shared index snapshot written: {final_dir} ({len(chunks):,} chunks)")
+    return final_dir
+
+
+def _prune(root: str, keep: str):
+    snapshots = sorted((d for d in os.listdir(root) if d.startswith("snap-") and d != keep),
+                       key=lambda d: os.path.getmtime(os.path.join(root, d)), reverse=True)
+    # Unlinking is safe for workers still mapping an old snapshot: their pages stay valid
+    for stale in snapshots[KEEP_SNAPSHOTS - 1:]:
+        shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+
+
+def attach_snapshot(path: str) -> Tuple[ChunkStore, np.ndarray, MmapFlatIndex]:
+    """Map a snapshot read-only: writes raise instead of silently copying pages per worker."""
+    vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+    chunks = ChunkStore(os.path.join(path, "chunks.bin"), os.path.join(path, "chunk_offsets.npy"))
+    if len(chunks) != vectors.shape[0]:
+        raise ValueError(f"Corrupt snapshot {path}: {len(chunks)} chunks vs {vectors.shape[0]} vectors")
+    return chunks, vectors, MmapFlatIndex(vectors)
+
+
+def ensure_snapshot(data_path: str, build: Callable[[], Tuple[List[str], np.ndarray]],
+                    root: Optional[str] = None) -> str:
+    """
+    Path of a snapshot matching the current source files, building it if needed.
+    Exactly one process builds; concurrent workers block on the lock and then attach.
+    """
+    root = root or default_snapshot_root(data_path)
+    fingerprint = source_fingerprint(data_path)
+    live = current_snapshot(root)
+    if live and os.path.basename(live) == f"snap-{fingerprint}":
+        return live
+    with _build_lock(root):
+        # Another worker may have finished the build while we waited for the lock
+        live = current_snapshot(root)
+        if live and os.path.basename(live) == f"snap-{fingerprint}":
+            return live
+        logger.info(f"🏗️ Building shared index snapshot for {data_path}...")
+        chunks, embeddings = build()
+        return write_snapshot(root, fingerprint, chunks, embeddings, source=os.path.abspath(data_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the shared mmap index snapshot")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--data-path", required=True, help="Chunk CSV file or directory of CSVs")
+    parser.add_argument("--root", help="Snapshot root (default: SHARED_INDEX_DIR or index_shared next to the data path)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    root = args.root or default_snapshot_root(args.data_path)
+    if args.command == "build":
+        from rag_engine import TeluguNewsRAG
+        # Only the CSV parser is needed: skip __init__ so no provider keys are required to build
+        rag = TeluguNewsRAG.__new__(TeluguNewsRAG)
+        rag.csv_path, rag.embedding_dim = args.data_path, 1024
+        path = ensure_snapshot(args.data_path, rag._parse_sources, root)
+        print(f"✅ Snapshot ready: {path}")
+    else:
+        live = current_snapshot(root)
+        if not live:
+            sys.exit(f"No snapshot under {root}")
+        with open(os.path.join(live, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        up_to_date = manifest["fingerprint"] == source_fingerprint(args.data_path)
+        print(json.dumps(dict(manifest, path=live, up_to_date=up_to_date), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ Tests RAG engine with various query types
 import requests
 import json
 import time
+import uuid
 from typing import List, Dict
 
 # API Configuration
@@ -41,6 +42,16 @@ def print_info(text: str):
     """Print info message"""
     print(f"{Colors.OKCYAN}ℹ️  {text}{Colors.ENDC}")
 
+def format_server_timing(header: str) -> str:
+    """Turn 'embed;dur=120.5, generate;dur=900.1' into a readable breakdown"""
+    if not header:
+        return "N/A"
+    parts = []
+    for entry in header.split(","):
+        name, _, dur = entry.strip().partition(";dur=")
+        parts.append(f"{name}={dur}ms" if dur else name)
+    return ", ".join(parts)
+
 def test_health_check() -> bool:
     """Test health check endpoint"""
     print_header("Testing Health Check")
@@ -63,10 +74,12 @@ def test_query(query: str, expected_language: str = None) -> Dict:
     """Test a single query"""
     try:
         start_time = time.time()
+        trace_id = uuid.uuid4().hex
         
         response = requests.get(
             f"{API_BASE_URL}/search",
             params={"query": query},
+            headers={"X-Request-ID": trace_id},
             timeout=10
         )
         
@@ -78,6 +91,8 @@ def test_query(query: str, expected_language: str = None) -> Dict:
             print(f"\n{Colors.BOLD}Query:{Colors.ENDC} {query}")
             print(f"{Colors.BOLD}Language Detected:{Colors.ENDC} {data.get('language', 'N/A')}")
             print(f"{Colors.BOLD}Response Time:{Colors.ENDC} {elapsed_time:.2f}s")
+            print(f"{Colors.BOLD}Trace ID:{Colors.ENDC} {response.headers.get('X-Request-ID', trace_id)}")
+            print(f"{Colors.BOLD}Server Timing:{Colors.ENDC} {format_server_timing(response.headers.get('Server-Timing'))}")
             print(f"{Colors.BOLD}Chunks Retrieved:{Colors.ENDC} {data.get('chunks_retrieved', 0)}")
             print(f"\n{Colors.BOLD}Answer:{Colors.ENDC}")
             print(f"{data['answer']}")
@@ -0,0 +1,54 @@
+"""
+MANA VARTHA AI - Request Tracing
+Request-scoped trace ids and per-stage timings (Server-Timing header + structured request log)
+"""
+
+import re
+import uuid
+import contextvars
+from typing import Dict, List, Optional, Tuple
+
+TRACE_HEADER = "X-Request-ID"
+
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+trace_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+# Mutable list shared by reference with worker threads (asyncio.to_thread copies the context)
+_timings_var: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("stage_timings", default=None)
+
+
+def resolve_trace_id(incoming: Optional[str]) -> str:
+    """Accept a well-formed client trace id, otherwise mint a new one."""
+    if incoming and _VALID_TRACE_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def start_request(trace_id: str):
+    trace_id_var.set(trace_id)
+    _timings_var.set([])
+
+
+def current_trace_id() -> Optional[str]:
+    return trace_id_var.get()
+
+
+def record_stage(stage: str, seconds: float):
+    """Attach a stage duration to the current request, if there is one."""
+    timings = _timings_var.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def stage_durations() -> Dict[str, float]:
+    """Stage -> total milliseconds for the current request (repeated stages are summed)."""
+    totals: Dict[str, float] = {}
+    for stage, seconds in _timings_var.get() or []:
+        totals[stage] = totals.get(stage, 0.0) + seconds * 1000
+    return totals
+
+
+def server_timing_header(durations: Dict[str, float], total_ms: float) -> str:
+    parts = [f"{stage};dur={ms:.1f}" for stage, ms in durations.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
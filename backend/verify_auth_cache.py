@@ -0,0 +1,141 @@
+"""
+MANA VARTHA AI - Authentication Cache Verification
+Counts users-table statements behind authenticated requests and checks that a repeated token
+is served from the principal cache, that pre-`uid` tokens still work, and that expiry, password
+changes, email changes and deletion are honoured. Also times get_current_user cached vs uncached.
+
+Usage:
+    python verify_auth_cache.py
+    python verify_auth_cache.py --calls 5000
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+from datetime import timedelta
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the verified-principal cache in auth.py")
+    parser.add_argument("--calls", type=int, default=2000, help="get_current_user calls per timing run")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mvai_auth_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'chat.db')}"
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from database import Base, engine, SessionLocal, AsyncSessionLocal, async_engine, async_write_engine
+        from models import User
+        from routers import auth as auth_router
+        from verify_chat_store import StatementCounter
+        import auth
+
+        Base.metadata.create_all(bind=engine)
+        app = FastAPI()
+        app.include_router(auth_router.router)
+        counter = StatementCounter(async_engine.sync_engine, async_write_engine.sync_engine)
+
+        def user_lookups():
+            return [s for s in counter.statements if "users.id" in s]
+
+        ok = True
+        with TestClient(app) as client:
+            signed_up = client.post("/auth/signup", json={"email": "cached@example.com", "password": "password123",
+                                                          "full_name": "Cached"}).json()
+            headers = {"Authorization": f"Bearer {signed_up['access_token']}"}
+
+            with counter.count():
+                first = client.get("/auth/me", headers=headers)
+            ok &= check(first.status_code == 200 and len(user_lookups()) == len(counter.statements) == 1,
+                        f"First request: {len(user_lookups())} users lookup")
+            with counter.count():
+                repeated = [client.get("/auth/me", headers=headers).status_code for _ in range(50)]
+            ok &= check(set(repeated) == {200} and not counter.statements,
+                        f"50 repeated requests: {len(counter.statements)} database statements")
+
+            legacy = auth.create_access_token({"sub": "cached@example.com"}, timedelta(minutes=5))
+            with counter.count():
+                codes = [client.get("/auth/me", headers={"Authorization": f"Bearer {legacy}"}).status_code
+                         for _ in range(5)]
+            ok &= check(set(codes) == {200} and len(user_lookups()) == 1,
+                        "Tokens without a uid claim still work (one lookup by email, then cached)")
+
+            short = auth.create_access_token({"sub": "cached@example.com", "uid": signed_up["user_id"]},
+                                             timedelta(seconds=2))
+            short_headers = {"Authorization": f"Bearer {short}"}
+            before_expiry = client.get("/auth/me", headers=short_headers).status_code
+            time.sleep(3.5)  # jose accepts a token until the second after exp
+            ok &= check(before_expiry == 200 and client.get("/auth/me", headers=short_headers).status_code == 401,
+                        "Cached entries never outlive the token's exp")
+
+            cached_before = len(auth.principal_cache)
+            with SessionLocal() as db:
+                user = db.get(User, signed_up["user_id"])
+                user.hashed_password = auth.get_password_hash("new-password")
+                db.commit()
+            cached_after = len(auth.principal_cache)
+            with counter.count():
+                still_valid = client.get("/auth/me", headers=headers).status_code
+            ok &= check(cached_before >= 2 and cached_after == 0 and still_valid == 200 and
+                        len(user_lookups()) == 1,
+                        f"Password change dropped the user's {cached_before} cached tokens (next request re-checks)")
+
+            with SessionLocal() as db:
+                db.get(User, signed_up["user_id"]).email = "renamed@example.com"
+                db.commit()
+            ok &= check(client.get("/auth/me", headers=headers).status_code == 401,
+                        "Email change: tokens minted for the old email are rejected")
+
+            renamed = {"Authorization": "Bearer " + auth.create_access_token(
+                {"sub": "renamed@example.com", "uid": signed_up["user_id"]}, timedelta(minutes=5))}
+            client.get("/auth/me", headers=renamed)
+            with SessionLocal() as db:
+                db.delete(db.get(User, signed_up["user_id"]))
+                db.commit()
+            ok &= check(client.get("/auth/me", headers=renamed).status_code == 401,
+                        "Deleted user: cached principal is dropped, the token is rejected at once")
+
+        # Dependency cost with and without the cache
+        with SessionLocal() as db:
+            db.add(User(id="timing-user", email="timing@example.com", hashed_password="x"))
+            db.commit()
+        token = auth.create_access_token({"sub": "timing@example.com", "uid": "timing-user"}, timedelta(minutes=5))
+
+        async def time_calls(ttl: float) -> float:
+            auth.principal_cache.ttl = ttl
+            auth.principal_cache.invalidate_user("timing-user")
+            started = time.perf_counter()
+            for _ in range(args.calls):
+                async with AsyncSessionLocal() as db:
+                    await auth.get_current_user(token, db)
+            return (time.perf_counter() - started) / args.calls * 1e6
+
+        async def timings():
+            result = (await time_calls(0), await time_calls(auth.AUTH_CACHE_TTL or 300))
+            await async_engine.dispose()
+            return result
+
+        uncached, cached = asyncio.run(timings())
+        ok &= check(cached < uncached / 5,
+                    f"get_current_user: {uncached:.0f} µs uncached -> {cached:.1f} µs cached ({uncached / cached:.0f}x)")
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+MANA VARTHA AI - Rolling Conversation Memory Verification
+Runs a long conversation through /search (offline providers), records the prompts sent to the
+LLM, and checks that conversation context in prompts stays bounded however long the chat gets,
+that the summary covers everything but the last turn, that folding it doesn't touch updated_at,
+that turns whose folds failed several times in a row are still summarized once a fold succeeds
+(even after they left the recent-message window), and that a stale fold can't overwrite a newer summary.
+
+Usage:
+    python verify_chat_memory.py
+    python verify_chat_memory.py --turns 60
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+QUESTIONS = ["Hyderabad rains latest update", "enduku intha varsham?", "which districts are affected?",
+             "what did the government say about it?", "ela prepare avvali?", "cricket news today",
+             "who won the match?", "next match eppudu?", "Telangana budget highlights", "idi evariki use?"]
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+def history_section(prompt: str) -> str:
+    """Conversation context of an answer or rewrite prompt."""
+    if "Rewritten Query:" in prompt:
+        return prompt.split("Conversation History:\n", 1)[-1].split("\nCurrent User Input:", 1)[0]
+    if "Conversation History (for context):" not in prompt:
+        return ""
+    return prompt.split("Conversation History (for context):\n", 1)[-1].split("\nContext (if available):", 1)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify rolling conversation summaries in /search prompts")
+    parser.add_argument("--turns", type=int, default=30)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mvai_memory_")
+    os.environ.update(
+        EMBEDDING_PROVIDER="local", LLM_PROVIDER="fake", FAKE_LLM_MEDIAN_MS="5", SHARED_INDEX="false",
+        DATA_PATH=os.path.join(workdir, "chunks.csv"),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'chat.db')}",
+    )
+    os.environ.pop("RETRIEVAL_SOCKET", None)
+    try:
+        from bench_retrieval import generate_csv
+        from providers import LocalHashEmbedder
+        generate_csv(os.environ["DATA_PATH"], 500, "embedding", embedder=LocalHashEmbedder())
+
+        from fastapi.testclient import TestClient
+        from database import SessionLocal
+        from models import ChatSession, ChatMessage
+        from readiness import LOAD_PROGRESS
+        from rag_engine import get_rag_engine, HISTORY_MESSAGE_CHARS, SUMMARY_MAX_CHARS
+        import chat_memory
+        import chat_store
+        import main as app_module
+
+        prompts = []
+
+        def conversation(client, headers, turns: int):
+            """Ask `turns` questions in one session; returns (session_id, per-turn context sizes)."""
+            session_id, sizes = None, []
+            for turn in range(turns):
+                del prompts[:]
+                params = {"query": QUESTIONS[turn % len(QUESTIONS)], "mode": "deep"}
+                if session_id:
+                    params["session_id"] = session_id
+                session_id = client.get("/search", params=params, headers=headers).json()["session_id"]
+                # Let the background fold land before the next question, as it does between human turns
+                deadline = time.time() + 10
+                while chat_memory._pending and time.time() < deadline:
+                    time.sleep(0.01)
+                answer_prompts = [p for p in prompts if "Generative Response:" in p]
+                rewrite_prompts = [p for p in prompts if "Rewritten Query:" in p]
+                sizes.append((len(history_section(answer_prompts[-1])) if answer_prompts else 0,
+                              len(history_section(rewrite_prompts[-1])) if rewrite_prompts else 0))
+            return session_id, sizes
+
+        ok = True
+        with TestClient(app_module.app) as client:
+            started = time.time()
+            while not LOAD_PROGRESS.ready:
+                if time.time() - started > 120:
+                    raise SystemExit("❌ RAG engine did not become ready")
+                time.sleep(0.2)
+            rag = get_rag_engine()
+            generate = rag._safe_generate_content
+
+            failing_summaries = []
+
+            def recording(prompt, timeout=None):
+                prompts.append(prompt)
+                if failing_summaries and "Updated Summary:" in prompt:
+                    return None
+                return generate(prompt, timeout=timeout)
+
+            rag._safe_generate_content = recording
+
+            signed_up = client.post("/auth/signup", json={"email": "memory@example.com", "password": "password123",
+                                                          "full_name": "Memory"}).json()
+            headers = {"Authorization": f"Bearer {signed_up['access_token']}"}
+
+            session_id, sizes = conversation(client, headers, args.turns)
+
+            bound = SUMMARY_MAX_CHARS + 2 * (HISTORY_MESSAGE_CHARS + 20) + 60
+            late = sizes[args.turns // 2:]
+            ok &= check(max(a for a, _ in late) <= bound and max(r for _, r in late) <= bound,
+                        f"Context in prompts stays under {bound} chars (answer max {max(a for a, _ in late)}, "
+                        f"rewrite max {max(r for _, r in late)}) through turn {args.turns}")
+            print("   answer context by turn: " + " ".join(str(a) for a, _ in sizes))
+
+            summary_prompts = [p for p in prompts if "Updated Summary:" in p]
+            ok &= check(len(summary_prompts) == 1 and summary_prompts[0].split("New Turns:\n", 1)[1].count("User: ") == 1,
+                        "Each fold sends only the turn that left the window, not the conversation")
+
+            # Folds fail for several turns in a row, then one succeeds: it must cover every missed turn,
+            # including those that already slid out of the recent-message window
+            for failures in (2, 3):
+                missed = [f"turn {n} question about district{failures}{n} flood relief" for n in range(2, 3 + failures)]
+                recovering_session, recovery_prompts = None, []
+                for turn, question in enumerate(["opening question about the floods"] + missed + ["and now?"]):
+                    del prompts[:]
+                    del failing_summaries[:]
+                    if 2 <= turn <= 1 + failures:
+                        failing_summaries.append(True)
+                    params = {"query": question, "mode": "deep"}
+                    if recovering_session:
+                        params["session_id"] = recovering_session
+                    recovering_session = client.get("/search", params=params, headers=headers).json()["session_id"]
+                    deadline = time.time() + 10
+                    while chat_memory._pending and time.time() < deadline:
+                        time.sleep(0.01)
+                    recovery_prompts = [p for p in prompts if "Updated Summary:" in p]
+                del failing_summaries[:]
+                folded = recovery_prompts[0].split("New Turns:\n", 1)[1] if recovery_prompts else ""
+                with SessionLocal() as db:
+                    through = db.get(ChatSession, recovering_session).summary_through
+                    stored = [m.timestamp for m in db.query(ChatMessage)
+                              .filter(ChatMessage.session_id == recovering_session).order_by(ChatMessage.timestamp)]
+                ok &= check(all(q in folded for q in missed) and through == stored[-3],
+                            f"After {failures} failed folds in a row the next fold summarizes all "
+                            f"{sum(q in folded for q in missed)}/{len(missed)} missed turns")
+
+        with SessionLocal() as db:
+            session = db.get(ChatSession, session_id)
+            times = [m.timestamp for m in db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+                     .order_by(ChatMessage.timestamp)]
+        ok &= check(session.summary and len(session.summary) <= SUMMARY_MAX_CHARS and session.summary_through == times[-3],
+                    f"Stored summary ({len(session.summary or '')} chars) covers all but the last turn")
+        ok &= check(session.updated_at == times[-2],
+                    "Folding the summary leaves updated_at (sidebar order, /chats/sync) alone")
+
+        async def compare_and_set():
+            from database import AsyncSessionLocal
+            async with AsyncSessionLocal() as db:
+                fresh = await chat_store.load_history(db, session_id, signed_up["user_id"])
+            stale = chat_store.SessionHistory(fresh.session_id, fresh.title, fresh.messages, fresh.message_ids,
+                                              fresh.message_times, "older summary", times[-5])
+            return (await chat_memory.update_summary(rag, signed_up["user_id"], stale, stale.unsummarized()),
+                    await chat_memory.update_summary(rag, signed_up["user_id"], fresh, fresh.unsummarized()))
+
+        stale_written, fresh_written = asyncio.run(compare_and_set())
+        with SessionLocal() as db:
+            through = db.get(ChatSession, session_id).summary_through
+        ok &= check(not stale_written and fresh_written and through == times[-1],
+                    "A fold based on an outdated summary is rejected; a current one is stored")
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+MANA VARTHA AI - Chat History Pagination Verification
+Seeds a heavy user (thousands of sessions and messages) and a light one, then checks through
+the real /chats routes that keyset pages cover the whole history exactly once and in order
+(including timestamp ties), and that first-page size and latency don't grow with history.
+
+Usage:
+    python verify_chat_pagination.py
+    python verify_chat_pagination.py --sessions 5000 --messages 20000
+"""
+
+import os
+import sys
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+def seed(user_id: str, sessions: int, messages: int):
+    """`sessions` sessions; the first one holds `messages` messages, two per timestamp (ties on purpose)."""
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models import ChatSession, ChatMessage
+
+    start = datetime(2025, 1, 1)
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    with SessionLocal() as db:
+        db.execute(insert(ChatSession), [
+            {"id": sid, "user_id": user_id, "title": f"Session {i}", "created_at": start,
+             # Pairs of sessions share updated_at to exercise the id tie-break
+             "updated_at": start + timedelta(minutes=i // 2)} for i, sid in enumerate(session_ids)])
+        for offset in range(0, messages, 10000):
+            db.execute(insert(ChatMessage), [
+                {"id": str(uuid.uuid4()), "session_id": session_ids[0], "role": "user" if i % 2 == 0 else "assistant",
+                 "content": f"message {i}", "timestamp": start + timedelta(seconds=i // 2)}
+                for i in range(offset, min(messages, offset + 10000))])
+        db.commit()
+    return session_ids
+
+
+def first_page_stats(client, path: str, headers, runs: int = 30):
+    latencies, size = [], 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        size = len(response.content)
+    return statistics.median(latencies), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify keyset pagination of the chat history endpoints")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mvai_pagination_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'chat.db')}"
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from database import Base, engine
+        from routers import auth as auth_router, chat as chat_router
+
+        Base.metadata.create_all(bind=engine)
+        app = FastAPI()
+        app.include_router(auth_router.router)
+        app.include_router(chat_router.router)
+
+        ok = True
+        with TestClient(app) as client:
+            headers, user_ids = {}, {}
+            for who in ("heavy", "light"):
+                signed_up = client.post("/auth/signup", json={"email": f"{who}@example.com", "password": "password123",
+                                                              "full_name": who.title()}).json()
+                headers[who] = {"Authorization": f"Bearer {signed_up['access_token']}"}
+                user_ids[who] = signed_up["user_id"]
+            heavy = seed(user_ids["heavy"], args.sessions, args.messages)
+            light = seed(user_ids["light"], 60, 60)
+
+            # Walk every session page
+            seen, before, pages = [], None, 0
+            while True:
+                response = client.get("/chats/", params={"limit": 100, "before": before}, headers=headers["heavy"])
+                seen += response.json()
+                pages += 1
+                before = response.headers.get(chat_router.NEXT_CURSOR_HEADER)
+                if not before:
+                    break
+            order = [(s["updated_at"], s["id"]) for s in seen]
+            ok &= check(len(seen) == len(set(s["id"] for s in seen)) == args.sessions and order == sorted(order, reverse=True),
+                        f"/chats/: {pages} pages cover all {args.sessions} sessions once, most recent first")
+
+            # Walk a long conversation backwards
+            messages, before, pages = [], None, 0
+            while True:
+                body = client.get(f"/chats/{heavy[0]}", params={"limit": 50, "before": before},
+                                  headers=headers["heavy"]).json()
+                messages = body["messages"] + messages
+                pages += 1
+                before = body["next_before"]
+                if not before:
+                    break
+            order = [(m["timestamp"], m["id"]) for m in messages]
+            ok &= check(sorted(m["content"] for m in messages) == sorted(f"message {i}" for i in range(args.messages))
+                        and order == sorted(order),
+                        f"/chats/{{id}}: {pages} pages cover all {args.messages} messages once, in order")
+
+            ok &= check(client.get("/chats/", params={"before": "not-a-cursor"}, headers=headers["heavy"]).status_code == 400 and
+                        client.get(f"/chats/{heavy[0]}", headers=headers["light"]).status_code == 404,
+                        "Bad cursors are rejected (400), other users' sessions stay hidden (404)")
+
+            for path, label in (("/chats/", "session list"), ("/chats/{}", "conversation")):
+                heavy_ms, heavy_bytes = first_page_stats(client, path.format(heavy[0]), headers["heavy"])
+                light_ms, light_bytes = first_page_stats(client, path.format(light[0]), headers["light"])
+                ok &= check(heavy_bytes <= light_bytes * 1.1 and heavy_ms <= max(light_ms * 2, light_ms + 5),
+                            f"First {label} page: {heavy_bytes / 1024:.1f} KB / {heavy_ms:.1f} ms for the heavy user, "
+                            f"{light_bytes / 1024:.1f} KB / {light_ms:.1f} ms for the light one")
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
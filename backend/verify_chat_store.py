@@ -0,0 +1,141 @@
+"""
+MANA VARTHA AI - Chat Persistence Round-Trip Verification
+Counts the SQL statements /search sends to the database (SQLAlchemy before_cursor_execute)
+and fails if history load or persistence regress to per-row or read-back round-trips.
+
+Expected per logged-in /search:
+    token -> user lookup                        1   (first use of a token; then auth.py's cache)
+    history load (session JOIN messages)        1   (follow-ups only)
+    session update / insert                     1
+    both messages (one multi-row insert)        1
+    + one COMMIT, not counted as a statement
+
+Usage:
+    python verify_chat_store.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import List
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+
+class StatementCounter:
+    """Records every statement the engines send to the DBAPI inside `with counter.count():`."""
+
+    def __init__(self, *engines):
+        from sqlalchemy import event
+        self.statements: List[str] = []
+        self.active = False
+        for engine in set(engines):
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active:
+            self.statements.append(" ".join(statement.split())[:90])
+
+    @contextmanager
+    def count(self):
+        self.statements = []
+        self.active = True
+        try:
+            yield self
+        finally:
+            self.active = False
+
+
+def check(ok: bool, message: str, statements: List[str] = ()) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        for statement in statements:
+            print(f"      {statement}")
+    return ok
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="mvai_chatstore_")
+    os.environ.update(
+        EMBEDDING_PROVIDER="local", LLM_PROVIDER="fake", FAKE_LLM_MEDIAN_MS="5", SHARED_INDEX="false",
+        DATA_PATH=os.path.join(workdir, "chunks.csv"),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'chat.db')}",
+    )
+    os.environ.pop("RETRIEVAL_SOCKET", None)
+    try:
+        from bench_retrieval import generate_csv
+        from providers import LocalHashEmbedder
+        generate_csv(os.environ["DATA_PATH"], 500, "embedding", embedder=LocalHashEmbedder())
+
+        from fastapi.testclient import TestClient
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from database import async_engine, async_write_engine, _async_url
+        from readiness import LOAD_PROGRESS
+        from chat_store import load_history, save_exchange
+        from models import User
+        import main as app_module
+
+        counter = StatementCounter(async_engine.sync_engine, async_write_engine.sync_engine)
+        ok = True
+        with TestClient(app_module.app) as client:
+            started = time.time()
+            while not LOAD_PROGRESS.ready:
+                if time.time() - started > 120:
+                    raise SystemExit("❌ RAG engine did not become ready")
+                time.sleep(0.2)
+
+            client.post("/auth/signup", json={"email": "roundtrip@example.com", "password": "password123",
+                                              "full_name": "Round Trip"})
+            token = client.post("/auth/login", data={"username": "roundtrip@example.com",
+                                                     "password": "password123"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            with counter.count():
+                first = client.get("/search", params={"query": "cricket news today"}, headers=headers).json()
+            ok &= check(first.get("session_id") and len(counter.statements) == 3,
+                        f"New conversation: {len(counter.statements)} statements (expected 3)", counter.statements)
+
+            with counter.count():
+                follow = client.get("/search", params={"query": "who won?", "session_id": first["session_id"]},
+                                    headers=headers).json()
+            ok &= check(follow.get("session_id") == first["session_id"] and len(counter.statements) == 3,
+                        f"Follow-up: {len(counter.statements)} statements (expected 3, user cached)", counter.statements)
+
+        # Store-level behaviour the endpoint relies on (own engine: the app's pool belongs to its loop)
+        async def store_checks() -> bool:
+            store_engine = create_async_engine(_async_url(os.environ["DATABASE_URL"]))
+            store_counter = StatementCounter(store_engine.sync_engine)
+            passed = True
+            async with async_sessionmaker(store_engine, expire_on_commit=False)() as db:
+                user_id = (await db.execute(User.__table__.select())).first().id
+                with store_counter.count():
+                    history = await load_history(db, first["session_id"], user_id)
+                passed &= check(len(store_counter.statements) == 1 and [m["role"] for m in history.messages] ==
+                                ["user", "assistant", "user", "assistant"],
+                                f"History load: {len(store_counter.statements)} statement, messages oldest first",
+                                store_counter.statements)
+                passed &= check(await load_history(db, first["session_id"], "someone-else") is None,
+                                "Another user's session is not loaded")
+
+                saved = await save_exchange(db, user_id, None, "empty session check", "answer")
+                empty = await load_history(db, saved["session_id"], user_id)
+                passed &= check(empty is not None and len(empty.messages) == 2 and
+                                saved["new_session_title"] == "Empty Session Check",
+                                "New session gets its title and both messages")
+            await store_engine.dispose()
+            return passed
+
+        ok &= asyncio.run(store_checks())
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
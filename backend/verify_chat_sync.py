@@ -0,0 +1,164 @@
+"""
+MANA VARTHA AI - Chat Delta Sync Verification
+Keeps a client-side replica of a user's chat history in step through GET /chats/sync: a paged
+full sync, then deltas after new sessions, new exchanges, deletions and a late-committing row
+stamped before the previous sync. After every sync the replica must equal the database, and
+deltas must be a small fraction of the full payload.
+
+Usage:
+    python verify_chat_sync.py
+    python verify_chat_sync.py --sessions 2000 --messages-per-session 40
+"""
+
+import os
+import sys
+import uuid
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+class Replica:
+    """What a mobile client keeps locally, updated only from /chats/sync responses."""
+
+    def __init__(self):
+        self.sessions, self.messages, self.cursor = {}, {}, None
+
+    def sync(self, client, headers, limit: int):
+        pages = size = 0
+        while True:
+            response = client.get("/chats/sync", params={"since": self.cursor, "limit": limit}, headers=headers)
+            response.raise_for_status()
+            body = response.json()
+            pages, size = pages + 1, size + len(response.content)
+            if body["reset"]:
+                self.sessions, self.messages = {}, {}
+            self.sessions.update({s["id"]: s for s in body["sessions"]})
+            self.messages.update({m["id"]: m for m in body["messages"]})
+            for session_id in body["deleted_session_ids"]:
+                self.sessions.pop(session_id, None)
+                self.messages = {k: m for k, m in self.messages.items() if m["session_id"] != session_id}
+            self.cursor = body["cursor"]
+            if not body["has_more"]:
+                return pages, size
+
+
+def database_state(user_id: str):
+    from sqlalchemy import select
+    from database import SessionLocal
+    from models import ChatSession, ChatMessage
+
+    with SessionLocal() as db:
+        sessions = {r.id: r.title for r in db.execute(select(ChatSession.id, ChatSession.title)
+                                                     .where(ChatSession.user_id == user_id))}
+        messages = set(db.execute(select(ChatMessage.id).join(ChatSession)
+                                  .where(ChatSession.user_id == user_id)).scalars())
+    return sessions, messages
+
+
+def matches(replica: Replica, user_id: str) -> bool:
+    sessions, messages = database_state(user_id)
+    return ({k: s["title"] for k, s in replica.sessions.items()} == sessions and set(replica.messages) == messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify /chats/sync delta sync")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--messages-per-session", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mvai_sync_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'chat.db')}"
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from sqlalchemy import insert
+        from database import Base, engine, SessionLocal
+        from models import ChatSession, ChatMessage
+        from chat_store import plan_exchange
+        from chat_sync import encode_sync_cursor
+        from write_behind import write_batch
+        from routers import auth as auth_router, chat as chat_router
+
+        Base.metadata.create_all(bind=engine)
+        app = FastAPI()
+        app.include_router(auth_router.router)
+        app.include_router(chat_router.router)
+
+        ok = True
+        with TestClient(app) as client:
+            signed_up = client.post("/auth/signup", json={"email": "sync@example.com", "password": "password123",
+                                                          "full_name": "Sync"}).json()
+            headers = {"Authorization": f"Bearer {signed_up['access_token']}"}
+            user_id = signed_up["user_id"]
+
+            # History from the last ten days
+            start = datetime.utcnow() - timedelta(days=10)
+            session_ids = [str(uuid.uuid4()) for _ in range(args.sessions)]
+            with SessionLocal() as db:
+                db.execute(insert(ChatSession), [
+                    {"id": sid, "user_id": user_id, "title": f"Session {i}", "created_at": start,
+                     "updated_at": start + timedelta(minutes=20 * i + args.messages_per_session)}
+                    for i, sid in enumerate(session_ids)])
+                db.execute(insert(ChatMessage), [
+                    {"id": str(uuid.uuid4()), "session_id": sid, "role": "user" if j % 2 == 0 else "assistant",
+                     "content": f"message {j} of session {i} " + "x" * 200,
+                     "timestamp": start + timedelta(minutes=20 * i + j)}
+                    for i, sid in enumerate(session_ids) for j in range(args.messages_per_session)])
+                db.commit()
+
+            replica = Replica()
+            full_pages, full_size = replica.sync(client, headers, args.limit)
+            ok &= check(matches(replica, user_id) and len(replica.messages) == args.sessions * args.messages_per_session,
+                        f"Full sync: {len(replica.sessions)} sessions, {len(replica.messages)} messages "
+                        f"in {full_pages} pages ({full_size / 1024:.0f} KB)")
+
+            # Changes between syncs: a new chat, a new exchange, a deletion, and a row stamped before
+            # the last sync but committed after it (write-behind / another worker)
+            client.post("/chats/", json="Fresh Chat", headers=headers)
+            with SessionLocal() as db:
+                history = type("History", (), {"session_id": session_ids[3], "title": "Session 3"})()
+                write_batch(db, [plan_exchange(user_id, history, "follow-up question", "follow-up answer")])
+            client.delete(f"/chats/{session_ids[7]}", headers=headers)
+            late = plan_exchange(user_id, None, "late question", "late answer")
+            for row in late["messages"]:
+                row["timestamp"] -= timedelta(seconds=20)
+            late["updated_at"] -= timedelta(seconds=20)
+            with SessionLocal() as db:
+                write_batch(db, [late])
+
+            pages, size = replica.sync(client, headers, args.limit)
+            ok &= check(matches(replica, user_id) and session_ids[7] not in replica.sessions and
+                        late["session_id"] in replica.sessions,
+                        f"Delta sync: replica matches after create / exchange / delete / late commit "
+                        f"({size / 1024:.1f} KB, {size / full_size:.1%} of a full sync)")
+
+            pages, idle = replica.sync(client, headers, args.limit)
+            ok &= check(matches(replica, user_id) and idle < full_size / 50,
+                        f"Sync with no changes: {idle / 1024:.1f} KB (rows inside the safety window repeat)")
+
+            stale = encode_sync_cursor({name: (datetime.utcnow() - timedelta(days=60), "")
+                                        for name in ("sessions", "messages", "deleted")})
+            body = client.get("/chats/sync", params={"since": stale, "limit": 10}, headers=headers).json()
+            ok &= check(body["reset"] is True,
+                        "A cursor older than tombstone retention gets a full resync (reset)")
+            ok &= check(client.get("/chats/sync", params={"since": "garbage"}, headers=headers).status_code == 400,
+                        "Malformed cursors are rejected (400)")
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
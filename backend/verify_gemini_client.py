@@ -0,0 +1,172 @@
+"""
+MANA VARTHA AI - Gemini Client Verification
+Drives GeminiClient against scripted in-process models (no network) and checks that a
+half-open circuit breaker's single trial is never lost: a call that runs out of time or is
+cancelled after being granted the trial gives it back, so the next healthy call still gets
+through and closes the circuit instead of finding the model skipped forever. Also checks that
+a hedged request takes a concurrency slot of its own and is skipped when none is free.
+
+Usage:
+    python verify_gemini_client.py
+"""
+
+import os
+import sys
+import time
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ScriptedModel:
+    """Fails while `failing` is set, otherwise answers after `delay` seconds."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.failing = False
+        self.delay = 0.0
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None, request_options=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.failing:
+            raise RuntimeError(f"503 {self.model_name} unavailable (scripted)")
+        return _Response(f"{self.model_name}: ok")
+
+
+def half_open_client(cooldown: float = 0.05):
+    """Single-model client whose breaker has tripped and cooled down, i.e. the next allow() is the trial."""
+    from gemini_client import GeminiClient
+    client = GeminiClient(["model-a"], max_attempts=1, failure_threshold=1, cooldown=cooldown,
+                          model_factory=ScriptedModel)
+    model = client.models["model-a"]
+    model.failing = True
+    client.generate("trip the breaker")
+    model.failing = False
+    time.sleep(cooldown * 2)
+    return client, model
+
+
+def stall_after_allow(breaker, seconds: float = 0.0, then=None):
+    """Make the breaker's next granted allow() take `seconds` (and optionally run `then`) before returning."""
+    allow = breaker.allow
+
+    def stalled():
+        granted = allow()
+        breaker.allow = allow
+        if granted:
+            time.sleep(seconds)
+            if then is not None:
+                then()
+        return granted
+
+    breaker.allow = stalled
+
+
+def main():
+    import threading
+    from gemini_client import CircuitBreaker, GeminiClient
+    from scheduler import PriorityLimiter
+
+    ok = True
+
+    # The deadline runs out between being granted the half-open trial and making the call
+    client, model = half_open_client()
+    breaker = client.breakers["model-a"]
+    stall_after_allow(breaker, seconds=0.2)
+    calls = model.calls
+    result = client.generate("question", timeout=0.25)
+    ok &= check(result is None and model.calls == calls and breaker.state == CircuitBreaker.HALF_OPEN,
+                "Deadline exhausted after the half-open trial was granted: no call made")
+    ok &= check(not breaker._trial_in_flight, "The unused trial is given back to the breaker")
+    result = client.generate("question", timeout=5)
+    ok &= check(result == "model-a: ok" and breaker.state == CircuitBreaker.CLOSED,
+                f"The next healthy call gets the trial and closes the circuit ({breaker.state})")
+
+    # No time left at all: the breaker isn't even asked, so the trial is never taken
+    client, model = half_open_client()
+    breaker = client.breakers["model-a"]
+    result = client.generate("question", timeout=0.05)
+    ok &= check(result is None and breaker.state == CircuitBreaker.OPEN and not breaker._trial_in_flight,
+                "A call with no budget left returns before taking the trial")
+    ok &= check(client.generate("question", timeout=5) == "model-a: ok" and breaker.state == CircuitBreaker.CLOSED,
+                "...and the trial is still there for the next call")
+
+    # Cancelled (a hedge won) between being granted the trial and making the call
+    client, model = half_open_client()
+    breaker = client.breakers["model-a"]
+    cancelled = threading.Event()
+    stall_after_allow(breaker, then=cancelled.set)
+    calls = model.calls
+    result = client._generate_chain("question", client.model_names, cancelled)
+    ok &= check(result is None and model.calls == calls and not breaker._trial_in_flight,
+                "A chain cancelled after being granted the trial gives it back")
+    ok &= check(client.generate("question", timeout=5) == "model-a: ok" and breaker.state == CircuitBreaker.CLOSED,
+                "...and the model recovers on the next call")
+
+    # release() only gives back a trial the calling thread holds
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.0)
+    breaker.record_failure()
+    granted = breaker.allow()
+    other = threading.Thread(target=breaker.release)
+    other.start()
+    other.join()
+    ok &= check(granted and breaker._trial_in_flight and not breaker.allow(),
+                "Another thread's release() doesn't free a trial it doesn't own")
+    breaker.record_success()
+    breaker.release()
+    ok &= check(breaker.state == CircuitBreaker.CLOSED and breaker.allow(),
+                "release() after a recorded outcome is a no-op")
+
+    # Hedging: the caller holds one limiter slot for the primary, the hedge must take a second one
+    limiter = PriorityLimiter("verify", max_concurrent=2, max_queue=0)
+    client = GeminiClient(["model-a", "model-b"], max_attempts=1, hedge_enabled=True, hedge_min_delay=0.05,
+                          hedge_budget=1.0, model_factory=ScriptedModel, limiter=limiter)
+    client.models["model-a"].delay = 0.5
+    client.models["model-b"].delay = 0.2
+    peak = []
+    watching = threading.Event()
+
+    def watch():
+        while not watching.is_set():
+            peak.append(limiter.stats()["active"])
+            time.sleep(0.005)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    with limiter.slot():
+        result = client.generate("question", timeout=5)
+    watching.set()
+    watcher.join()
+    stats = client.hedge_stats()
+    ok &= check(result == "model-b: ok" and stats["fired"] == 1 and max(peak) == 2,
+                f"A fired hedge holds its own slot (peak {max(peak)} of {limiter.max_concurrent} active)")
+    time.sleep(0.6)  # the losing primary finishes in the background
+    ok &= check(limiter.stats()["active"] == 0, "The hedge's slot is given back once it finishes")
+
+    with limiter.slot(), limiter.slot():
+        result = client.generate("question", timeout=5)
+        active = limiter.stats()["active"]
+    stats = client.hedge_stats()
+    ok &= check(result == "model-a: ok" and stats["fired"] == 1 and stats["skipped_capacity"] == 1 and active == 2,
+                "With no free slot the hedge is skipped and the primary's answer is used")
+    ok &= check(limiter.stats()["active"] == 0 and limiter.stats()["shed"] == 0,
+                "Skipping never queues or sheds anyone")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+MANA VARTHA AI - Shared Index Verification
+Checks that the mmap snapshot returns the same neighbours as FAISS, that a saved
+faiss_prod.index pickle older than the source CSVs isn't used to build a new snapshot, and that
+extra workers attached to it cost little private memory (Linux only: reads /proc/<pid>/smaps_rollup).
+
+Usage:
+    python verify_shared_index.py                      # 20k-row corpus, 1 vs 4 workers, shared vs private
+    python verify_shared_index.py --rows 100000 --workers 1,2,4,8 --skip-private
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from typing import Dict, List
+
+import numpy as np
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+WARMUP = "తెలంగాణ వార్తలు|cricket news|Hyderabad rains|election results|budget"
+
+
+def verify_search_matches_faiss(snapshot_path: str, queries: int = 32, k: int = 30) -> bool:
+    import faiss
+    from shared_index import attach_snapshot
+
+    chunks, vectors, index = attach_snapshot(snapshot_path)
+    reference = faiss.IndexFlatIP(vectors.shape[1])
+    reference.add(np.asarray(vectors))
+    rng = np.random.default_rng(0)
+    q = vectors[rng.choice(len(chunks), size=queries, replace=False)] + rng.normal(0, 0.01, (queries, vectors.shape[1]))
+    q = q.astype(np.float32)
+    ours_scores, ours_ids = index.search(q, k)
+    ref_scores, ref_ids = reference.search(q, k)
+    same_ids = np.mean([len(set(a) & set(b)) / k for a, b in zip(ours_ids, ref_ids)])
+    max_score_diff = float(np.max(np.abs(ours_scores - ref_scores)))
+    ok = same_ids > 0.999 and max_score_diff < 1e-4
+    print(f"{'✅' if ok else '❌'} Top-{k} agreement with FAISS: {same_ids:.4f} (max score diff {max_score_diff:.2e})")
+    try:
+        vectors[0, 0] = 1.0
+        print("❌ Snapshot vectors are writable")
+        ok = False
+    except ValueError:
+        print("✅ Snapshot vectors are read-only (writes raise instead of copying pages)")
+    return ok
+
+
+def verify_stale_pickle_ignored(workdir: str) -> bool:
+    """A snapshot for rewritten CSVs comes from the CSVs, not an older faiss_prod.index pickle."""
+    import faiss
+    from bench_retrieval import generate_csv
+    from providers import LocalHashEmbedder
+    from rag_engine import TeluguNewsRAG
+
+    data_dir = os.path.join(workdir, "daily")
+    data_path = os.path.join(data_dir, "chunks.csv")
+    generate_csv(data_path, 300, "embedding", seed=1, embedder=LocalHashEmbedder())
+    # Only the parsers and the snapshot path are exercised: skip __init__ (no provider keys needed)
+    rag = TeluguNewsRAG.__new__(TeluguNewsRAG)
+    rag.csv_path, rag.embedding_dim = data_path, 1024
+    rag.index_path = os.path.join(data_dir, "faiss_prod.index")
+    rag.retrieval, rag.shared_index = None, False
+    rag.chunks, rag.embeddings = rag._parse_sources()
+    rag.index = faiss.IndexFlatIP(rag.embeddings.shape[1])
+    rag.index.add(rag.embeddings)
+    rag.save_index()
+    old_chunks = list(rag.chunks)
+
+    # Pickle newer than the CSV: it is still a valid shortcut
+    chunks, _, _ = rag._attach_shared_index()
+    ok = list(chunks) == old_chunks
+    print(f"{'✅' if ok else '❌'} Snapshot built from an up-to-date saved index")
+
+    # The daily job rewrites the CSV after the pickle was saved
+    generate_csv(data_path, 350, "embedding", seed=2, embedder=LocalHashEmbedder())
+    later = time.time() + 5
+    os.utime(data_path, (later, later))
+    fresh, _ = rag._parse_sources()
+    chunks, vectors, _ = rag._attach_shared_index()
+    stale_ok = list(chunks) == fresh and len(vectors) == 350
+    print(f"{'✅' if stale_ok else '❌'} Snapshot for the rewritten CSV has its {len(fresh)} chunks, "
+          f"not the stale saved index's {len(old_chunks)}")
+    return ok and stale_ok
+
+
+def memory(pid: int) -> Dict[str, float]:
+    """RSS / PSS / USS (private) in MB from smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return {"rss": values.get("Rss", 0.0), "pss": values.get("Pss", 0.0),
+            "uss": values.get("Private_Clean", 0.0) + values.get("Private_Dirty", 0.0)}
+
+
+def worker_pids(master: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == master:
+                children.append(int(entry))
+    # A single uvicorn worker runs inside the master process; small children are
+    # multiprocessing helpers (resource tracker), not app workers
+    return [pid for pid in children if memory(pid)["rss"] > 50] or [master]
+
+
+def measure_workers(data_path: str, workers: int, shared: bool, port: int, timeout: float) -> List[Dict[str, float]]:
+    env = dict(os.environ, EMBEDDING_PROVIDER="local", LLM_PROVIDER="fake", DATA_PATH=data_path,
+               SHARED_INDEX="true" if shared else "false", WARMUP_QUERIES=WARMUP,
+               DATABASE_URL=f"sqlite:///{os.path.join(os.path.dirname(data_path), 'verify.db')}")
+    subprocess.run([sys.executable, "-c", "import models; from database import Base, engine; Base.metadata.create_all(bind=engine)"],
+                   cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+                             "--log-level", "warning"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        started = time.time()
+        ready_hits = 0
+        # Every worker warms up on its own; wait until /readyz has answered 200 a few times in a row
+        while ready_hits < workers * 3:
+            if time.time() - started > timeout:
+                raise SystemExit("❌ Backend did not become ready in time")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=2):
+                    ready_hits += 1
+            except OSError:
+                ready_hits = 0
+            time.sleep(0.5)
+        time.sleep(2)
+        return [memory(pid) for pid in worker_pids(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the shared mmap index and per-worker memory")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--workers", default="1,4")
+    parser.add_argument("--skip-private", action="store_true", help="Only measure SHARED_INDEX=true")
+    parser.add_argument("--port", type=int, default=8810)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    from bench_retrieval import generate_csv
+    from providers import LocalHashEmbedder
+    from shared_index import default_snapshot_root, current_snapshot
+
+    workdir = tempfile.mkdtemp(prefix="mvai_shared_")
+    data_path = os.path.join(workdir, "chunks.csv")
+    try:
+        print(f"🧪 Generating {args.rows:,}-row corpus in {workdir}...")
+        generate_csv(data_path, args.rows, "embedding", embedder=LocalHashEmbedder())
+        subprocess.run([sys.executable, "shared_index.py", "build", "--data-path", data_path], cwd=BACKEND_DIR,
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        snapshot = current_snapshot(default_snapshot_root(data_path))
+        matrix_mb = os.path.getsize(os.path.join(snapshot, "vectors.npy")) / 2**20
+        print(f"📦 Snapshot {snapshot} ({matrix_mb:.0f} MB of vectors)")
+        ok = verify_search_matches_faiss(snapshot)
+        ok &= verify_stale_pickle_ignored(workdir)
+
+        counts = [int(w) for w in args.workers.split(",")]
+        modes = [True] if args.skip_private else [True, False]
+        results = {}
+        for shared in modes:
+            for n in counts:
+                mems = measure_workers(data_path, n, shared, args.port, args.timeout)
+                results[(shared, n)] = mems
+                print(f"   {'shared ' if shared else 'private'} x{n}: per worker "
+                      f"RSS {np.mean([m['rss'] for m in mems]):7.1f} MB | "
+                      f"USS {np.mean([m['uss'] for m in mems]):7.1f} MB | "
+                      f"total PSS {sum(m['pss'] for m in mems):7.1f} MB")
+
+        # Marginal cost of a worker: growth of total PSS (shared pages are split between mappers)
+        lo, hi = min(counts), max(counts)
+        if lo == hi:
+            raise SystemExit("Pass at least two worker counts, e.g. --workers 1,4")
+
+        def marginal(shared: bool) -> float:
+            pss = lambda n: sum(m["pss"] for m in results[(shared, n)])
+            return (pss(hi) - pss(lo)) / (hi - lo)
+
+        shared_cost = marginal(True)
+        if args.skip_private:
+            shared_ok = shared_cost < matrix_mb
+            print(f"{'✅' if shared_ok else '❌'} Shared mode: +{shared_cost:.0f} MB per extra worker "
+                  f"(vector matrix is {matrix_mb:.0f} MB)")
+        else:
+            private_cost = marginal(False)
+            shared_ok = shared_cost < 0.5 * private_cost
+            print(f"{'✅' if shared_ok else '❌'} Extra worker costs +{shared_cost:.0f} MB shared vs "
+                  f"+{private_cost:.0f} MB private (vector matrix is {matrix_mb:.0f} MB)")
+        sys.exit(0 if ok and shared_ok else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
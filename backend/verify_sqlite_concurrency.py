@@ -0,0 +1,138 @@
+"""
+MANA VARTHA AI - SQLite Fallback Concurrency Verification
+Runs concurrent chat writes against the SQLite fallback the way a single-node deployment does:
+several worker processes, each with many in-flight /search persists and /chats reads, plus a
+write-behind style flusher thread. Fails on any "database is locked" error or lost row.
+
+Usage:
+    python verify_sqlite_concurrency.py
+    python verify_sqlite_concurrency.py --processes 4 --concurrency 32 --exchanges 50
+"""
+
+import os
+import sys
+import time
+import asyncio
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+def worker(index: int, args, results):
+    """One uvicorn worker's worth of chat traffic: `concurrency` conversations plus a flusher thread."""
+    from sqlalchemy import select
+    from database import AsyncSessionLocal, SessionLocal, async_engine
+    from models import ChatSession
+    from chat_store import load_history, plan_exchange, save_exchange
+    from write_behind import write_batch
+
+    errors = []
+
+    async def conversation(user_id: str):
+        async with AsyncSessionLocal() as db:
+            history = None
+            for turn in range(args.exchanges):
+                try:
+                    if history is not None:
+                        history = await load_history(db, history.session_id, user_id)
+                    saved = await save_exchange(db, user_id, history, f"question {turn}", f"answer {turn}")
+                    history = history or await load_history(db, saved["session_id"], user_id)
+                    # Sidebar refresh between turns
+                    (await db.execute(select(ChatSession.id).where(ChatSession.user_id == user_id))).all()
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    errors.append(f"{type(e).__name__}: {str(e).splitlines()[0]}")
+
+    def flusher():
+        # Write-behind style: one 20-exchange batch per interval while the conversations run
+        for _ in range(args.exchanges):
+            try:
+                with SessionLocal() as db:
+                    write_batch(db, [plan_exchange(f"user-{index}-{i % args.concurrency}", None, "buffered", "answer")
+                                     for i in range(20)])
+            except Exception as e:
+                errors.append(f"{type(e).__name__} (flusher): {str(e).splitlines()[0]}")
+            time.sleep(0.05)
+
+    async def run():
+        await asyncio.gather(*(conversation(f"user-{index}-{i}") for i in range(args.concurrency)))
+        await async_engine.dispose()
+
+    thread = threading.Thread(target=flusher, daemon=True)
+    started = time.perf_counter()
+    thread.start()
+    asyncio.run(run())
+    thread.join()
+    elapsed = time.perf_counter() - started
+    results.put((index, elapsed, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify concurrent chat writes on the SQLite fallback")
+    parser.add_argument("--processes", type=int, default=2, help="Worker processes sharing the database file")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent conversations per process")
+    parser.add_argument("--exchanges", type=int, default=20, help="Exchanges per conversation")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mvai_sqlite_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'chat.db')}"
+    try:
+        from sqlalchemy import func, select, text
+        from database import Base, SessionLocal, engine
+        from models import User, ChatSession, ChatMessage
+
+        Base.metadata.create_all(bind=engine)
+        with SessionLocal() as db:
+            db.add_all([User(id=f"user-{p}-{i}", email=f"sqlite{p}-{i}@example.com", hashed_password="x")
+                        for p in range(args.processes) for i in range(args.concurrency)])
+            db.commit()
+            journal_mode = db.execute(text("PRAGMA journal_mode")).scalar()
+        engine.dispose()
+
+        results = multiprocessing.get_context("fork").Queue()
+        processes = [multiprocessing.get_context("fork").Process(target=worker, args=(i, args, results))
+                     for i in range(args.processes)]
+        started = time.perf_counter()
+        for p in processes:
+            p.start()
+        outcomes = [results.get() for _ in processes]
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+        errors = [e for _, _, errs in outcomes for e in errs]
+        expected = args.processes * args.concurrency * args.exchanges
+        total = expected + args.processes * args.exchanges * 20
+        with SessionLocal() as db:
+            persisted = db.execute(select(func.count()).select_from(ChatMessage)
+                                   .where(ChatMessage.content.like("question %"))).scalar()
+            buffered = db.execute(select(func.count()).select_from(ChatMessage)
+                                  .where(ChatMessage.content == "buffered")).scalar()
+
+        print(f"🧪 {args.processes} processes x {args.concurrency} conversations x {args.exchanges} exchanges, "
+              f"journal_mode={journal_mode}")
+        ok = check(not errors, f"{total / elapsed:.0f} exchanges/s in {elapsed:.1f}s, {len(errors)} errors")
+        for message in sorted(set(errors))[:5]:
+            print(f"      {message}")
+        ok &= check(persisted == expected and buffered == total - expected,
+                    f"{persisted + buffered}/{total} exchanges persisted")
+        ok &= check(journal_mode == "wal", "Fallback database runs in WAL mode")
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+MANA VARTHA AI - Session Working Set Verification
+Runs synthetic conversations against a 20k-chunk index (offline providers): an opening question,
+on-topic follow-ups, a repeated query and a topic switch per session. Checks that covered
+follow-ups are answered from the session's working set with the same best article a full search
+would give, that topic switches fall back to the full index, that repeated queries skip the
+embedding, and that an index rebuild empties the sets. Also checks the hit counters through
+/search and /metrics, and that a user whose first question joined another user's identical
+in-flight request still gets working-set hits on the follow-up.
+
+Usage:
+    python verify_working_set.py
+    python verify_working_set.py --chunks 50000 --sessions 100
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify session retrieval working sets")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mvai_workingset_")
+    os.environ.update(
+        EMBEDDING_PROVIDER="local", LLM_PROVIDER="fake", FAKE_LLM_MEDIAN_MS="5", SHARED_INDEX="false",
+        DATA_PATH=os.path.join(workdir, "chunks.csv"),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'chat.db')}",
+    )
+    os.environ.pop("RETRIEVAL_SOCKET", None)
+    try:
+        from bench_retrieval import generate_csv
+        from providers import LocalHashEmbedder
+        print(f"🧪 Generating {args.chunks:,} chunks...")
+        generate_csv(os.environ["DATA_PATH"], args.chunks, "embedding", embedder=LocalHashEmbedder())
+
+        from fastapi.testclient import TestClient
+        from metrics import CACHE_REQUESTS, cache_hit_ratio
+        from readiness import LOAD_PROGRESS
+        from rag_engine import get_rag_engine
+        import main as app_module
+
+        ok = True
+        with TestClient(app_module.app) as client:
+            started = time.time()
+            while not LOAD_PROGRESS.ready:
+                if time.time() - started > 300:
+                    raise SystemExit("❌ RAG engine did not become ready")
+                time.sleep(0.2)
+            rag = get_rag_engine()
+            sets = rag.working_sets
+            embed = rag.embedder.embed
+            embed_calls = []
+
+            def counting_embed(texts, **kwargs):
+                embed_calls.append(len(texts))
+                return embed(texts, **kwargs)
+
+            rag.embedder.embed = counting_embed
+
+            rng = random.Random(args.seed)
+            covered, switched, same_best, score_recall, repeat_embeds = [], [], [], [], []
+            full_ms, set_ms = [], []
+            for _ in range(args.sessions):
+                words = rag.chunks[rng.randrange(len(rag.chunks))].split()
+                other = rag.chunks[rng.randrange(len(rag.chunks))].split()
+                opening = " ".join(words[:10])
+                follow_ups = ["why " + " ".join(words[1:10]), " ".join(words[:8]) + " ela", " ".join(words[2:11])]
+
+                working_set = sets.new(rag.index_generation)
+                rag._retrieve_chunks(opening, working_set=working_set)
+                for follow_up in follow_ups:
+                    before = CACHE_REQUESTS.value(cache="working_set", result="hit")
+                    from_set, ms = timed(rag._retrieve_chunks, follow_up, working_set=working_set)
+                    hit = CACHE_REQUESTS.value(cache="working_set", result="hit") > before
+                    covered.append(hit)
+                    full, full_time = timed(rag._retrieve_chunks, follow_up)
+                    full_ms.append(full_time)
+                    if hit:
+                        set_ms.append(ms)
+                        same_best.append(from_set[0][0] == full[0][0])
+                        # How much of the full search's top-5 relevance the working set recovers
+                        score_recall.append(sum(s for _, s in from_set[:5]) / sum(s for _, s in full[:5]))
+
+                del embed_calls[:]
+                rag._retrieve_chunks(follow_ups[0], working_set=working_set)
+                repeat_embeds.append(len(embed_calls))
+
+                before = CACHE_REQUESTS.value(cache="working_set", result="miss")
+                rag._retrieve_chunks(" ".join(other[:10]), working_set=working_set)
+                switched.append(CACHE_REQUESTS.value(cache="working_set", result="miss") > before)
+                ok &= len(working_set) <= sets.max_chunks
+
+            hit_rate = sum(covered) / len(covered)
+            ok &= check(hit_rate >= 0.75,
+                        f"On-topic follow-ups answered from the working set: {hit_rate:.0%} of {len(covered)}")
+            ok &= check(sum(same_best) >= 0.95 * len(same_best) and statistics.mean(score_recall) >= 0.9,
+                        f"Working-set answers: same best article as the full search in {sum(same_best)}/{len(same_best)}, "
+                        f"{statistics.mean(score_recall):.0%} of its top-5 similarity on average")
+            ok &= check(all(switched), f"Topic switches fall back to the full index: {sum(switched)}/{len(switched)}")
+            ok &= check(sum(repeat_embeds) == 0, "A query the session already embedded isn't embedded again")
+            ok &= check(statistics.median(set_ms) < statistics.median(full_ms),
+                        f"Follow-up retrieval p50: {statistics.median(full_ms):.2f} ms full index -> "
+                        f"{statistics.median(set_ms):.2f} ms working set (embedding included in both)")
+
+            working_set = sets.new(rag.index_generation)
+            rag._retrieve_chunks(" ".join(words[:10]), working_set=working_set)
+            rag.index_generation += 1
+            before = CACHE_REQUESTS.value(cache="working_set", result="hit")
+            rag._retrieve_chunks(" ".join(words[:8]), working_set=working_set)
+            ok &= check(working_set.generation == rag.index_generation and
+                        CACHE_REQUESTS.value(cache="working_set", result="hit") == before,
+                        "An index rebuild empties the working sets instead of serving stale positions")
+
+            # Through the API: the follow-up in the session hits, and /metrics reports the ratio
+            rag.embedder.embed = embed
+            signed_up = client.post("/auth/signup", json={"email": "ws@example.com", "password": "password123",
+                                                          "full_name": "Working Set"}).json()
+            headers = {"Authorization": f"Bearer {signed_up['access_token']}"}
+            question = " ".join(rag.chunks[0].split()[:10])
+            before = CACHE_REQUESTS.value(cache="working_set", result="hit")
+            first = client.get("/search", params={"query": question}, headers=headers).json()
+            client.get("/search", params={"query": question, "session_id": first["session_id"]}, headers=headers)
+            metrics = client.get("/metrics").text
+            ok &= check(CACHE_REQUESTS.value(cache="working_set", result="hit") == before + 1 and
+                        'mvai_cache_hit_ratio{cache="working_set"}' in metrics and "mvai_working_sets " in metrics,
+                        f"/search follow-up hit the session's working set; /metrics reports "
+                        f"{cache_hit_ratio('working_set'):.0%} working-set hits")
+
+            # Two users ask the same opening question at once: the second joins the first's pipeline
+            # (single-flight) and must still start its session with the retrieved chunks
+            from concurrent.futures import ThreadPoolExecutor
+            generate_answer = rag.generate_answer
+
+            def slow_generate_answer(*a, **kw):
+                time.sleep(0.5)  # long enough for the second request to join
+                return generate_answer(*a, **kw)
+
+            rag.generate_answer = slow_generate_answer
+            users = []
+            for n in range(2):
+                signed_up = client.post("/auth/signup", json={"email": f"flight{n}@example.com", "password": "password123",
+                                                              "full_name": f"Flight {n}"}).json()
+                users.append({"Authorization": f"Bearer {signed_up['access_token']}"})
+            question = " ".join(rag.chunks[1].split()[:10])
+            followers = app_module.search_flights.followers
+            with ThreadPoolExecutor(2) as pool:
+                firsts = list(pool.map(lambda h: client.get("/search", params={"query": question}, headers=h).json(), users))
+            rag.generate_answer = generate_answer
+            joined = app_module.search_flights.followers - followers
+            before = CACHE_REQUESTS.value(cache="working_set", result="hit")
+            for headers, first in zip(users, firsts):
+                client.get("/search", params={"query": question, "session_id": first["session_id"]}, headers=headers)
+            hits = CACHE_REQUESTS.value(cache="working_set", result="hit") - before
+            ok &= check(joined == 1 and hits == 2,
+                        f"Leader and single-flight follower both hit their working sets on the follow-up "
+                        f"({joined} joined, {hits:.0f}/2 hits)")
+        sys.exit(0 if ok else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
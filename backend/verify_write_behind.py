@@ -0,0 +1,149 @@
+"""
+MANA VARTHA AI - Write-Behind Verification
+Checks the chat write-behind queue against a SQLite file with an injected per-statement delay
+(standing in for a remote Postgres): answers no longer wait on the database, buffered exchanges
+are batched, retried without duplicates, visible to history reads, and flushed on shutdown.
+
+Usage:
+    python verify_write_behind.py
+    python verify_write_behind.py --db-delay-ms 20 --exchanges 2000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import shutil
+import argparse
+import tempfile
+import statistics
+
+# Ensure backend directory is in path
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+async def run_checks(args) -> bool:
+    from sqlalchemy import event, func, select
+    from database import Base, engine, write_engine, async_engine, async_write_engine, SessionLocal, AsyncSessionLocal
+    from models import User, ChatSession, ChatMessage
+    from chat_store import load_history, plan_exchange, save_exchange
+    from write_behind import ChatWriteBehind, write_batch
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as s:
+        s.add_all([User(id=f"user-{i}", email=f"wb{i}@example.com", hashed_password="x") for i in range(20)])
+        s.commit()
+
+    statements = []
+    failures = {"remaining": 0}
+
+    def remote_db(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        if failures["remaining"] and statement.lstrip().upper().startswith("INSERT"):
+            failures["remaining"] -= 1
+            raise RuntimeError("injected connection reset")
+        time.sleep(args.db_delay_ms / 1000)
+
+    # The flusher writes through the sync engines, requests through the async ones
+    for e in {engine, write_engine, async_engine.sync_engine, async_write_engine.sync_engine}:
+        event.listen(e, "before_cursor_execute", remote_db)
+
+    def count(model) -> int:
+        with SessionLocal() as s:
+            return s.execute(select(func.count()).select_from(model)).scalar()
+
+    ok = True
+    db = AsyncSessionLocal()
+
+    # 1. Latency the request pays: inline transaction vs enqueue
+    inline = []
+    for i in range(20):
+        started = time.perf_counter()
+        await save_exchange(db, "user-0", None, f"inline question {i}", "answer")
+        inline.append((time.perf_counter() - started) * 1000)
+    writer = ChatWriteBehind(SessionLocal, max_pending=args.exchanges * 2, batch_size=200, interval=0.05)
+    writer.start()
+    queued = []
+    for i in range(20):
+        started = time.perf_counter()
+        await writer.submit(db, "user-0", None, f"queued question {i}", "answer")
+        queued.append((time.perf_counter() - started) * 1000)
+    ok &= check(statistics.median(queued) < statistics.median(inline) / 10,
+                f"Persistence in the request: {statistics.median(inline):.1f} ms inline -> "
+                f"{statistics.median(queued):.3f} ms queued (p50, {args.db_delay_ms:.0f} ms per statement)")
+
+    # 2. Batching under concurrent load
+    writer.stop()
+    statements.clear()
+    sessions_before, messages_before = count(ChatSession), count(ChatMessage)
+    writer = ChatWriteBehind(SessionLocal, max_pending=args.exchanges * 2, batch_size=200, interval=0.05)
+    writer.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(writer.submit(db, f"user-{i % 20}", None, f"question {i}", f"answer {i}")
+                           for i in range(args.exchanges)))
+    enqueue_seconds = time.perf_counter() - started
+    writer.stop()
+    inserts = sum(1 for s in statements if s.lstrip().upper().startswith("INSERT"))
+    ok &= check(count(ChatSession) - sessions_before == args.exchanges and
+                count(ChatMessage) - messages_before == 2 * args.exchanges,
+                f"{args.exchanges} exchanges enqueued in {enqueue_seconds * 1000:.0f} ms, all persisted on shutdown")
+    ok &= check(0 < inserts <= 2 * (args.exchanges // 100 + 2),
+                f"Batched: {inserts} INSERT statements for {3 * args.exchanges} rows")
+
+    # 3. History reads see buffered exchanges before they are flushed
+    writer = ChatWriteBehind(SessionLocal)  # flusher not started: everything stays buffered
+    first = await writer.submit(db, "user-1", None, "buffered question", "buffered answer")
+    history = await writer.load_history(db, first["session_id"], "user-1")
+    await writer.submit(db, "user-1", history, "follow-up", "follow-up answer")
+    history = await writer.load_history(db, first["session_id"], "user-1")
+    ok &= check(history is not None and [m["content"] for m in history.messages] ==
+                ["buffered question", "buffered answer", "follow-up", "follow-up answer"] and
+                await writer.load_history(db, first["session_id"], "user-2") is None,
+                "Unflushed exchanges are merged into the owner's history (and only the owner's)")
+
+    # 4. Bounded buffer: a full queue falls back to writing inside the request
+    writer.max_pending = writer.depth()
+    before = count(ChatMessage)
+    await writer.submit(db, "user-1", None, "overflow", "overflow answer")
+    ok &= check(count(ChatMessage) == before + 2 and writer.depth() == writer.max_pending,
+                "Full buffer writes inline instead of growing")
+
+    # 5. At-least-once: a failed flush is retried with the same ids, replays don't duplicate
+    failures["remaining"] = 1
+    writer.start()
+    writer.stop()
+    flushed = await load_history(db, first["session_id"], "user-1")
+    ok &= check(flushed is not None and len(flushed.messages) == 4, "Flush retried after an injected failure")
+    plan = plan_exchange("user-3", None, "replayed", "replayed answer")
+    with SessionLocal() as s:
+        write_batch(s, [plan])
+        write_batch(s, [plan])
+    replayed = await load_history(db, plan["session_id"], "user-3")
+    ok &= check(replayed is not None and len(replayed.messages) == 2, "Replaying a batch inserts nothing twice")
+    await db.close()
+    await async_engine.dispose()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the chat write-behind queue")
+    parser.add_argument("--exchanges", type=int, default=1000)
+    parser.add_argument("--db-delay-ms", type=float, default=10, help="Simulated network latency per statement")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mvai_writebehind_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'chat.db')}"
+    try:
+        sys.exit(0 if asyncio.run(run_checks(args)) else 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
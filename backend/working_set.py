@@ -0,0 +1,162 @@
+"""
+MANA VARTHA AI - Session Retrieval Working Sets
+Follow-ups ("Enduku?", "Ela?") nearly always need the articles that answered the previous turn.
+Each chat session keeps the chunks it retrieved and the query embeddings that found them; a
+follow-up is scored against that small set first, and the full index is searched only when the
+set doesn't cover the question. A rewritten query the session has already embedded is not
+embedded again.
+
+A follow-up is answered from the working set when both hold:
+    - its embedding is within SESSION_WORKING_SET_QUERY_SIMILARITY (cosine) of an earlier query
+      of the session, i.e. it is about the same thing, and
+    - at least SESSION_WORKING_SET_MIN_HITS remembered chunks clear the engine's similarity threshold.
+Otherwise the full search runs and its results are added to the set.
+
+    SESSION_WORKING_SET=true
+    SESSION_WORKING_SET_SESSIONS=2000        # sessions kept per process (LRU)
+    SESSION_WORKING_SET_TTL=1800             # seconds since a session's last use
+    SESSION_WORKING_SET_CHUNKS=60            # chunks per session (LRU)
+    SESSION_WORKING_SET_QUERIES=8            # query embeddings per session (LRU)
+    SESSION_WORKING_SET_MIN_HITS=3
+    SESSION_WORKING_SET_QUERY_SIMILARITY=0.6
+
+Sets are per process and keyed by chunk position, so they are dropped when the index is rebuilt.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def working_sets_enabled() -> bool:
+    return os.getenv("SESSION_WORKING_SET", "true").lower() in ("1", "true", "yes")
+
+
+class WorkingSet:
+    """One session's remembered chunks (position -> vector) and query embeddings, both LRU."""
+
+    def __init__(self, generation: int, max_chunks: int = 60, max_queries: int = 8):
+        self.generation = generation
+        self.max_chunks = max_chunks
+        self.max_queries = max_queries
+        self._chunks: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._queries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def copy(self) -> "WorkingSet":
+        """An independent set with the same chunks and query embeddings (vectors are shared, never mutated)."""
+        clone = WorkingSet(self.generation, self.max_chunks, self.max_queries)
+        with self._lock:
+            clone._chunks = OrderedDict(self._chunks)
+            clone._queries = OrderedDict(self._queries)
+        return clone
+
+    def reset(self, generation: int):
+        """The index was rebuilt: remembered positions point at other chunks now."""
+        with self._lock:
+            self.generation = generation
+            self._chunks.clear()
+            self._queries.clear()
+
+    def query_embedding(self, normalized_query: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._queries.get(normalized_query)
+            if vector is not None:
+                self._queries.move_to_end(normalized_query)
+            return vector
+
+    def search(self, query_embedding: np.ndarray, threshold: float, top_k: int, min_hits: int,
+               query_similarity: float) -> Optional[List[Tuple[int, float]]]:
+        """Top chunks for the query from the set, best first, or None when the set doesn't cover it."""
+        with self._lock:
+            if not self._chunks or not self._queries:
+                return None
+            if float(np.max(np.stack(list(self._queries.values())) @ query_embedding)) < query_similarity:
+                return None
+            positions = list(self._chunks)
+            scores = np.stack(list(self._chunks.values())) @ query_embedding
+            hits = sorted(((p, float(s)) for p, s in zip(positions, scores) if s >= threshold),
+                          key=lambda hit: hit[1], reverse=True)
+            if len(hits) < min_hits:
+                return None
+            for position, _ in hits[:top_k]:
+                self._chunks.move_to_end(position)
+            return hits[:top_k]
+
+    def remember(self, normalized_query: str, query_embedding: np.ndarray, chunks: List[Tuple[int, np.ndarray]]):
+        with self._lock:
+            self._queries[normalized_query] = query_embedding
+            self._queries.move_to_end(normalized_query)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+            # Best result last, so it is the most recently used
+            for position, vector in reversed(chunks):
+                self._chunks[position] = vector
+                self._chunks.move_to_end(position)
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+
+
+class WorkingSets:
+    """Working sets by session id: LRU over sessions with an idle TTL."""
+
+    def __init__(self, max_sessions: int = 2000, ttl: float = 1800.0, max_chunks: int = 60, max_queries: int = 8,
+                 min_hits: int = 3, query_similarity: float = 0.6):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_chunks = max_chunks
+        self.max_queries = max_queries
+        self.min_hits = min_hits
+        self.query_similarity = query_similarity
+        self._sets: "OrderedDict[str, Tuple[float, WorkingSet]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "WorkingSets":
+        return cls(
+            max_sessions=int(os.getenv("SESSION_WORKING_SET_SESSIONS", "2000")),
+            ttl=float(os.getenv("SESSION_WORKING_SET_TTL", "1800")),
+            max_chunks=int(os.getenv("SESSION_WORKING_SET_CHUNKS", "60")),
+            max_queries=int(os.getenv("SESSION_WORKING_SET_QUERIES", "8")),
+            min_hits=int(os.getenv("SESSION_WORKING_SET_MIN_HITS", "3")),
+            query_similarity=float(os.getenv("SESSION_WORKING_SET_QUERY_SIMILARITY", "0.6")),
+        )
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+    def new(self, generation: int) -> WorkingSet:
+        return WorkingSet(generation, self.max_chunks, self.max_queries)
+
+    def get(self, session_id: str) -> Optional[WorkingSet]:
+        with self._lock:
+            entry = self._sets.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._sets[session_id]
+                return None
+            self._sets[session_id] = (time.monotonic(), entry[1])
+            self._sets.move_to_end(session_id)
+            return entry[1]
+
+    def put(self, session_id: str, working_set: WorkingSet):
+        """Keep `working_set` for the session (after its first answer, once the session id is known)."""
+        if not len(working_set):
+            return
+        with self._lock:
+            self._sets[session_id] = (time.monotonic(), working_set)
+            self._sets.move_to_end(session_id)
+            while len(self._sets) > self.max_sessions:
+                self._sets.popitem(last=False)
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sets.pop(session_id, None)
@@ -0,0 +1,267 @@
+"""
+MANA VARTHA AI - Write-Behind Chat Persistence
+/search answers as soon as generation finishes; the exchange (session + two messages) is queued
+and a background thread persists queued exchanges in batched multi-row inserts.
+
+    CHAT_WRITE_BEHIND=false          # true: enable the queue (default: write in the request)
+    CHAT_WRITE_BEHIND_MAX_PENDING=5000   # buffered exchanges before callers wait / write inline
+    CHAT_WRITE_BEHIND_BATCH=200          # exchanges per flush transaction
+    CHAT_WRITE_BEHIND_INTERVAL_MS=50     # max time an exchange waits for a batch to fill
+    CHAT_WRITE_BEHIND_SHUTDOWN_TIMEOUT=10
+
+Delivery is at-least-once: a failed batch is retried with the same client-side ids, and every
+insert is ON CONFLICT DO NOTHING, so a retry after a commit whose reply was lost is harmless.
+Exchanges stay visible to history reads (merged in by id) until their batch has committed.
+Anything still buffered when the process is killed without shutdown is lost.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from chat_store import HISTORY_TURNS, SessionHistory, load_history, plan_exchange, save_exchange
+from metrics import REGISTRY
+from models import ChatSession, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = REGISTRY.histogram("mvai_write_behind_flush_seconds", "Time to persist one write-behind batch",
+                                   buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+FLUSH_ROWS = REGISTRY.counter("mvai_write_behind_rows_total", "Rows written by the write-behind queue",
+                              labelnames=("table",))
+FLUSH_FAILURES = REGISTRY.counter("mvai_write_behind_failures_total", "Failed write-behind flush attempts")
+INLINE_WRITES = REGISTRY.counter("mvai_write_behind_inline_total",
+                                 "Exchanges written inside the request because the buffer was full")
+DROPPED = REGISTRY.counter("mvai_write_behind_dropped_total",
+                           "Exchanges dropped (rejected by the database, or lost at shutdown)")
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("CHAT_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+
+
+def _insert_ignoring_duplicates(db: Session, model, rows: List[Dict[str, Any]]):
+    """Multi-row INSERT ... ON CONFLICT DO NOTHING (Postgres / SQLite); plain INSERT elsewhere."""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        db.execute(insert(model), rows)
+        return
+    db.execute(dialect_insert(model).values(rows).on_conflict_do_nothing())
+
+
+def write_batch(db: Session, plans: List[Dict[str, Any]]):
+    """All plans in one transaction: new sessions, session title/timestamp updates, then messages."""
+    sessions = [{"id": p["session_id"], "user_id": p["user_id"], "title": p["title"],
+                 "created_at": p["updated_at"], "updated_at": p["updated_at"]} for p in plans if p["create"]]
+    # Later exchanges of the same session win; one UPDATE row per session
+    touched: Dict[str, Dict[str, Any]] = {}
+    for p in plans:
+        if not p["create"]:
+            row = touched.setdefault(p["session_id"], {"b_id": p["session_id"], "b_user": p["user_id"], "b_title": None})
+            row["b_updated"] = p["updated_at"]
+            row["b_title"] = p["title"] or row["b_title"]
+    messages = [m for p in plans for m in p["messages"]]
+
+    _insert_ignoring_duplicates(db, ChatSession, sessions)
+    for with_title in (True, False):
+        rows = [r for r in touched.values() if (r["b_title"] is not None) == with_title]
+        if not rows:
+            continue
+        values = {"updated_at": bindparam("b_updated")}
+        if with_title:
+            values["title"] = bindparam("b_title")
+        else:
+            rows = [{k: v for k, v in r.items() if k != "b_title"} for r in rows]
+        db.execute(update(ChatSession.__table__)
+                   .where(ChatSession.__table__.c.id == bindparam("b_id"),
+                          ChatSession.__table__.c.user_id == bindparam("b_user"))
+                   .values(**values), rows)
+    _insert_ignoring_duplicates(db, ChatMessage, messages)
+    db.commit()
+    FLUSH_ROWS.inc(len(sessions), table="chat_sessions")
+    FLUSH_ROWS.inc(len(messages), table="chat_messages")
+
+
+class ChatWriteBehind:
+    """Bounded in-memory buffer of planned exchanges, drained by one flusher thread."""
+
+    def __init__(self, session_factory: Callable[[], Session], max_pending: int = 5000, batch_size: int = 200,
+                 interval: float = 0.05, shutdown_timeout: float = 10.0):
+        self.session_factory = session_factory
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.interval = interval
+        self.shutdown_timeout = shutdown_timeout
+        # Exchanges leave the deque only after their batch committed, so history reads still see them
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self.last_flush_at: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, session_factory: Callable[[], Session]) -> Optional["ChatWriteBehind"]:
+        if not write_behind_enabled():
+            return None
+        return cls(
+            session_factory,
+            max_pending=int(os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", "5000")),
+            batch_size=int(os.getenv("CHAT_WRITE_BEHIND_BATCH", "200")),
+            interval=float(os.getenv("CHAT_WRITE_BEHIND_INTERVAL_MS", "50")) / 1000,
+            shutdown_timeout=float(os.getenv("CHAT_WRITE_BEHIND_SHUTDOWN_TIMEOUT", "10")),
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+        logger.info(f"🗃️ Chat write-behind enabled (batch {self.batch_size}, buffer {self.max_pending})")
+
+    def stop(self):
+        """Flush what is buffered (bounded by shutdown_timeout) and stop the flusher."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(self.shutdown_timeout)
+        lost = self.depth()
+        if lost:
+            DROPPED.inc(lost)
+            logger.error(f"❌ Chat write-behind stopped with {lost} unsaved exchanges")
+        else:
+            logger.info("✅ Chat write-behind flushed")
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    # --- request side -----------------------------------------------------------------------
+
+    async def load_history(self, db: AsyncSession, session_id: str, user_id: str,
+                           limit: int = HISTORY_TURNS) -> Optional[SessionHistory]:
+        """load_history() plus exchanges of this session that are still buffered."""
+        # Snapshot before reading: anything missing from the snapshot has committed before the read
+        with self._cond:
+            pending = [p for p in self._pending if p["session_id"] == session_id and p["user_id"] == user_id]
+        history = await load_history(db, session_id, user_id, limit)
+        if not pending:
+            return history
+        if history is None:
+            if not any(p["create"] for p in pending):
+                return None
+            history = SessionHistory(session_id, None, [], [])
+        for p in pending:
+            history.title = p["title"] or history.title
+            for message in p["messages"]:
+                if message["id"] not in history.message_ids:
+                    history.message_ids.append(message["id"])
+                    history.message_times.append(message["timestamp"])
+                    history.messages.append({"role": message["role"], "content": message["content"]})
+        history.messages, history.message_ids = history.messages[-limit:], history.message_ids[-limit:]
+        history.message_times = history.message_times[-limit:]
+        return history
+
+    async def submit(self, db: AsyncSession, user_id: str, session: Optional[SessionHistory], query: str,
+                     answer: str) -> Dict[str, Optional[str]]:
+        """Queue the exchange and return its ids at once; writes inline only when the buffer stays full."""
+        plan = plan_exchange(user_id, session, query, answer)
+        if self._enqueue(plan) or await asyncio.to_thread(self._enqueue, plan, 1.0):
+            # Backpressure: when full, the flusher gets a moment before we fall back to writing inline
+            return {"session_id": plan["session_id"], "new_session_title": plan["title"]}
+        INLINE_WRITES.inc()
+        logger.warning("⚠️ Chat write-behind buffer full, saving inline")
+        return await save_exchange(db, user_id, session, query, answer)
+
+    def _enqueue(self, plan: Dict[str, Any], wait: float = 0.0) -> bool:
+        with self._cond:
+            if wait and len(self._pending) >= self.max_pending:
+                self._cond.wait_for(lambda: len(self._pending) < self.max_pending, timeout=wait)
+            if len(self._pending) >= self.max_pending:
+                return False
+            self._pending.append(plan)
+            self._cond.notify_all()
+            return True
+
+    def wait_for_user(self, user_id: str, timeout: float = 2.0) -> bool:
+        """Read-your-writes for the /chats endpoints: block until the user's buffered exchanges committed."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not any(p["user_id"] == user_id for p in self._pending), timeout)
+
+    # --- flusher ----------------------------------------------------------------------------
+
+    def _run(self):
+        backoff = 0.1
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending and self._stopping:
+                    return
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    # Let a batch fill up for a moment; the first exchange bounds the wait
+                    self._cond.wait_for(lambda: len(self._pending) >= self.batch_size or self._stopping,
+                                        timeout=self.interval)
+                batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+            try:
+                self._flush(batch)
+                backoff = 0.1
+            except Exception as e:
+                FLUSH_FAILURES.inc()
+                logger.error(f"❌ Chat write-behind flush of {len(batch)} exchanges failed, retrying: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+                continue
+            with self._cond:
+                for _ in batch:
+                    self._pending.popleft()
+                self._cond.notify_all()
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            try:
+                write_batch(db, batch)
+            except IntegrityError:
+                # One bad exchange (e.g. its session was deleted) must not block the rest forever
+                db.rollback()
+                for plan in batch:
+                    try:
+                        write_batch(db, [plan])
+                    except IntegrityError as e:
+                        db.rollback()
+                        DROPPED.inc()
+                        logger.error(f"❌ Dropping exchange for session {plan['session_id']}: {e}")
+        finally:
+            db.close()
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        self.last_flush_at = time.time()
+
+
+# Process-wide instance (None unless CHAT_WRITE_BEHIND is enabled)
+chat_writer: Optional[ChatWriteBehind] = None
+
+
+def init_chat_writer(session_factory: Callable[[], Session]) -> Optional[ChatWriteBehind]:
+    global chat_writer
+    chat_writer = ChatWriteBehind.from_env(session_factory)
+    if chat_writer:
+        chat_writer.start()
+    return chat_writer
+
+
+def get_chat_writer() -> Optional[ChatWriteBehind]:
+    return chat_writer
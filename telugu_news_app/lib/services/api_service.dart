@@ -21,6 +21,9 @@ class ApiService {
     try {
       final response = await http.get(uri).timeout(const Duration(seconds: 120));
 
+      // Server reports per-stage durations; log them so slow answers can be matched to server logs
+      debugPrint("search trace=${response.headers['x-request-id']} timing=${response.headers['server-timing']}");
+
       if (response.statusCode == 200) {
         final data = json.decode(utf8.decode(response.bodyBytes)); // Handle UTF-8 safely
         return data["answer"] ?? "No answer found";